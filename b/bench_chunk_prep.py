@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+INPUTS:
+  - ~/iec/pcXX/district_handbooks*/eb_table_extracts/*_EB.pdf (optional, --pdf)
+OUTPUTS:
+  - none (prints timings)
+
+bench_chunk_prep.py
+
+Benchmark of chunk preparation in llm_csv_hb_extractor.py: splitting an EB extract
+into 20-page chunk PDFs. Compares the previous PyPDF2 approach (reopen the file and
+build a new PdfReader for every chunk) with the current _prepare_chunks, which
+parses the file once, for both chunk parsers. Also checks that every approach
+produces the same chunk page spans.
+
+Without --pdf, a synthetic extract of --synthetic_pages text pages is generated.
+
+Examples:
+  python bench_chunk_prep.py
+  python bench_chunk_prep.py --pdf ~/iec/pc01/district_handbooks/eb_table_extracts --max_files 20
+"""
+
+from pathlib import Path
+from io import BytesIO
+import os
+import sys
+import shlex
+import time
+import tempfile
+import argparse
+
+import PyPDF2
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from llm_csv_hb_extractor import _prepare_chunks, CHUNK_SIZE
+
+p = argparse.ArgumentParser(description="Benchmark chunk PDF preparation for the Gemini extractor.")
+p.add_argument("--pdf", default="", help="An _EB.pdf file or a directory of them (default: synthetic).")
+p.add_argument("--max_files", type=int, default=10, help="Largest N files of a directory to use.")
+p.add_argument("--synthetic_pages", type=int, default=400, help="Pages of the synthetic extract.")
+p.add_argument("--chunk_size", type=int, default=CHUNK_SIZE)
+p.add_argument("--repeat", type=int, default=3, help="Timed passes; the best is reported.")
+
+argv = sys.argv[1:]
+if len(argv) == 1 and ("--" in argv[0] or " " in argv[0]):
+    argv = shlex.split(argv[0])
+args = p.parse_args(argv)
+
+# ---------------------------------------------------------------------
+# Previous implementation: one PdfReader per chunk, plus one for the page count
+# ---------------------------------------------------------------------
+def legacy_prepare_chunks(pdf_filepath, chunk_size):
+    with open(pdf_filepath, 'rb') as pdf_file:
+        num_pages = len(PyPDF2.PdfReader(pdf_file).pages)
+    chunks = []
+    for start_page in range(0, num_pages, chunk_size):
+        end_page = min(start_page + chunk_size, num_pages)
+        writer = PyPDF2.PdfWriter()
+        with open(pdf_filepath, 'rb') as pdf_file:
+            reader = PyPDF2.PdfReader(pdf_file)
+            for i in range(start_page, end_page):
+                writer.add_page(reader.pages[i])
+            buf = BytesIO()
+            writer.write(buf)
+        chunks.append((start_page, end_page, buf.getvalue()))
+    return num_pages, chunks
+
+# ---------------------------------------------------------------------
+# Inputs
+# ---------------------------------------------------------------------
+def synthetic_extract(n_pages: int, path: Path):
+    """Text-only pages with a table-like body, roughly the size of a scanned-free EB page."""
+    import fitz
+    with fitz.open() as doc:
+        for i in range(n_pages):
+            page = doc.new_page()
+            lines = [f"{i+1:04d} {j:03d} Ward {j} Town {i % 17} {j * 37 % 9999} {j * 53 % 9999}"
+                     for j in range(50)]
+            page.insert_text((36, 36), "\n".join(lines), fontsize=8)
+        doc.save(path, garbage=4, deflate=True)
+
+tmpdir = None
+if args.pdf:
+    src = Path(args.pdf).expanduser()
+    if src.is_dir():
+        files = sorted(src.glob("*.pdf"), key=lambda f: f.stat().st_size, reverse=True)[:args.max_files]
+    else:
+        files = [src]
+    if not files:
+        sys.exit(f"[ERROR] No PDFs at {src}")
+else:
+    tmpdir = tempfile.TemporaryDirectory()
+    files = [Path(tmpdir.name) / f"synthetic_{args.synthetic_pages}p_EB.pdf"]
+    synthetic_extract(args.synthetic_pages, files[0])
+
+# ---------------------------------------------------------------------
+# Run
+# ---------------------------------------------------------------------
+def bench(fn) -> tuple[float, list]:
+    best, spans = float("inf"), []
+    for _ in range(args.repeat):
+        spans = []
+        t0 = time.perf_counter()
+        for f in files:
+            _, chunks = fn(f)
+            spans.append([(a, b) for a, b, _ in chunks])
+        best = min(best, time.perf_counter() - t0)
+    return best, spans
+
+n_pages = sum(len(PyPDF2.PdfReader(str(f)).pages) for f in files)
+mb = sum(f.stat().st_size for f in files) / 1e6
+print(f"[INFO] {len(files)} file(s), {n_pages} pages, {mb:.1f} MB, chunk size {args.chunk_size}")
+
+legacy_s, legacy_spans = bench(lambda f: legacy_prepare_chunks(f, args.chunk_size))
+print(f"  PyPDF2, reader per chunk:  {legacy_s:8.2f}s  {n_pages / legacy_s:8,.0f} pages/sec")
+for parser in ("pypdf", "pymupdf"):
+    secs, spans = bench(lambda f: _prepare_chunks(f, args.chunk_size, parser))
+    same = "same spans" if spans == legacy_spans else "[WARN] spans differ"
+    print(f"  {parser + ', one open:':26s} {secs:8.2f}s  {n_pages / secs:8,.0f} pages/sec  "
+          f"({legacy_s / secs:.2f}x, {same})")
+
+if tmpdir:
+    tmpdir.cleanup()
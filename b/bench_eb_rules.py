@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+INPUTS:
+  - data/eb_page_rules.json
+  - ~/iec/pcXX/district_handbooks/.page_text_cache.sqlite (optional, --pdf_root)
+OUTPUTS:
+  - none (prints timings)
+
+bench_eb_rules.py
+
+Micro-benchmark of EB page detection: the compiled rule set in eb_rules.py against
+the previous per-page approach (strip whitespace with a regex, then any()/all() over
+substring checks per phrase list). Also checks the two agree on every page.
+
+Page texts come from the page text cache written by find_eb_pages.py when --pdf_root
+is given; otherwise synthetic handbook-like pages are generated.
+
+Examples:
+  python bench_eb_rules.py --series pc01
+  python bench_eb_rules.py --series pc01 --pdf_root /path/to/district_handbooks --max_pages 20000
+"""
+
+from pathlib import Path
+import re
+import sys
+import shlex
+import time
+import random
+import sqlite3
+import zlib
+import argparse
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from eb_rules import load_rules, DEFAULT_RULES_JSON
+
+p = argparse.ArgumentParser(description="Benchmark compiled EB rules against the substring approach.")
+p.add_argument("--series", required=True, choices=["pc01", "pc11", "pc91", "pc51"])
+p.add_argument("--rules", default=str(DEFAULT_RULES_JSON), help="Rules JSON file.")
+p.add_argument("--pdf_root", default="",
+               help="Read page texts from --pdf_root/.page_text_cache.sqlite instead of synthetic pages.")
+p.add_argument("--max_pages", type=int, default=5000, help="Number of pages to benchmark.")
+p.add_argument("--repeat", type=int, default=5, help="Timed passes over the pages; the best is reported.")
+
+argv = sys.argv[1:]
+if len(argv) == 1 and ("--" in argv[0] or " " in argv[0]):
+    argv = shlex.split(argv[0])
+args = p.parse_args(argv)
+
+rules = load_rules(args.rules, args.series)
+
+# ---------------------------------------------------------------------
+# Previous implementation, rebuilt from the same rule set
+# ---------------------------------------------------------------------
+def _normalise(txt: str) -> str:
+    return re.sub(r"\s+", "", txt.upper())
+
+PHRASES_NORM = [_normalise(t) for _, t in rules.phrases]
+HINTS_UPPER = [t.upper() for _, t in rules.hints]
+
+def legacy_criteria(page_text: str) -> tuple[bool, bool, bool]:
+    text_upper = (page_text or "").upper()
+    text_norm = _normalise(page_text or "")
+    phrase_ok = any(ph in text_norm for ph in PHRASES_NORM)
+    any_hint = any(h in text_upper for h in HINTS_UPPER)
+    hints_ok = all(h in text_upper for h in HINTS_UPPER) if rules.hints_mode == "all" else any_hint
+    return phrase_ok, hints_ok, phrase_ok or any_hint
+
+# ---------------------------------------------------------------------
+# Page texts
+# ---------------------------------------------------------------------
+def cached_pages(db: Path, limit: int) -> list[str]:
+    con = sqlite3.connect(f"file:{db}?mode=ro", uri=True)
+    rows = con.execute("SELECT text FROM pages LIMIT ?", (limit,)).fetchall()
+    con.close()
+    return [zlib.decompress(blob).decode("utf-8") for (blob,) in rows]
+
+def synthetic_pages(n: int) -> list[str]:
+    rng = random.Random(0)
+    words = ["Ward", "No.", "Town", "Village", "Total", "Persons", "Males", "Females",
+             "Households", "Literates", "Workers", "Scheduled", "Castes", "Tribes",
+             "District", "Census", "Tahsil", "Block", "Area", "Population"]
+    titles = [t for _, t in rules.phrases] + [t.replace(" ", "\n", 1) for _, t in rules.phrases]
+    hints = [t for _, t in rules.hints]
+    pages = []
+    for i in range(n):
+        body = []
+        for _ in range(60):
+            body.append(" ".join(rng.choice(words) for _ in range(8)) + " " +
+                        " ".join(str(rng.randint(0, 99999)) for _ in range(6)))
+        if titles and i % 10 == 0:
+            body.insert(0, rng.choice(titles).title())
+        if hints and i % 7 == 0:
+            body.insert(2, rng.choice(hints).lower())
+        pages.append("\n".join(body))
+    return pages
+
+if args.pdf_root:
+    db = Path(args.pdf_root) / ".page_text_cache.sqlite"
+    if not db.exists():
+        sys.exit(f"[ERROR] No page text cache at {db}")
+    pages = cached_pages(db, args.max_pages)
+    source = str(db)
+else:
+    pages = synthetic_pages(args.max_pages)
+    source = "synthetic"
+
+# ---------------------------------------------------------------------
+# Run
+# ---------------------------------------------------------------------
+def bench(fn) -> float:
+    best = float("inf")
+    for _ in range(args.repeat):
+        t0 = time.perf_counter()
+        for text in pages:
+            fn(text)
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+mismatches = [i for i, t in enumerate(pages) if legacy_criteria(t) != rules.criteria(t)]
+hits = sum(1 for t in pages if all(rules.criteria(t)[:2]))
+
+legacy_s = bench(legacy_criteria)
+compiled_s = bench(rules.criteria)
+n = len(pages)
+
+print(f"[INFO] Series {args.series}, rule set '{rules.name}' (version {rules.version}), "
+      f"{len(rules.phrases)} phrases, {len(rules.hints)} hints")
+print(f"[INFO] Pages: {n} ({source}), avg {sum(map(len, pages)) // max(n, 1)} chars, {hits} EB pages")
+print(f"  Substring any():    {n / legacy_s:,.0f} pages/sec")
+print(f"  Compiled rules:     {n / compiled_s:,.0f} pages/sec ({legacy_s / compiled_s:.2f}x)")
+print(f"  Decisions differ:   {len(mismatches)}")
+if mismatches:
+    print(f"[WARN] First differing pages: {mismatches[:10]}")
@@ -0,0 +1,197 @@
+"""
+csv_salvage.py
+
+Tolerant parsing of the CSV Gemini returns for one chunk, for
+llm_csv_hb_extractor.py. One malformed line used to make pd.read_csv raise,
+which failed the whole PDF and had every chunk of it paid for again. Instead,
+the response is read line by line against the 7-column schema of
+prompt_template.txt:
+
+  - Code fences, a leftover "csv" tag, markdown table pipes and separator lines,
+    repeated header rows and the 1 2 3 4 5 6 7 column-number row are dropped
+    silently (they are not data), as are lines of plain text without a comma
+    or a digit (commentary).
+  - A line with exactly 7 valid cells is kept; counts written as "-" or "NaN"
+    become empty, a number in one cell with thousands separators ("1,087", quoted)
+    or a float's ".0" ("1087.0") is written as a plain whole number, "**" / "`"
+    formatting is stripped, and a comma inside a quoted name becomes a space
+    (local_eb_table.clean_text, as for rows read locally).
+  - A line with too many cells (a stray comma) is repaired by merging adjacent
+    cells: a count split at a thousands separator ("1,087") is joined back, a
+    text cell split by a comma is joined with a space. The repair is used only if
+    exactly one merge gives a valid row, or exactly one of those also has a
+    "Ward ..." ward and an "EB" number (process_xls_hb.py's rules). Trailing
+    empty cells are dropped when that leaves 7 valid cells; otherwise the repair
+    is tried with them kept (an empty st_pop) before without them.
+  - Anything else (too few cells, non-numeric counts, SC/ST above the total, an
+    ambiguous repair) is quarantined and returned with the reason.
+
+A row is valid if its location code is digits or missing, and its counts are
+whole numbers without leading zeros (or missing), with sc_pop and st_pop not
+above total_pop.
+
+  csv_text, report = salvage_csv(response_text)
+  report -> {"rows": kept rows, "salvaged": repaired rows, "dropped": quarantined
+             rows, "rate": kept / (kept + dropped), "rejects": [(line, reason)]}
+
+`python csv_salvage.py` runs the checks in CHECKS (lines that must be kept as a
+given row, or quarantined) and exits non-zero if any fails.
+"""
+
+from itertools import combinations
+from pathlib import Path
+from io import StringIO
+import csv
+import re
+import sys
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from local_eb_table import COLUMNS, clean_text
+from process_xls_hb import norm_cell, is_1234567_row, WARD_RE, EB_RE
+
+COUNT_COLS = (4, 5, 6)
+MISSING = {"", "-", "nan", "na", "n/a", "null", "none"}
+# More surplus cells than this are not worth trying to merge
+MAX_EXTRA_CELLS = 3
+
+_DIGITS = re.compile(r"^\d+$")
+_COUNT = re.compile(r"^(0|[1-9]\d*)$")
+_THOUSANDS = re.compile(r"^\d{3}$")
+_GROUPED = re.compile(r"^\d{1,3}(,\d{3})+$")
+_WHOLE_FLOAT = re.compile(r"^(\d+)\.0+$")
+_MD_SEPARATOR = re.compile(r"^\|?[\s:|-]+\|?$")
+
+def _missing(v: str) -> bool:
+    return v.strip().lower() in MISSING
+
+def _header_key(cells) -> list[str]:
+    return [re.sub(r"[^a-z0-9]+", "_", c.lower()).strip("_") for c in cells]
+
+def _valid(row) -> bool:
+    if not (_missing(row[0]) or _DIGITS.match(row[0])):
+        return False
+    counts = []
+    for i in COUNT_COLS:
+        if _missing(row[i]):
+            counts.append(None)
+        elif _COUNT.match(row[i]):
+            counts.append(int(row[i]))
+        else:
+            return False
+    tot, sc, st = counts
+    return tot is None or ((sc is None or sc <= tot) and (st is None or st <= tot))
+
+def _merge(cells, cuts):
+    """Join `cells` into 7 columns split before the given indexes; None if a count merge is not a thousands join."""
+    bounds = [0, *cuts, len(cells)]
+    row = []
+    for col, (a, b) in enumerate(zip(bounds, bounds[1:])):
+        parts = cells[a:b]
+        if col in COUNT_COLS:
+            if len(parts) > 1 and not all(_THOUSANDS.match(p) for p in parts[1:]):
+                return None
+            row.append("".join(parts))
+        else:
+            row.append(" ".join(p for p in parts if p))
+    return row
+
+def _repair(cells):
+    """Return (row, None) for the one valid merge of surplus cells, or (None, reason)."""
+    extra = len(cells) - len(COLUMNS)
+    if extra > MAX_EXTRA_CELLS:
+        return None, f"{len(cells)} cells"
+    valid = []
+    for cuts in combinations(range(1, len(cells)), len(COLUMNS) - 1):
+        row = _merge(cells, cuts)
+        if row is not None and _valid(row) and row not in valid:
+            valid.append(row)
+    if len(valid) > 1:
+        labelled = [r for r in valid if WARD_RE.match(r[2]) and EB_RE.search(r[3])]
+        valid = labelled if len(labelled) == 1 else valid
+    if len(valid) == 1:
+        return valid[0], None
+    return None, f"{len(cells)} cells, " + ("ambiguous repair" if valid else "no valid repair")
+
+def _clean(v: str) -> str:
+    v = norm_cell(v.replace("**", "").replace("`", ""))
+    if _GROUPED.match(v):
+        return v.replace(",", "")                           # "1,087" in one (quoted) cell
+    m = _WHOLE_FLOAT.match(v)
+    return m.group(1) if m else v                           # 1087.0 from a float column
+
+def salvage_csv(text: str):
+    """Return (csv_text with the schema header, report) for one chunk's response (see module docstring)."""
+    rows, rejects, salvaged = [], [], 0
+    for line in text.splitlines():
+        raw = line.strip()
+        if not raw or raw.startswith("```") or raw.lower() == "csv" or _MD_SEPARATOR.match(raw):
+            continue
+        if raw.startswith("|") and raw.endswith("|"):
+            cells = raw.strip("|").split("|")
+        else:
+            cells = next(csv.reader([raw]))
+        cleaned = [_clean(c) for c in cells]
+        repaired = any("**" in c or "`" in c for c in cells)
+        trimmed = list(cleaned)
+        while len(trimmed) > len(COLUMNS) and trimmed[-1] == "":
+            trimmed.pop()                                   # trailing comma(s)
+        if _header_key(trimmed) == COLUMNS or is_1234567_row(trimmed):
+            continue
+        if len(trimmed) == 1 and not re.search(r"\d", trimmed[0]):
+            continue                                        # commentary around the CSV
+        if len(trimmed) < len(COLUMNS):
+            rejects.append((line, f"{len(trimmed)} cells"))
+            continue
+        if len(cleaned) == len(COLUMNS):
+            row, reason = (cleaned, None) if _valid(cleaned) else (None, "invalid values")
+        elif len(trimmed) == len(COLUMNS) and _valid(trimmed):
+            row, reason, repaired = trimmed, None, True     # only a trailing comma
+        else:
+            # A trailing empty cell may be an empty st_pop: repair with it first, then without
+            (row, reason), repaired = _repair(cleaned), True
+            if row is None and len(trimmed) > len(COLUMNS):
+                row, reason = _repair(trimmed)
+        if row is None:
+            rejects.append((line, reason))
+            continue
+        for i in COUNT_COLS:
+            if _missing(row[i]):
+                row[i] = ""
+        row[1:4] = [clean_text(v) for v in row[1:4]]
+        salvaged += repaired
+        rows.append(row)
+
+    buf = StringIO()
+    w = csv.writer(buf, lineterminator="\n")
+    w.writerow(COLUMNS)
+    w.writerows(rows)
+    n = len(rows) + len(rejects)
+    report = {"rows": len(rows), "salvaged": salvaged, "dropped": len(rejects),
+              "rate": len(rows) / n if n else 1.0, "rejects": rejects}
+    return buf.getvalue(), report
+
+# (response line, the row it must give, or None if it must be quarantined)
+CHECKS = [
+    ("0801,Town A,Ward 1,EB 1,1087,5,", ["0801", "Town A", "Ward 1", "EB 1", "1087", "5", ""]),
+    ('0801,Town A,Ward 1,EB 1,"1,087",5,', ["0801", "Town A", "Ward 1", "EB 1", "1087", "5", ""]),
+    ("0801,Town A,Ward 1,EB 1,1,087,5,", ["0801", "Town A", "Ward 1", "EB 1", "1087", "5", ""]),
+    ("0801,Town A,Ward 1,EB 1,1087.0,5.0,NaN", ["0801", "Town A", "Ward 1", "EB 1", "1087", "5", ""]),
+    ("0801,Town A,Ward 1,EB 1,NaN,NaN,NaN", ["0801", "Town A", "Ward 1", "EB 1", "", "", ""]),
+    ('0801,"Town, A",Ward 1,EB 1,1087,5,0', ["0801", "Town A", "Ward 1", "EB 1", "1087", "5", "0"]),
+    ("0801,Town A,Ward 1,EB 1,1087,5,,", ["0801", "Town A", "Ward 1", "EB 1", "1087", "5", ""]),
+    ("0801,Town A,Ward 1,EB 1,1087.5,5,", None),
+    ("0801,Town A,Ward 1,EB 1,087,5,", None),
+    ("0801,Town A,Ward 1,EB 1,5,1087,", None),
+    ("0801,Town A,EB 1,1087", None),
+]
+
+if __name__ == "__main__":
+    failed = 0
+    for line, want in CHECKS:
+        text, report = salvage_csv(line)
+        got = next(csv.reader(StringIO(text.splitlines()[1]))) if report["rows"] else None
+        if got != want:
+            failed += 1
+            print(f"[ERROR] {line!r}: got {got}, expected {want}")
+    print(f"[INFO] {len(CHECKS) - failed} of {len(CHECKS)} salvage checks passed")
+    sys.exit(1 if failed else 0)
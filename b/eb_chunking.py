@@ -0,0 +1,124 @@
+"""
+eb_chunking.py
+
+Adaptive chunking of EB extracts for llm_csv_hb_extractor.py.
+
+A fixed 20 pages per request is wrong both ways: dense pages can produce more CSV
+than the model's output budget (the response is cut off at MAX_TOKENS and rows
+are silently lost), while sparse pages spend a whole request on a few rows.
+Instead, the number of table rows on each page is estimated from the PDF's text
+layer, and pages are packed into a chunk until its expected CSV output reaches
+a token budget.
+
+  - estimate_page_rows(pdf) -> [rows or None per page]; a table row is a text line
+    with at least MIN_NUMBERS_PER_ROW numeric cells (words grouped by baseline).
+    None means no usable text layer (scanned page); plan_spans sizes chunks of
+    None and 0 pages like the old fixed 20-page chunks. `pdf` is a path or an open
+    PyMuPDF document, so the extractor can reuse the one it already has open.
+  - plan_spans(page_rows, max_pages, output_tokens) -> [(start, end)] 0-based,
+    end exclusive.
+  - page_runs(pages) -> the runs of consecutive pages in a set, as spans, so
+    pages read locally (local_eb_table.py) can be cut out of the LLM's chunks.
+  - needs_split(...) says whether a response looks truncated or short of rows,
+    so the chunk is split in half and each half requested again.
+  - split_pdf_bytes(data, n_first, parser) cuts a chunk PDF in two with the
+    parser (pypdf or PyMuPDF) that prepared the chunk.
+"""
+
+from contextlib import nullcontext
+from io import BytesIO
+import re
+
+import pypdf
+
+# Rough CSV output per table row (7 short columns) in tokens
+TOKENS_PER_ROW = 25
+# Rows assumed for a page without a text layer, or whose text shows no table rows
+# (the estimate missed its table); 40 rows x 20 pages = the old fixed chunk
+DEFAULT_ROWS_PER_PAGE = 40
+MIN_NUMBERS_PER_ROW = 3
+# Below this many estimated rows the row-count check is too noisy to act on
+MIN_ROWS_TO_CHECK = 10
+
+_NUMBER = re.compile(r"^[\d,.()-]*\d[\d,.()-]*$")
+
+def estimate_page_rows(pdf) -> list:
+    """Estimated table rows per page from the text layer (None for pages without text)."""
+    import fitz
+    rows = []
+    with nullcontext(pdf) if isinstance(pdf, fitz.Document) else fitz.open(pdf) as doc:
+        for page in doc:
+            words = page.get_text("words")
+            if not words:
+                rows.append(None)
+                continue
+            lines = {}
+            for x0, y0, x1, y1, word, *_ in words:
+                lines.setdefault(round(y1 / 3), []).append(word)
+            rows.append(sum(1 for ws in lines.values()
+                            if sum(1 for w in ws if _NUMBER.match(w)) >= MIN_NUMBERS_PER_ROW))
+    return rows
+
+def plan_spans(page_rows, max_pages: int, output_tokens: int) -> list[tuple[int, int]]:
+    """
+    Pack consecutive pages into chunks of at most max_pages and ~output_tokens of CSV.
+    A page estimated at None or 0 rows counts as DEFAULT_ROWS_PER_PAGE, so runs of
+    such pages get the old 20-page chunks rather than max_pages.
+    """
+    spans, start, tokens = [], 0, 0
+    for i, r in enumerate(page_rows):
+        t = (r or DEFAULT_ROWS_PER_PAGE) * TOKENS_PER_ROW
+        if i > start and (i - start >= max_pages or tokens + t > output_tokens):
+            spans.append((start, i))
+            start, tokens = i, 0
+        tokens += t
+    if start < len(page_rows):
+        spans.append((start, len(page_rows)))
+    return spans
+
+def fixed_spans(num_pages: int, chunk_pages: int) -> list[tuple[int, int]]:
+    return [(s, min(s + chunk_pages, num_pages)) for s in range(0, num_pages, chunk_pages)]
+
+def page_runs(pages) -> list[tuple[int, int]]:
+    """Runs of consecutive 0-based pages as [(start, end)] spans, end exclusive."""
+    runs = []
+    for p in sorted(pages):
+        if runs and runs[-1][1] == p:
+            runs[-1] = (runs[-1][0], p + 1)
+        else:
+            runs.append((p, p + 1))
+    return runs
+
+def needs_split(truncated: bool, n_rows, page_rows, min_row_ratio: float):
+    """Return the reason a chunk response should be split and retried, or None."""
+    if truncated:
+        return "truncated"
+    known = [r for r in page_rows if r is not None]
+    if n_rows is None or len(known) < len(page_rows):
+        return None
+    est = sum(known)
+    if est >= MIN_ROWS_TO_CHECK and n_rows < min_row_ratio * est:
+        return f"{n_rows} rows, ~{est} expected"
+    return None
+
+def split_pdf_bytes(data: bytes, n_first: int, parser: str = "pypdf") -> tuple[bytes, bytes]:
+    """Cut a chunk PDF after its first n_first pages with the given parser ("pypdf" or "pymupdf")."""
+    if parser == "pymupdf":
+        import fitz
+        out = []
+        with fitz.open(stream=data, filetype="pdf") as src:
+            for first, last in ((0, n_first - 1), (n_first, src.page_count - 1)):
+                with fitz.open() as part:
+                    part.insert_pdf(src, from_page=first, to_page=last)
+                    out.append(part.tobytes(no_new_id=True))
+        return out[0], out[1]
+    reader = pypdf.PdfReader(BytesIO(data))
+    out = []
+    for pages in (range(0, n_first), range(n_first, len(reader.pages))):
+        writer = pypdf.PdfWriter()
+        for i in pages:
+            writer.add_page(reader.pages[i])
+        buf = BytesIO()
+        writer.write(buf)
+        out.append(buf.getvalue())
+    return out[0], out[1]
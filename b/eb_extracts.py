@@ -0,0 +1,136 @@
+"""
+eb_extracts.py
+
+Cutting EB page ranges into eb_table_extracts/<name>_EB.pdf, shared by
+extract_handbook_pages.py and the fused scan-and-slice mode of find_eb_pages.py
+(--slice 1), so both write the same files and the same extraction summary.
+
+  - Page sets: the pages to cut are written as a page-set expression of 1-based
+    runs, e.g. "120-140,402-410", so several EB runs of one handbook are cut into
+    one _EB.pdf without the non-table pages between them.
+  - write_pages_pypdf / write_pages_pymupdf copy a list of 0-based pages of an
+    already open document to a new PDF.
+  - The extraction summary (eb_table_extracts/pcXX_extraction_summary.csv) has one
+    row per file with the page set cut and the input's size/mtime/sha256, which is
+    what extract_handbook_pages.py checks to skip files that are already cut.
+"""
+
+from pathlib import Path
+import os
+
+import pandas as pd
+
+SUMMARY_COLUMNS = ["filename", "start_page", "end_page", "page_set", "num_pages", "output_file", "status",
+                   "parser", "input_bytes", "output_bytes", "seconds", "input_mtime_ns", "input_sha256"]
+
+class PageRangeError(ValueError):
+    """The requested page range does not fit the PDF (a CSV problem, not a parser failure)."""
+
+def page_runs(pages) -> list[list[int]]:
+    """[3, 4, 5, 9] -> [[3, 4, 5], [9]] (sorted, duplicates dropped)."""
+    runs = []
+    for pg in sorted(set(pages)):
+        if runs and pg == runs[-1][-1] + 1:
+            runs[-1].append(pg)
+        else:
+            runs.append([pg])
+    return runs
+
+def format_page_set(pages) -> str:
+    """[120, 121, 122, 402] -> '120-122,402'"""
+    return ",".join(f"{r[0]}-{r[-1]}" if len(r) > 1 else f"{r[0]}" for r in page_runs(pages))
+
+def parse_page_set(expr: str) -> list[int]:
+    """'120-122, 402' -> [120, 121, 122, 402]. Raises PageRangeError on a malformed expression."""
+    pages = []
+    for part in str(expr).split(","):
+        part = part.strip()
+        if not part:
+            continue
+        a, sep, b = part.partition("-")
+        try:
+            first, last = int(a), int(b) if sep else int(a)
+        except ValueError:
+            raise PageRangeError(f"invalid page set {expr!r}") from None
+        if first > last:
+            raise PageRangeError(f"invalid page set {expr!r} ({part} runs backwards)")
+        pages.extend(range(first, last + 1))
+    if not pages:
+        raise PageRangeError(f"empty page set {expr!r}")
+    return sorted(set(pages))
+
+def _page_number(v):
+    """int page from a CSV cell, or None if it is empty/NaN."""
+    if v is None or (isinstance(v, float) and v != v) or str(v).strip() == "":
+        return None
+    return int(float(v))
+
+def row_pages(row: dict) -> list[int]:
+    """
+    1-based pages of a review/summary row: its page_set if filled in and it starts
+    at start_page and ends at end_page, otherwise start_page..end_page (rows from
+    older CSVs). A page_set that disagrees with start_page/end_page means the
+    range was corrected by hand, so the range wins, with a warning.
+    """
+    expr = row.get("page_set")
+    start, end = _page_number(row.get("start_page")), _page_number(row.get("end_page"))
+    if isinstance(expr, str) and expr.strip():
+        pages = parse_page_set(expr)
+        if start is None or end is None or (pages[0], pages[-1]) == (start, end):
+            return pages
+        print(f"[WARN] {row.get('filename', '')}: page_set {expr} does not match start/end page "
+              f"{start}-{end}; using {start}-{end}")
+    if start is None or end is None:
+        raise PageRangeError("no page_set or start/end page")
+    return list(range(start, end + 1))
+
+def check_pages(n_pages: int, pages_0: list[int]):
+    if not pages_0 or pages_0[0] < 0 or pages_0[-1] >= n_pages:
+        expr = format_page_set(p + 1 for p in pages_0)
+        raise PageRangeError(f"invalid page range {expr} (PDF has {n_pages} pages)")
+
+def output_name(filename: str) -> str:
+    return filename.replace(".pdf", "_EB.pdf")
+
+def write_pages_pypdf(reader, writer_cls, pages_0: list[int], output_pdf_path: Path):
+    """Copy sorted 0-based pages with a pypdf reader (writer_cls is that library's PdfWriter)."""
+    check_pages(len(reader.pages), pages_0)
+    writer = writer_cls()
+    for i in pages_0:
+        writer.add_page(reader.pages[i])
+    with open(output_pdf_path, "wb") as f_out:
+        writer.write(f_out)
+
+def write_pages_pymupdf(src, pages_0: list[int], output_pdf_path: Path):
+    """
+    Copy sorted 0-based pages from an open PyMuPDF document, one insert per run.
+    Saving with garbage=4 drops objects the copied pages don't use and merges
+    duplicates, and deflate compresses uncompressed streams, so a 10-page slice
+    does not carry the fonts/images of the whole handbook.
+    """
+    import fitz
+    check_pages(src.page_count, pages_0)
+    with fitz.open() as out:
+        for run in page_runs(pages_0):
+            out.insert_pdf(src, from_page=run[0], to_page=run[-1])
+        out.save(output_pdf_path, garbage=4, deflate=True)
+
+def load_summary(path: Path) -> dict:
+    """Return {filename: row} from an extraction summary ({} if none)."""
+    if not path.exists():
+        return {}
+    prev = pd.read_csv(path, dtype=str).fillna("")
+    return {row["filename"]: row for row in prev.to_dict("records")}
+
+def save_summary(path: Path, rows: dict, order=()):
+    """
+    Write {filename: row} as the extraction summary, atomically. Files listed in
+    `order` come first in that order, the rest follow by filename.
+    """
+    if not rows:
+        return
+    rank = {name: i for i, name in enumerate(order)}
+    ordered = sorted(rows.values(), key=lambda r: (rank.get(r["filename"], len(rank)), r["filename"]))
+    tmp = path.with_suffix(".csv.tmp")
+    pd.DataFrame(ordered).reindex(columns=SUMMARY_COLUMNS).to_csv(tmp, index=False)
+    os.replace(tmp, path)
@@ -0,0 +1,110 @@
+"""
+eb_rules.py
+
+EB page detection rules for find_eb_pages.py, loaded from data/eb_page_rules.json.
+
+Each series maps to a rule set of phrases and column hints. A page is an EB page if
+it matches any phrase AND the hints (any of them, or all of them for hints_mode
+"all"). Phrases match ignoring whitespace ("URBAN BLOCK WISE" also matches
+"URBANBLOCK  WISE" split across lines); hints match as exact substrings. Both are
+case-insensitive.
+
+All phrases and hints of a rule set are compiled into one alternation of literals
+(no capture groups, so the regex engine keeps its first-character scan), run over the page uppercased with whitespace dropped
+(str.split, no regex substitution). Every matching rule id comes back from that
+single pass; a hint found there is confirmed with one substring check on the
+uppercased page, since hints must match with their spacing intact.
+
+Usage:
+  rules = load_rules(RULES_JSON, "pc01")
+  rules.match(text)     -> {"urban_block_wise", "name_of_town"}
+  rules.criteria(text)  -> (phrase_ok, hints_ok, any_evidence)
+  rules.version         -> short hash of the rule set, changes whenever it is edited
+"""
+
+from pathlib import Path
+import hashlib
+import json
+import re
+
+DEFAULT_RULES_JSON = Path(__file__).resolve().parent.parent / "data" / "eb_page_rules.json"
+
+def _collapse(text: str) -> str:
+    """Uppercase and drop all whitespace."""
+    return re.sub(r"\s+", "", text.upper())
+
+class EbRules:
+    def __init__(self, name: str, phrases: list[dict], hints: list[dict], hints_mode: str = "any"):
+        if hints_mode not in ("any", "all"):
+            raise ValueError(f"rule set {name!r}: hints_mode must be 'any' or 'all', got {hints_mode!r}")
+        self.name = name
+        self.phrases = [(r["id"], r["text"]) for r in phrases]
+        self.hints = [(r["id"], r["text"]) for r in hints]
+        self.hints_mode = hints_mode
+        self.phrase_ids = frozenset(i for i, _ in self.phrases)
+        self.hint_ids = frozenset(i for i, _ in self.hints)
+        self._check()
+
+        # Matched text -> rule id; _check() guarantees the collapsed texts are distinct.
+        # Named groups would be simpler, but they disable the engine's prefix scan (~5x slower).
+        self._rule_ids = {_collapse(text): rid for rid, text in self.phrases + self.hints}
+        self._hint_upper = {rid: text.upper() for rid, text in self.hints}
+        self._rx = re.compile("|".join(map(re.escape, self._rule_ids))) if self._rule_ids else None
+
+        canon = json.dumps([self.phrases, self.hints, self.hints_mode])
+        self.version = hashlib.sha256(canon.encode("utf-8")).hexdigest()[:12]
+
+    def _check(self):
+        ids = [i for i, _ in self.phrases + self.hints]
+        dupes = {i for i in ids if ids.count(i) > 1}
+        if dupes:
+            raise ValueError(f"rule set {self.name!r}: duplicate rule ids {sorted(dupes)}")
+        # A rule whose text starts another's (or equals it) can match at the same offset,
+        # where the alternation only reports the first; such rules are redundant, so reject them.
+        texts = [(i, _collapse(t)) for i, t in self.phrases + self.hints]
+        for a, ta in texts:
+            for b, tb in texts:
+                if a != b and tb.startswith(ta):
+                    raise ValueError(f"rule set {self.name!r}: rule {a!r} is a prefix of rule {b!r}")
+
+    def match(self, page_text: str) -> set[str]:
+        """Return the ids of all rules that occur in `page_text`."""
+        found = set()
+        if not page_text or self._rx is None:
+            return found
+        upper = page_text.upper()
+        text = "".join(upper.split())
+        n_rules = len(self._rule_ids)
+        search = self._rx.search
+        m = search(text)
+        while m:
+            found.add(self._rule_ids[m.group()])
+            if len(found) == n_rules:
+                break
+            # Resume one character in, so a rule starting inside this match is still seen
+            m = search(text, m.start() + 1)
+        for rid in self.hint_ids & found:
+            if self._hint_upper[rid] not in upper:
+                found.discard(rid)
+        return found
+
+    def criteria(self, page_text: str) -> tuple[bool, bool, bool]:
+        """
+        Evaluate the rule set on a page's text.
+        Returns (phrase_ok, hints_ok, any_evidence), where any_evidence is True if
+        any phrase or any column hint occurs at all.
+        """
+        found = self.match(page_text)
+        phrase_ok = not self.phrase_ids.isdisjoint(found)
+        any_hint = not self.hint_ids.isdisjoint(found)
+        hints_ok = self.hint_ids <= found if self.hints_mode == "all" else any_hint
+        return phrase_ok, hints_ok, phrase_ok or any_hint
+
+def load_rules(path: Path, series: str) -> EbRules:
+    """Load the rule set for `series` from a rules JSON file (see data/eb_page_rules.json)."""
+    cfg = json.loads(Path(path).read_text())
+    name = cfg.get("series", {}).get(series)
+    if name is None:
+        raise ValueError(f"{path}: no rule set for series {series!r}")
+    rs = cfg["rule_sets"][name]
+    return EbRules(name, rs.get("phrases", []), rs.get("hints", []), rs.get("hints_mode", "any"))
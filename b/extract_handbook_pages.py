@@ -4,25 +4,62 @@ INPUTS:
   - ~/iec/pcXX/district_handbooks/*.pdf
   - ~/iec/pcXX/district_handbooks_xii_b/pcXX_page_ranges_for_review.csv
   - ~/iec/pcXX/district_handbooks_xii_b/*.pdf
+  - ~/iec/pcXX/district_handbooks*/pdf_parser_memo.json
+  - ~/iec/pcXX/district_handbooks*/eb_table_extracts/pcXX_extraction_summary.csv (previous run)
 OUTPUTS:
   - ~/iec/pcXX/district_handbooks/eb_table_extracts/*_EB.pdf
   - ~/iec/pcXX/district_handbooks/eb_table_extracts/pcXX_extraction_summary.csv
   - ~/iec/pcXX/district_handbooks_xii_b/eb_table_extracts/*_EB.pdf
   - ~/iec/pcXX/district_handbooks_xii_b/eb_table_extracts/pcXX_extraction_summary.csv
+  - ~/iec/pcXX/district_handbooks*/pdf_parser_memo.json
+
+Cuts each file's EB pages into eb_table_extracts/<name>_EB.pdf. A row's page_set
+(e.g. "120-140,402-410") is used when filled in and it runs from start_page to
+end_page; otherwise start_page..end_page is cut (with a warning if page_set
+disagrees), so a manual correction can just edit the start and end page.
+  - Idempotent: the extraction summary records each input's size, mtime and sha256
+    and the range cut; a file is skipped when those and its output are unchanged, so
+    a rerun after correcting one range only re-cuts that file (--reprocess 1 re-cuts all).
+  - Parallel: --workers N slices files in N processes.
+  - Engines: --engine pymupdf cuts with PyMuPDF and garbage-collects/deflates the output,
+    which keeps shared fonts/images of the full handbook out of small _EB.pdf files.
+    Input/output bytes and seconds per file are recorded in the extraction summary.
 """
 
 import pandas as pd
 import os
+import time
 import argparse
 import sys, shlex
-from PyPDF2 import PdfReader, PdfWriter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pypdf import PdfReader, PdfWriter
 from pathlib import Path
 
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from hb_cache import ParserMemo, file_sha256
+from eb_extracts import (PageRangeError, write_pages_pypdf, write_pages_pymupdf, output_name,
+                         load_summary, save_summary, format_page_set, row_pages)
+
+# Slicing backends, tried in the order chosen by the parser memo
+SLICE_PARSERS = ("pypdf", "pymupdf")
+
+def _slice_with_pypdf(input_pdf_path: Path, pages_0: list[int], output_pdf_path: Path):
+    """Copy sorted 0-based pages into output_pdf_path with pypdf."""
+    write_pages_pypdf(PdfReader(str(input_pdf_path)), PdfWriter, pages_0, output_pdf_path)
+
+def _slice_with_pymupdf(input_pdf_path: Path, pages_0: list[int], output_pdf_path: Path):
+    """Same as _slice_with_pypdf using PyMuPDF, which tolerates PDFs pypdf cannot read."""
+    import fitz
+    with fitz.open(input_pdf_path) as src:
+        write_pages_pymupdf(src, pages_0, output_pdf_path)
+
+SLICERS = {"pypdf": _slice_with_pypdf, "pymupdf": _slice_with_pymupdf}
+
 def load_page_ranges_csv(csv_path: Path) -> pd.DataFrame:
     if not csv_path.exists():
         raise FileNotFoundError(f"CSV not found: {csv_path}")
     
-    df = pd.read_csv(csv_path)
+    df = pd.read_csv(csv_path, dtype={"page_set": str})
     
     # Normalize column names
     df.columns = [c.strip().lower() for c in df.columns]
@@ -43,6 +80,15 @@ p.add_argument("--pdf_root", required=True,
 p.add_argument("--pdf_source_directory", default="",
                help="Subfolder (under --pdf_root) where the input PDFs live. "
                     "If empty, PDFs are read directly from --pdf_root.")
+p.add_argument("--engine", choices=["auto", "pypdf", "pymupdf"], default="auto",
+               help="Slicing engine. auto=default: fastest engine known to work per file (parser memo); "
+                    "pymupdf=PyMuPDF insert_pdf with unused-object cleanup and stream compression "
+                    "(smaller _EB.pdf files); pypdf=pypdf page copy. The other engine is the fallback.")
+p.add_argument("--workers", type=int, default=1,
+               help="Number of slicing processes. 1=default: slice serially.")
+p.add_argument("--reprocess", type=int, choices=[0, 1], default=0,
+               help="0=default: skip files whose input, page range and output are unchanged since the "
+                    "last run (per the extraction summary); 1=re-cut every file.")
 
 # Handle Stata single-argument blob
 argv = sys.argv[1:]
@@ -57,79 +103,194 @@ csv_path = pdf_root / f"{args.series}_page_ranges_for_review.csv"
 sub = (args.pdf_source_directory or "").strip()
 pdf_source_dir = (pdf_root / sub) if sub else pdf_root
 output_dir = pdf_root / "eb_table_extracts"
-output_dir.mkdir(parents=True, exist_ok=True)
+summary_csv = output_dir / f"{args.series}_extraction_summary.csv"
 
-# Load CSV
-print(f"Loading page ranges from: {csv_path}")
-df = load_page_ranges_csv(csv_path)
+def is_up_to_date(prev_row: dict, input_pdf_path: Path, pages: list[int], output_pdf_path: Path) -> bool:
+    """
+    True if the summary says this exact page set was already cut from this exact input
+    and the output is still there. The input's sha256 is only recomputed when its
+    size or mtime moved (e.g. a copy of the same file).
+    """
+    if not prev_row or prev_row.get("status") != "success" or not output_pdf_path.exists():
+        return False
+    try:
+        if row_pages(prev_row) != pages:
+            return False
+    except (PageRangeError, ValueError):
+        return False
+    if args.engine != "auto" and prev_row.get("parser") != args.engine:
+        return False
+    st = os.stat(input_pdf_path)
+    if (prev_row.get("input_bytes"), prev_row.get("input_mtime_ns")) == (str(st.st_size), str(st.st_mtime_ns)):
+        return True
+    return bool(prev_row.get("input_sha256")) and file_sha256(input_pdf_path) == prev_row["input_sha256"]
 
-# Filter to only rows with valid page ranges
-df = df.dropna(subset=['start_page', 'end_page'])
-df['start_page'] = df['start_page'].astype(int)
-df['end_page'] = df['end_page'].astype(int)
+def slice_one(filename: str, input_pdf_path: Path, pages: list[int],
+              output_pdf_path: Path, parsers: list[str]) -> dict:
+    """
+    Cut the sorted 1-based `pages` of one PDF into one output, trying `parsers` in order.
+    Runs in a worker process when --workers > 1, so parser attempts are returned
+    for the main process to record in the memo rather than recorded here.
+    The output is written to a temp name and renamed, so a half-written _EB.pdf
+    never looks complete.
+    """
+    pages_0 = [pg - 1 for pg in pages]
+    tmp_path = output_pdf_path.with_suffix(".pdf.tmp")
+    res = {"filename": filename, "parser": None, "error": None, "range_error": False, "attempts": []}
+    for candidate in parsers:
+        t0 = time.perf_counter()
+        try:
+            SLICERS[candidate](input_pdf_path, pages_0, tmp_path)
+        except PageRangeError as e:
+            # A bad range is a property of the CSV row, not of the parser
+            res["error"], res["range_error"] = f"{e}", True
+            break
+        except Exception as e:
+            res["error"] = f"{type(e).__name__}: {e}"
+            res["attempts"].append((candidate, False, 0, 0.0, res["error"]))
+            continue
+        seconds = time.perf_counter() - t0
+        res["attempts"].append((candidate, True, len(pages), seconds, ""))
+        res["parser"] = candidate
+        break
+    if res["parser"] is None:
+        tmp_path.unlink(missing_ok=True)
+        return res
+    os.replace(tmp_path, output_pdf_path)
 
-print(f"Found {len(df)} files to process\n")
+    st = os.stat(input_pdf_path)
+    res["row"] = {
+        "filename": filename,
+        "start_page": pages[0],
+        "end_page": pages[-1],
+        "page_set": format_page_set(pages),
+        "num_pages": len(pages),
+        "output_file": output_pdf_path.name,
+        "status": "success",
+        "parser": res["parser"],
+        "input_bytes": st.st_size,
+        "output_bytes": output_pdf_path.stat().st_size,
+        "seconds": round(seconds, 3),
+        "input_mtime_ns": st.st_mtime_ns,
+        "input_sha256": file_sha256(input_pdf_path),
+    }
+    return res
 
-# Extract per file
-results = []
-skipped = []
+def main():
+    output_dir.mkdir(parents=True, exist_ok=True)
 
-for idx, row in df.iterrows():
-    filename = row['filename']
-    start_page = row['start_page']
-    end_page = row['end_page']
-    
-    # Convert to 0-indexed
-    start_0 = start_page - 1
-    end_0 = end_page - 1
-    
-    input_pdf_path = (pdf_source_dir / filename).resolve()
-    
-    if not input_pdf_path.exists():
-        print(f"{filename}: not found in {pdf_source_dir} → skip")
-        skipped.append(filename)
-        continue
-    
-    output_pdf_path = output_dir / filename.replace(".pdf", "_EB.pdf")
-    
-    try:
-        reader = PdfReader(str(input_pdf_path))
-        n_pages = len(reader.pages)
-        
-        if start_0 < 0 or end_0 >= n_pages or start_0 > end_0:
-            print(f"{filename}: invalid page range {start_page}-{end_page} (PDF has {n_pages} pages) → skip")
+    # Parser choice per file, shared with find_eb_pages.py
+    memo = ParserMemo(pdf_root / "pdf_parser_memo.json", pdf_root)
+
+    # Load CSV
+    print(f"Loading page ranges from: {csv_path}")
+    df = load_page_ranges_csv(csv_path)
+
+    # Filter to only rows with a page set or a valid start/end range
+    if 'page_set' not in df.columns:
+        df['page_set'] = ""
+    df['page_set'] = df['page_set'].fillna("").astype(str)
+    df = df[(df['page_set'].str.strip() != "") | df[['start_page', 'end_page']].notna().all(axis=1)]
+
+    print(f"Found {len(df)} files to process\n")
+
+    # Earlier results: rows whose input, range and output are unchanged are kept as they are
+    # (--reprocess 1 re-cuts every file in the CSV, but rows of files not in it are still kept)
+    previous = load_summary(summary_csv)
+
+    # Extract per file
+    results = {}
+    sliced = []
+    skipped = []
+    unchanged = 0
+    tasks = []
+
+    for row in df[["filename", "start_page", "end_page", "page_set"]].to_dict("records"):
+        filename = row["filename"]
+        try:
+            pages = row_pages(row)
+        except (PageRangeError, ValueError) as e:
+            print(f"{filename}: {e} → skip")
+            skipped.append(filename)
+            continue
+        input_pdf_path = (pdf_source_dir / filename).resolve()
+
+        if not input_pdf_path.exists():
+            print(f"{filename}: not found in {pdf_source_dir} → skip")
             skipped.append(filename)
             continue
-        
-        writer = PdfWriter()
-        for i in range(start_0, end_0 + 1):
-            writer.add_page(reader.pages[i])
-        
-        with open(output_pdf_path, "wb") as f_out:
-            writer.write(f_out)
-        
-        print(f"✓ {filename}: extracted pages {start_page}-{end_page} → {output_pdf_path.name}")
-        
-        results.append({
-            'filename': filename,
-            'start_page': start_page,
-            'end_page': end_page,
-            'num_pages': end_page - start_page + 1,
-            'output_file': output_pdf_path.name,
-            'status': 'success'
-        })
-        
-    except Exception as e:
-        print(f"✗ {filename}: {type(e).__name__}: {e}")
-        skipped.append(filename)
-
-# Save extraction summary
-if results:
-    results_df = pd.DataFrame(results)
-    summary_csv = output_dir / f"{args.series}_extraction_summary.csv"
-    results_df.to_csv(summary_csv, index=False)
-    print(f"\n✓ Extraction summary saved to {summary_csv}")
-
-print(f"\n=== Summary ===")
-print(f"Successfully extracted: {len(results)}")
-print(f"Skipped/Failed: {len(skipped)}")
+
+        output_pdf_path = output_dir / output_name(filename)
+
+        if not args.reprocess and is_up_to_date(previous.get(filename), input_pdf_path, pages, output_pdf_path):
+            results[filename] = previous[filename]
+            unchanged += 1
+            continue
+
+        # Try slicers in memo order: fastest known to work first, known failures skipped;
+        # an explicit --engine goes first, with the other engine as the fallback
+        parsers = memo.order(input_pdf_path, SLICE_PARSERS, "slice")
+        if args.engine != "auto":
+            parsers = [args.engine] + [ps for ps in SLICE_PARSERS if ps != args.engine]
+        tasks.append((filename, input_pdf_path, pages, output_pdf_path, parsers))
+
+    print(f"Unchanged since last run: {unchanged}; slicing {len(tasks)} files"
+          + (f" with {args.workers} workers" if args.workers > 1 else "") + "\n")
+
+    def handle(task, res):
+        filename, input_pdf_path, pages, output_pdf_path, _ = task
+        for candidate, ok, n_pages, seconds, error in res["attempts"]:
+            if not ok:
+                print(f"  {candidate} failed on {filename}: {error}")
+            memo.record(input_pdf_path, candidate, "slice", ok=ok, pages=n_pages, seconds=seconds, error=error)
+        if res["parser"] is None:
+            if res["range_error"]:
+                print(f"{filename}: {res['error']} → skip")
+            else:
+                print(f"✗ {filename}: {res['error']}")
+            skipped.append(filename)
+            return
+        row = res["row"]
+        print(f"✓ {filename}: extracted pages {format_page_set(pages)} → {output_pdf_path.name} "
+              f"({res['parser']}, {row['input_bytes'] / 1e6:.1f} MB → {row['output_bytes'] / 1e6:.2f} MB, "
+              f"{row['seconds']:.2f}s)")
+        results[filename] = row
+        sliced.append(row)
+
+    try:
+        if args.workers > 1 and len(tasks) > 1:
+            with ProcessPoolExecutor(max_workers=args.workers) as ex:
+                futures = {ex.submit(slice_one, *task): task for task in tasks}
+                for fut in as_completed(futures):
+                    task = futures[fut]
+                    try:
+                        res = fut.result()
+                    except Exception as e:
+                        res = {"parser": None, "error": f"{type(e).__name__}: {e}",
+                               "range_error": False, "attempts": []}
+                    handle(task, res)
+        else:
+            for task in tasks:
+                handle(task, slice_one(*task))
+    finally:
+        memo.save()
+
+    # Save extraction summary (earlier rows for files not in this run's CSV are kept)
+    merged = {name: row for name, row in previous.items() if name not in results and name not in skipped}
+    merged.update(results)
+    if merged:
+        save_summary(summary_csv, merged, df["filename"])
+        print(f"\n✓ Extraction summary saved to {summary_csv}")
+
+    print(f"\n=== Summary ===")
+    print(f"Successfully extracted: {len(sliced)}")
+    if sliced:
+        in_mb = sum(r["input_bytes"] for r in sliced) / 1e6
+        out_mb = sum(r["output_bytes"] for r in sliced) / 1e6
+        print(f"Bytes in → out:         {in_mb:.1f} MB → {out_mb:.1f} MB "
+              f"in {sum(r['seconds'] for r in sliced):.1f}s of slicing")
+    print(f"Unchanged (skipped):    {unchanged}")
+    print(f"Skipped/Failed: {len(skipped)}")
+
+if __name__ == "__main__":
+    main()
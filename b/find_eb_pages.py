@@ -5,11 +5,20 @@ INPUTS:
   - ~/iec/pcXX/district_handbooks_xii_b/*.pdf
   - ~/iec/pcXX/district_handbooks/urban_eb_pages.csv
   - ~/iec/pcXX/district_handbooks_xii_b/urban_eb_pages.csv
+  - ~/iec/pcXX/district_handbooks*/pdf_parser_memo.json
+  - ~/iec/pcXX/district_handbooks*/eb_scan_manifest.csv
+  - data/eb_page_rules.json
 OUTPUTS:
   - ~/iec/pcXX/district_handbooks/urban_eb_pages.csv
   - ~/iec/pcXX/district_handbooks_xii_b/urban_eb_pages.csv
   - ~/iec/pcXX/district_handbooks/pcXX_page_ranges_for_review.csv
   - ~/iec/pcXX/district_handbooks_xii_b/pcXX_page_ranges_for_review.csv
+  - ~/iec/pcXX/district_handbooks*/pdf_parser_memo.json
+  - ~/iec/pcXX/district_handbooks*/eb_scan_manifest.csv
+  - ~/iec/pcXX/district_handbooks*/eb_scan_journal.jsonl (only while running / after a crash)
+  - ~/iec/pcXX/district_handbooks*/eb_table_extracts/*_EB.pdf (--slice 1)
+  - ~/iec/pcXX/district_handbooks*/eb_table_extracts/pcXX_extraction_summary.csv (--slice 1)
+  - ~/iec/pcXX/district_handbooks*/.page_text_cache.sqlite
 
 find_pages.py
 
@@ -20,14 +29,59 @@ monitor progress with `tail -f`.
 Key features:
   - Optional subfolder scanning: --pdf_source_directory <name> makes the scanner
     look in --pdf_root/<name>, while still writing the output CSV to --pdf_root.
-  - Skip-by-default: if a PDF already has rows in the output CSV, it is not re-scanned.
+  - Incremental by default: --pdf_root/eb_scan_manifest.csv records each PDF's size,
+    mtime, sha256, rule-set version and result (hits / no_hits / failed). A default run
+    only scans PDFs that are new, whose contents changed, or that were scanned with an
+    older version of the rules or other --search / --header_clip settings (so a
+    reverse/probe result is not kept by an exhaustive run); their old rows are dropped
+    first. --min_run_confidence only changes which runs are proposed, not the hits, so
+    it never forces a re-scan. Unchanged files cost
+    one stat(), so a no-op rerun is near-instant. A CSV from before the manifest existed
+    is adopted as-is (its files are treated as current).
   - Reprocess option: `--reprocess 1` recreates the CSV and re-scans all PDFs.
-  - Page range summary: After scanning, generates a summary CSV with start/end page ranges.
+  - Page range summary: After scanning, generates a summary CSV with each file's page set:
+    every run of hit pages scoring at least --min_run_confidence, e.g. "120-140,402-410",
+    with a confidence per run, plus the overall start/end page (from the hit pages kept
+    in the scan manifest, without re-reading the output CSV).
+  - Group-commit journal: results are appended to --pdf_root/eb_scan_journal.jsonl and
+    fsynced in batches (--commit_rows rows or --commit_secs seconds); each batch also
+    extends urban_eb_pages.csv, so `tail -f` still works. At the end the manifest is
+    rewritten and the journal dropped; after a crash, the next run replays it.
+  - Parallel scanning: `--workers N` fans PDFs out to a process pool. Rows are still
+    written by the main process, in the same sorted filename order as a serial run,
+    and one aggregate pages/sec progress line replaces the per-file bars.
+  - Detection rules: phrases and column hints per series live in data/eb_page_rules.json
+    (--rules) and are compiled into one matcher per series (eb_rules.py).
+  - Page text cache: extracted page text is stored in --pdf_root/.page_text_cache.sqlite,
+    keyed by (PDF sha256, page, parser). After editing the detection rules, a
+    `--reprocess 1` run re-evaluates them over cached text instead of re-parsing PDFs.
+    Size-capped by --text_cache_mb (least-recently-used documents are evicted).
+  - Parser memo: which parser (pypdf / PyMuPDF) worked on each file, and its pages/sec,
+    is kept in --pdf_root/pdf_parser_memo.json; later runs start with the fastest
+    parser known to work and skip ones known to fail.
+  - Search strategy: `--search reverse|probe` reads pages from the back of each handbook
+    and stops once the EB run is bounded by --stop_after_misses non-hit pages, so only
+    a fraction of pages are extracted; `--search exhaustive` (default) reads every page.
+  - Header-band fast path: `--header_clip 0.3` reads only the top 30% of each page with
+    PyMuPDF and falls back to the full page when that band is ambiguous;
+    `--header_clip_compare 1` times both paths and reports the pages/sec gain.
+  - Fused slicing: `--slice 1` cuts each scanned PDF's EB page set (the runs kept by
+    --min_run_confidence, as in the review CSV's page_set) straight to
+    eb_table_extracts/<name>_EB.pdf from the document the scan already has open, and
+    records it in pcXX_extraction_summary.csv, so LLM extraction can start on early files
+    while later ones are still being scanned. Unchanged files are re-cut from the
+    manifest's hit pages when their selected page set differs from the summary's (e.g.
+    after changing --min_run_confidence) or their _EB.pdf is missing. The review CSV is still written; after
+    correcting a range there, extract_handbook_pages.py re-cuts only the corrected files.
+  - Page sharding: with --workers, PDFs longer than --shard_pages are split into page
+    ranges scanned by separate workers and merged back into one hit list.
 
 Examples:
   python find_pages.py --series pc01 --pdf_root /path/to/district_handbooks
   python find_pages.py --series pc01 --pdf_root /path/to/district_handbooks --pdf_source_directory taha_2025_09_19
   python find_pages.py --series pc01 --pdf_root /path/to/district_handbooks --reprocess 1
+  python find_pages.py --series pc01 --pdf_root /path/to/district_handbooks --workers 16
+  python find_pages.py --series pc01 --pdf_root /path/to/district_handbooks --search probe
 
 Dependencies (install/upgrade in your conda env):
   pip install --upgrade pypdf "pymupdf>=1.24" tqdm pandas
@@ -37,15 +91,24 @@ Dependencies (install/upgrade in your conda env):
 # Standard library
 # ---------------------------------------------------------------------
 from pathlib import Path
-import re
 import csv
 import os
 import sys
 import shlex
+import time
 import argparse
+import multiprocessing as mp
+from collections import Counter, OrderedDict
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
 
 from ddlpy.utils import *
 
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from hb_cache import PageTextCache, ParserMemo, ScanManifest, ScanJournal, file_sha256, field_to_pages
+from eb_rules import load_rules, DEFAULT_RULES_JSON
+from eb_extracts import (write_pages_pypdf, write_pages_pymupdf, output_name, load_summary, save_summary,
+                         page_runs, format_page_set)
+
 # ---------------------------------------------------------------------
 # Third-party (imported lazily where sensible)
 # ---------------------------------------------------------------------
@@ -62,7 +125,45 @@ p.add_argument("--pdf_root", required=True,
 p.add_argument("--pdf_source_directory", default="",
                help="Optional subfolder under --pdf_root to scan PDFs from. If empty, scans --pdf_root.")
 p.add_argument("--reprocess", type=int, choices=[0, 1], default=0,
-               help="0=default: skip files already present in CSV; 1=recreate CSV and re-scan all PDFs.")
+               help="0=default: only scan new, changed, rule- or settings-stale PDFs (per the scan manifest); "
+                    "1=recreate CSV and re-scan all PDFs.")
+p.add_argument("--workers", type=int, default=1,
+               help="Number of scanner processes. 1=default: scan serially with a progress bar per file.")
+p.add_argument("--shard_pages", type=int, default=200,
+               help="With --workers > 1, PDFs longer than this many pages are split into page shards "
+                    "scanned by separate workers. 0=scan each PDF as a single task.")
+p.add_argument("--search", choices=["exhaustive", "reverse", "probe"], default="exhaustive",
+               help="Page search strategy. exhaustive=every page (default, use for verification); "
+                    "reverse=walk back from the last page and stop once the EB run is bounded by "
+                    "--stop_after_misses non-hit pages; probe=sample every --probe_stride-th page "
+                    "from the back, then expand around the first hit.")
+p.add_argument("--stop_after_misses", type=int, default=5,
+               help="For --search reverse/probe: consecutive non-hit pages that end an EB run.")
+p.add_argument("--probe_stride", type=int, default=4,
+               help="For --search probe: distance between probed pages.")
+p.add_argument("--header_clip", type=float, default=0,
+               help="Fraction of page height (e.g. 0.3) to read first as a header band with PyMuPDF; "
+                    "full-page text is only extracted when the band is ambiguous. 0=default: full pages. "
+                    "Makes PyMuPDF the first parser tried.")
+p.add_argument("--header_clip_compare", type=int, choices=[0, 1], default=0,
+               help="With --header_clip: also run the full-page path on every page, bypassing the text "
+                    "cache, and report pages/sec of both paths and how many decisions differ.")
+p.add_argument("--min_run_confidence", type=float, default=0.5,
+               help="Keep every run of consecutive hit pages scoring at least this (0-1; see select_eb_runs) "
+                    "in the review CSV's page_set, not just the longest run (always kept). 1=longest run only.")
+p.add_argument("--slice", type=int, choices=[0, 1], default=0,
+               help="1=also cut each scanned PDF's EB page set (the runs kept by --min_run_confidence) to "
+                    "eb_table_extracts/<name>_EB.pdf "
+                    "from the document already open for scanning, and record it in the extraction "
+                    "summary (what extract_handbook_pages.py would do). 0=default: scan only.")
+p.add_argument("--commit_rows", type=int, default=500,
+               help="Group commit: make results durable (journal fsync) once this many CSV rows are pending...")
+p.add_argument("--commit_secs", type=float, default=5.0,
+               help="...or once this many seconds have passed since the last commit.")
+p.add_argument("--rules", default=str(DEFAULT_RULES_JSON),
+               help="JSON file of EB detection phrases/hints per series (default: data/eb_page_rules.json).")
+p.add_argument("--text_cache_mb", type=int, default=4096,
+               help="Size cap (MB) of the on-disk page text cache in --pdf_root. 0=disable the cache.")
 
 # Handle Stata passing a single-argument blob (e.g., one long quoted string).
 argv = sys.argv[1:]
@@ -74,32 +175,31 @@ args = p.parse_args(argv)
 ROOT_DIR = Path(args.pdf_root)
 SCAN_DIR = ROOT_DIR / args.pdf_source_directory if args.pdf_source_directory.strip() else ROOT_DIR
 OUT_CSV = ROOT_DIR / "urban_eb_pages.csv"   # keep in root, unchanged
+TEXT_CACHE_DB = ROOT_DIR / ".page_text_cache.sqlite"
+PARSER_MEMO_JSON = ROOT_DIR / "pdf_parser_memo.json"
+SCAN_MANIFEST = ROOT_DIR / "eb_scan_manifest.csv"
+SCAN_JOURNAL = ROOT_DIR / "eb_scan_journal.jsonl"
+EXTRACT_DIR = ROOT_DIR / "eb_table_extracts"
+EXTRACTION_SUMMARY = EXTRACT_DIR / f"{args.series}_extraction_summary.csv"
 
 # ---------------------------------------------------------------------
-# Detection phrases / hints
-#   - PHRASES are matched in a whitespace-insensitive way (normalized).
-#   - EB_COLUMN_HINTS* are matched as plain uppercase substrings.
+# Detection rules (phrases / column hints per series, see eb_rules.py)
 # ---------------------------------------------------------------------
-# Default (non-pc91) rule: any phrase AND any EB column hint
-PHRASES = [
-    "APPENDIX TO DISTRICT PRIMARY",
-    "URBAN BLOCK WISE",
-    "TOTAL, SCHEDULED CASTES AND SCHEDULED TRIBES POPULATION",
-]
-EB_COLUMN_HINTS = ["LOCATION CODE", "NAME OF TOWN", "NAME OF WARD"]
-
-# pc91 special rule: any PHRASES_91 AND all of EB_COLUMN_HINTS_91
-PHRASES_91 = [
-    "TOTAL, SCHEDULED CASTE"
-]
-EB_COLUMN_HINTS_91 = []
-
-def _normalise(txt: str) -> str:
-    """Remove all whitespace and uppercase for whitespace-insensitive matching."""
-    return re.sub(r"\s+", "", txt.upper())
-
-PHRASES_NORM = [_normalise(p) for p in PHRASES]
-PHRASES_91_NORM = [_normalise(p) for p in PHRASES_91]
+RULES = load_rules(args.rules, args.series)
+
+# Version recorded per file in the scan manifest: the rule set, plus every setting
+# that changes a file's hit rows when not at its default: the search strategy
+# (reverse/probe stop at the EB block nearest the end of the handbook, not
+# necessarily its longest run) and the header band. A file scanned under another
+# version is re-scanned. --min_run_confidence is left out: it only selects among the
+# recorded hits, so --slice 1 re-cuts unchanged files from the manifest instead.
+SCAN_VERSION = RULES.version
+if args.search != "exhaustive":
+    SCAN_VERSION += f";{args.search}:{args.stop_after_misses}"
+    if args.search == "probe":
+        SCAN_VERSION += f":{args.probe_stride}"
+if args.header_clip > 0:
+    SCAN_VERSION += f";clip:{args.header_clip:g}"
 
 def _pages_to_ranges(pages):
     """
@@ -115,38 +215,37 @@ def _pages_to_ranges(pages):
 # ---------------------------------------------------------------------
 # Page-level predicate
 # ---------------------------------------------------------------------
+def _eb_page_criteria(page_text: str) -> tuple[bool, bool, bool]:
+    """
+    Evaluate the series-specific criteria on a page's text.
+    Returns (phrase_ok, hints_ok, any_evidence), where any_evidence is True if
+    any phrase or any column hint occurs at all.
+    """
+    return RULES.criteria(page_text)
+
 def _has_relevant_eb_page(page_text: str) -> bool:
     """
-    Decide if a page is relevant based on series-specific criteria.
-    - pc91: (any PHRASES_91) AND (all of EB_COLUMN_HINTS_91)
-    - others: (any PHRASES) AND (any of EB_COLUMN_HINTS)
+    Decide if a page is relevant based on the series' rule set (--rules).
+    - pc91: (any phrase) AND (all column hints)
+    - others: (any phrase) AND (any column hint)
     Matching:
-      * Phrases: whitespace-insensitive (normalize), case-insensitive
+      * Phrases: whitespace-insensitive, case-insensitive
       * Hints: case-insensitive simple substring(s)
     """
-    text_upper = (page_text or "").upper()
-    text_norm = _normalise(page_text or "")
-
-    if args.series == "pc91":
-        phrase_ok = any(ph in text_norm for ph in PHRASES_91_NORM)
-        hints_ok = all(h in text_upper for h in EB_COLUMN_HINTS_91)
-        return phrase_ok and hints_ok
-    else:
-        phrase_ok = any(ph in text_norm for ph in PHRASES_NORM)
-        hints_ok = any(h in text_upper for h in EB_COLUMN_HINTS)
-        return phrase_ok and hints_ok
+    phrase_ok, hints_ok, _ = _eb_page_criteria(page_text)
+    return phrase_ok and hints_ok
 
 # ---------------------------------------------------------------------
 # CSV helpers (skip-by-default support)
 # ---------------------------------------------------------------------
-def _load_already_processed_filenames(out_csv_path: Path) -> set[str]:
+def _load_pages_per_file(out_csv_path: Path) -> dict[str, list[int]]:
     """
-    Return a set of filenames that already have at least one row in OUT_CSV.
-    We only need filenames (not pages) to decide whether to skip a file.
+    Return {filename: [page, ...]} for files that already have rows in OUT_CSV.
+    Only used to adopt a CSV written before the scan manifest existed.
     """
+    pages = {}
     if not out_csv_path.exists():
-        return set()
-    done = set()
+        return pages
     with out_csv_path.open(newline="") as f:
         r = csv.reader(f)
         header = next(r, None)
@@ -154,136 +253,637 @@ def _load_already_processed_filenames(out_csv_path: Path) -> set[str]:
             if not row:
                 continue
             # row = [filename, page_number]
-            done.add(row[0])
-    return done
+            with suppress(ValueError):
+                pages.setdefault(row[0], []).append(int(row[1]))
+    return pages
+
+def _drop_rows_for(out_csv_path: Path, filenames: set[str], append_rows=()):
+    """
+    Rewrite OUT_CSV without the rows of `filenames`, then add `append_rows`
+    (atomically, via a temp file).
+    """
+    tmp = out_csv_path.with_suffix(".csv.tmp")
+    with tmp.open("w", newline="") as dst:
+        w = csv.writer(dst)
+        if out_csv_path.exists():
+            with out_csv_path.open(newline="") as src:
+                for i, row in enumerate(csv.reader(src)):
+                    if i == 0 or (row and row[0] not in filenames):
+                        w.writerow(row)
+        else:
+            w.writerow(["filename", "page_number"])
+        w.writerows(append_rows)
+        dst.flush()
+        os.fsync(dst.fileno())
+    os.replace(tmp, out_csv_path)
+
+def _recover_journal(journal: ScanJournal, manifest: ScanManifest):
+    """
+    Apply results committed to the journal by a run that did not finish: install
+    them in the manifest, replace those files' rows in OUT_CSV (the crash may have
+    come before the CSV view caught up), then compact and clear the journal.
+    """
+    records = journal.replay()
+    if not records:
+        journal.clear()
+        return
+    for rec in records:
+        manifest.apply(rec)
+    names = {rec["filename"] for rec in records}
+    rows = [[name, pg] for name in sorted(names) for pg in manifest.pages(name)]
+    _drop_rows_for(OUT_CSV, names, rows)
+    manifest.save()
+    journal.clear()
+    print(f"[MODE] recovered {len(names)} PDFs from an interrupted run's journal ({len(rows)} rows)")
+
+def _file_sha(pdf: Path) -> str:
+    """sha256 of a PDF, via the text cache's (path, size, mtime) memo when it is enabled."""
+    cache = _get_text_cache()
+    return cache.file_hash(pdf) if cache else file_sha256(pdf)
+
+# ---------------------------------------------------------------------
+# Progress reporting
+#   - Serial runs use a tqdm bar per file.
+#   - Worker processes add to one shared page counter that the main
+#     process turns into a single aggregate pages/sec line.
+# ---------------------------------------------------------------------
+_PAGE_COUNTER = None
+
+def _init_worker(counter):
+    """Process-pool initializer: remember the shared page counter."""
+    global _PAGE_COUNTER, _TEXT_CACHE
+    _PAGE_COUNTER = counter
+    _TEXT_CACHE = None   # never share the parent's SQLite connection across fork
+
+class _SharedPageProgress:
+    """Minimal stand-in for a tqdm bar that adds to the shared page counter."""
+    def __init__(self, counter):
+        self.counter = counter
+        self.n = 0
+        self.total = None
+
+    def update(self, k=1):
+        self.n += k
+        with self.counter.get_lock():
+            self.counter.value += k
+
+    def reset(self):
+        # Pages from a failed parser attempt still count toward throughput;
+        # only the per-file tally restarts.
+        self.n = 0
+
+    def refresh(self):
+        pass
+
+# ---------------------------------------------------------------------
+# Page text cache
+#   - Opened lazily, once per process (SQLite handles must not cross fork).
+#   - Cached pages are never re-extracted; a PDF is opened only if a page the
+#     search needs (or the page count) is missing from the cache.
+# ---------------------------------------------------------------------
+_TEXT_CACHE = None
+
+def _get_text_cache():
+    """Return this process's PageTextCache, or None if --text_cache_mb 0 (or timing with --header_clip_compare)."""
+    global _TEXT_CACHE
+    if args.text_cache_mb <= 0 or args.header_clip_compare:
+        return None
+    if _TEXT_CACHE is None:
+        _TEXT_CACHE = PageTextCache(TEXT_CACHE_DB, args.text_cache_mb * 1024 * 1024)
+    return _TEXT_CACHE
+
+# ---------------------------------------------------------------------
+# Open documents
+#   - Every open goes through _open_doc, which counts opens per file.
+#   - Documents are held in a small per-process cache, so one parser attempt
+#     opens and parses a file once: the page count, every page of a serial
+#     scan, and all shards of a large PDF that land on the same worker share
+#     that handle.
+#   - A parser that fails on a file is not retried on it in this process.
+# ---------------------------------------------------------------------
+_OPENS = Counter()
+_DOC_CACHE = OrderedDict()
+_DOC_CACHE_SIZE = 2
+_FAILED_PARSERS = set()   # (path, parser) pairs that already failed in this process
+
+def _open_doc(path: Path, parser: str):
+    """Open `path` with pypdf (strict=False) or PyMuPDF and count the open."""
+    _OPENS[path.name] += 1
+    if parser == "pypdf":
+        from pypdf import PdfReader
+        return PdfReader(path, strict=False)
+    import fitz
+    return fitz.open(path)
+
+def _close_doc(parser: str, doc):
+    if parser == "pymupdf":
+        doc.close()
+
+def _cached_doc(path: Path, parser: str):
+    """Return an open pypdf reader / PyMuPDF document for `path`, reusing one per process."""
+    key = (str(path), parser)
+    if key in _DOC_CACHE:
+        _DOC_CACHE.move_to_end(key)
+        return _DOC_CACHE[key]
+    doc = _open_doc(path, parser)
+    _DOC_CACHE[key] = doc
+    while len(_DOC_CACHE) > _DOC_CACHE_SIZE:
+        (_, old_parser), old = _DOC_CACHE.popitem(last=False)
+        _close_doc(old_parser, old)
+    return doc
+
+def _release_docs(path: Path):
+    """Close any cached handles for `path` (serial scans release each file when done)."""
+    for parser in ("pypdf", "pymupdf"):
+        doc = _DOC_CACHE.pop((str(path), parser), None)
+        if doc is not None:
+            _close_doc(parser, doc)
 
 # ---------------------------------------------------------------------
 # PDF scanners
 # ---------------------------------------------------------------------
-def _scan_with_pypdf(path, pbar):
+def _pypdf_text(reader, pno: int) -> str:
+    """Text of 0-based page `pno` from an open pypdf reader."""
+    return reader.pages[pno].extract_text() or ""
+
+def _pymupdf_text(doc, pno: int) -> str:
+    """Text of 0-based page `pno` from an open PyMuPDF document."""
+    return doc.load_page(pno).get_text("text")
+
+def _pymupdf_header_text(doc, pno: int, frac: float) -> str:
+    """Text of the top `frac` of 0-based page `pno`, clipped by PyMuPDF."""
+    import fitz
+    page = doc.load_page(pno)
+    r = page.rect
+    return page.get_text("text", clip=fitz.Rect(r.x0, r.y0, r.x1, r.y0 + r.height * frac))
+
+def _page_count(parser: str, doc) -> int:
+    return len(doc.pages) if parser == "pypdf" else doc.page_count
+
+_PAGE_TEXT = {"pypdf": _pypdf_text, "pymupdf": _pymupdf_text}
+PARSERS = ("pypdf", "pymupdf")   # default order: pypdf is fast, PyMuPDF is very tolerant
+
+# ---------------------------------------------------------------------
+# Search strategies (--search)
+#   - exhaustive: every page, first to last.
+#   - reverse: walk back from the last page to the first hit, then keep going
+#     until --stop_after_misses consecutive non-hit pages bound the run.
+#   - probe: sample every --probe_stride-th page from the back; once a probe
+#     hits, expand page by page in both directions until each side is bounded
+#     by --stop_after_misses misses. If no probe hits, falls back to reverse.
+#   Non-exhaustive searches find the EB block nearest the end of the handbook;
+#   hits further back, past a gap of --stop_after_misses pages, are not visited.
+# ---------------------------------------------------------------------
+def _search_pages(pnos: range, is_hit, strategy: str) -> list[int]:
+    """Return sorted 1-based hit pages among the 0-based page range `pnos`."""
+    if strategy == "exhaustive" or not pnos:
+        return [pno + 1 for pno in pnos if is_hit(pno)]
+
+    seen = {}
+    def hit(pno):
+        if pno not in seen:
+            seen[pno] = is_hit(pno)
+        return seen[pno]
+
+    def walk(pno, step):
+        misses = 0
+        pno += step
+        while pnos.start <= pno < pnos.stop and misses < args.stop_after_misses:
+            misses = 0 if hit(pno) else misses + 1
+            pno += step
+
+    first = None
+    if strategy == "probe":
+        first = next((pno for pno in range(pnos.stop - 1, pnos.start - 1, -args.probe_stride) if hit(pno)), None)
+    if first is None:
+        first = next((pno for pno in range(pnos.stop - 1, pnos.start - 1, -1) if hit(pno)), None)
+    if first is not None:
+        walk(first, -1)
+        walk(first, +1)
+    return sorted(pno + 1 for pno, h in seen.items() if h)
+
+# ---------------------------------------------------------------------
+# Header-band fast path (--header_clip, PyMuPDF only)
+#   The title ("URBAN BLOCK WISE", "APPENDIX TO DISTRICT PRIMARY") and the
+#   column headers ("LOCATION CODE", "NAME OF TOWN") sit at the top of EB
+#   pages, so text is first extracted from a clipped band at the top of each
+#   page. With --header_clip_compare, every page is also run through the
+#   full-page path and both are timed.
+# ---------------------------------------------------------------------
+def _new_clip_stats() -> dict:
+    """Counters for the header-band path: pages judged, ambiguous fallbacks, and compare-mode timings."""
+    return {"pages": 0, "fallbacks": 0, "compared": 0, "clip_s": 0.0, "full_s": 0.0, "disagree": 0}
+
+def _compare_clip_paths(doc, pno: int, clip: float, stats: dict) -> bool:
+    """
+    Judge one page by both paths, timing each, and return the header-band decision.
+    The full-page path is what the scanner does without --header_clip.
+    """
+    t0 = time.perf_counter()
+    full_hit = _has_relevant_eb_page(_pymupdf_text(doc, pno))
+    t1 = time.perf_counter()
+    phrase_ok, hints_ok, evidence = _eb_page_criteria(_pymupdf_header_text(doc, pno, clip))
+    if phrase_ok and hints_ok:
+        clip_hit = True
+    elif not evidence:
+        clip_hit = False
+    else:
+        stats["fallbacks"] += 1
+        clip_hit = _has_relevant_eb_page(_pymupdf_text(doc, pno))
+    t2 = time.perf_counter()
+    stats["pages"] += 1
+    stats["compared"] += 1
+    stats["full_s"] += t1 - t0
+    stats["clip_s"] += t2 - t1
+    stats["disagree"] += int(clip_hit != full_hit)
+    return clip_hit
+
+def _scan_range(path: Path, start: int, stop, pbar, parsers=PARSERS, search="exhaustive") -> dict:
+    """
+    Scan 0-based pages [start, stop) of one PDF (stop=None → to the end), visiting
+    pages in the order chosen by the `search` strategy.
+    Each parser in `parsers` is tried for the same range, falling through on
+    failure (the last parser's error propagates); parsers whose text is already
+    in the page text cache go first, except with --header_clip, where PyMuPDF keeps
+    its place at the front so the header-band path runs. The PDF is opened only if a page that the
+    search visits (or the page count) is not cached.
+    With --header_clip under PyMuPDF, each page is first judged on its clipped
+    header band: both a title phrase and a column hint → hit; neither → miss;
+    anything in between is ambiguous and the full page text decides.
+    Returns {"n_pages", "hits" (1-based), "parser", "failed" ({parser: error}),
+    "pages_visited", "pages_scanned" (freshly extracted), "seconds", "clip"
+    (header-band counters, see _new_clip_stats)}.
+    """
+    cache = _get_text_cache()
+    sha = cache.file_hash(path) if cache else None
+
+    failed = {}
+    todo = [ps for ps in parsers if (str(path), ps) not in _FAILED_PARSERS] or list(parsers)
+    if cache and not args.header_clip:
+        todo.sort(key=lambda ps: cache.page_count(sha, ps) is None)
+    for i, parser in enumerate(todo):
+        t0 = time.perf_counter()
+        fresh = {}
+        fresh_band = {}
+        visited = 0
+        clip = args.header_clip if parser == "pymupdf" else 0
+        band_key = f"pymupdf_clip{clip:g}"   # header-band text is cached as its own "parser"
+        clip_stats = _new_clip_stats()
+        try:
+            doc = None
+            n_pages = cache.page_count(sha, parser) if cache else None
+            if n_pages is None and cache and clip:
+                n_pages = cache.page_count(sha, band_key)
+            if n_pages is None:
+                doc = _cached_doc(path, parser)
+                n_pages = _page_count(parser, doc)
+            stop_ = n_pages if stop is None else min(stop, n_pages)
+            cached = cache.get_texts(sha, parser, start + 1, stop_) if cache else {}
+            cached_band = cache.get_texts(sha, band_key, start + 1, stop_) if cache and clip else {}
+            pbar.total = stop_ - start
+            pbar.refresh()
+
+            def open_doc():
+                nonlocal doc
+                if doc is None:
+                    doc = _cached_doc(path, parser)
+                return doc
+
+            def full_text(pno):
+                text = cached.get(pno + 1)
+                if text is None:
+                    text = _PAGE_TEXT[parser](open_doc(), pno)
+                    fresh[pno + 1] = text
+                return text
+
+            def band_text(pno):
+                text = cached_band.get(pno + 1)
+                if text is None:
+                    text = _pymupdf_header_text(open_doc(), pno, clip)
+                    fresh_band[pno + 1] = text
+                return text
+
+            def is_hit(pno):
+                nonlocal visited
+                visited += 1
+                pbar.update(1)
+                if not clip:
+                    return _has_relevant_eb_page(full_text(pno))
+                if args.header_clip_compare:
+                    return _compare_clip_paths(open_doc(), pno, clip, clip_stats)
+                clip_stats["pages"] += 1
+                phrase_ok, hints_ok, evidence = _eb_page_criteria(band_text(pno))
+                if phrase_ok and hints_ok:
+                    return True
+                if not evidence:
+                    return False
+                clip_stats["fallbacks"] += 1
+                return _has_relevant_eb_page(full_text(pno))
+
+            hits = _search_pages(range(start, stop_), is_hit, search)
+        except Exception as e:
+            if i == len(todo) - 1:
+                raise
+            print(f"{parser} failed on {path.name} (from page {start + 1}) with error: {type(e).__name__}: {e}")
+            failed[parser] = f"{type(e).__name__}: {e}"
+            _FAILED_PARSERS.add((str(path), parser))
+            _release_docs(path)
+            pbar.reset()
+            continue
+        if cache:
+            cache.put_texts(sha, parser, n_pages, fresh)
+            cache.put_texts(sha, band_key, n_pages, fresh_band)
+        return {"n_pages": n_pages, "hits": hits, "parser": parser, "failed": failed,
+                "pages_visited": visited, "pages_scanned": len(set(fresh) | set(fresh_band)),
+                "seconds": time.perf_counter() - t0, "clip": clip_stats}
+
+# ---------------------------------------------------------------------
+# Fused slicing (--slice 1): cut the EB page set from the document the scan just used
+# ---------------------------------------------------------------------
+def _slice_hits(path: Path, res: dict):
     """
-    Primary parser using pypdf (strict=False) – fast and works for many PDFs.
-    Returns a list of 1-based page numbers containing matches, or None on failure.
+    Cut the selected runs of `res["hits"]` (the page set the review CSV will propose)
+    to EXTRACT_DIR/<name>_EB.pdf, reusing this process's open document for
+    the parser that scanned the file. Returns the extraction summary row, or None
+    without hits. Written to a temp name and renamed, so the LLM step never picks up
+    a half-written file.
     """
-    from pypdf import PdfReader
+    best = [pg for run, _ in select_eb_runs(res["hits"]) for pg in run]
+    if not best:
+        return None
+    t0 = time.perf_counter()
+    parser = res["parser"]
+    doc = _cached_doc(path, parser)
+    out = EXTRACT_DIR / output_name(path.name)
+    tmp = out.with_suffix(".pdf.tmp")
+    pages_0 = [pg - 1 for pg in best]
+    if parser == "pymupdf":
+        write_pages_pymupdf(doc, pages_0, tmp)
+    else:
+        from pypdf import PdfWriter
+        write_pages_pypdf(doc, PdfWriter, pages_0, tmp)
+    os.replace(tmp, out)
+    st = os.stat(path)
+    return {
+        "filename": path.name, "start_page": best[0], "end_page": best[-1],
+        "page_set": format_page_set(best), "num_pages": len(best),
+        "output_file": out.name, "status": "success", "parser": parser,
+        "input_bytes": st.st_size, "output_bytes": out.stat().st_size,
+        "seconds": round(time.perf_counter() - t0, 3), "input_mtime_ns": st.st_mtime_ns,
+        "input_sha256": _file_sha(path),
+    }
+
+def _maybe_slice(path: Path, res: dict):
+    """With --slice 1, slice a fully scanned file into res["slice"]; a failure is reported, not raised."""
+    if not args.slice:
+        return
     try:
-        reader = PdfReader(path, strict=False)
-        hits = []
-        for pno, page in enumerate(reader.pages, 1):
-            text = page.extract_text() or ""
-            if _has_relevant_eb_page(text):
-                hits.append(pno)
-            pbar.update(1)
-        return hits
+        res["slice"] = _slice_hits(path, res)
     except Exception as e:
-        print(f"pypdf failed on {path.name} with error: {type(e).__name__}: {e}")
+        res["slice_error"] = f"{type(e).__name__}: {e}"
+
+def _recut_slice(path: Path, pages: list[int], prev, memo):
+    """
+    --slice 1 for a file the manifest says is current: re-cut it from the manifest's hit
+    `pages` if its selected page set differs from the summary row `prev` or the output
+    is gone. Returns the new row, or None when the existing slice stands (or there is
+    nothing to cut).
+    """
+    best = [pg for run, _ in select_eb_runs(pages) for pg in run]
+    if not best:
+        return None
+    if (prev and prev.get("page_set") == format_page_set(best)
+            and (EXTRACT_DIR / output_name(path.name)).exists()):
         return None
+    err = None
+    for parser in memo.order(path, PARSERS, "scan"):
+        try:
+            return _slice_hits(path, {"hits": pages, "parser": parser})
+        except Exception as e:
+            err = e
+        finally:
+            _release_docs(path)
+    raise err
 
-def _scan_with_pymupdf(path, pbar):
+def _scan_pdf(path: Path, parsers=PARSERS) -> dict:
     """
-    Fallback parser using PyMuPDF (fitz) – slower but very tolerant.
-    Returns a list of 1-based page numbers containing matches.
+    Serial scan of one PDF with a progress bar scoped to the file.
+    Returns the _scan_range result plus "opens" (documents opened for this file).
     """
-    import fitz
-    hits = []
-    with fitz.open(path) as doc:
-        for pno in range(doc.page_count):
-            text = doc.load_page(pno).get_text("text")
-            if _has_relevant_eb_page(text):
-                hits.append(pno + 1)
-            pbar.update(1)
-    return hits
+    from tqdm import tqdm
+    _OPENS.pop(path.name, None)
+    with tqdm(desc=f"processing {path.name}",
+              unit="pg", ncols=80, leave=False) as pbar:
+        try:
+            res = _scan_range(path, 0, None, pbar, parsers, args.search)
+            _maybe_slice(path, res)
+        finally:
+            _release_docs(path)
+            _FAILED_PARSERS.difference_update({(str(path), ps) for ps in PARSERS})
+    res["opens"] = _OPENS.pop(path.name, 0)
+    return res
 
-def _scan_pdf(path: Path) -> list[int]:
+def _scan_shard(path: Path, start: int, stop, parsers=PARSERS) -> dict:
     """
-    Determine number of pages (for progress bar), try pypdf first, then fall back to PyMuPDF.
-    Return a list of 1-based page numbers with hits (possibly empty list).
+    Worker task: scan 0-based pages [start, stop) of one PDF (stop=None → to the end).
+    Returns the _scan_range result plus "opens", the documents this task had to
+    open (0 when the worker already held the file open from an earlier shard).
     """
-    # Determine page count for progress bar
-    try:
-        from pypdf import PdfReader
-        n_pages = len(PdfReader(path, strict=False).pages)
-    except Exception:
-        import fitz
-        n_pages = fitz.open(path).page_count
+    before = _OPENS[path.name]
+    res = _scan_range(path, start, stop, _SharedPageProgress(_PAGE_COUNTER), parsers, args.search)
+    if start == 0 and (stop is None or stop >= res["n_pages"]):
+        # This task saw the whole file: slice it here while the document is open
+        _maybe_slice(path, res)
+    res["opens"] = _OPENS[path.name] - before
+    return res
+
+def _slice_shards(path: Path, hits: list[int], parser: str) -> dict:
+    """
+    Worker task: slice a sharded file once the hits of all its shards are merged,
+    reusing this worker's open document if it scanned one of the shards. Returns
+    {"slice": row} or {"slice_error": message} to merge into the file's result.
+    """
+    res = {"hits": hits, "parser": parser}
+    _maybe_slice(path, res)
+    return {k: res[k] for k in ("slice", "slice_error") if k in res}
+
+def _merge_results(acc: dict, res: dict) -> dict:
+    """Fold one shard's result into the running result for its file."""
+    if not acc:
+        return {**res, "hits": list(res["hits"]), "failed": dict(res["failed"]), "clip": dict(res["clip"]),
+                "parsers": {res["parser"]}}
+    acc["hits"].extend(res["hits"])
+    acc["failed"].update(res["failed"])
+    acc["parsers"].add(res["parser"])
+    for k in ("opens", "pages_visited", "pages_scanned", "seconds"):
+        acc[k] += res[k]
+    for k in acc["clip"]:
+        acc["clip"][k] += res["clip"][k]
+    return acc
+
+def _iter_scan_results(pdfs: list[Path], workers: int, shard_pages: int = 0, memo=None):
+    """
+    Yield (pdf, result, error) for every PDF in the order given, so the caller can
+    stream rows deterministically regardless of which worker finishes first.
+    `result` is the merged scan result (see _scan_range) with "hits" sorted, or None on error.
+    - workers <= 1: scan in-process, one file at a time.
+    - workers > 1: scan in a process pool; completed results are held back until
+      every earlier file has been yielded.
+    - shard_pages > 0: the first task for each PDF scans its first shard_pages pages
+      and reports the page count; any remaining pages are queued as further shards
+      and their hits are merged back into the same file's list.
+    - memo: ParserMemo used to choose the parser order for each file.
+    """
+    def parsers_for(pdf):
+        order = memo.order(pdf, PARSERS, "scan") if memo else list(PARSERS)
+        if args.header_clip > 0 and "pymupdf" in order:
+            # The header-band fast path needs PyMuPDF's clip rectangle
+            order = ["pymupdf"] + [ps for ps in order if ps != "pymupdf"]
+        return order
+
+    if workers <= 1 or len(pdfs) <= 1:
+        for pdf in pdfs:
+            try:
+                yield pdf, _merge_results({}, _scan_pdf(pdf, parsers_for(pdf))), None
+            except KeyboardInterrupt:
+                raise
+            except Exception as e:
+                _OPENS.pop(pdf.name, None)
+                yield pdf, None, e
+        return
 
-    # Progress bar scoped to this file
     from tqdm import tqdm
-    with tqdm(total=n_pages,
-              desc=f"processing {path.name}",
-              unit="pg", ncols=80, leave=False) as pbar:
+    # Sharding only applies to exhaustive search; other strategies need the whole page range
+    shard = shard_pages if shard_pages > 0 and args.search == "exhaustive" else None
+    counter = mp.Value("q", 0)
+    pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(counter,))
 
-        pages = _scan_with_pypdf(path, pbar)
-        if pages is None:
-            pbar.reset()
-            pages = _scan_with_pymupdf(path, pbar)
+    futures = {}     # future -> (file index, first page of the shard)
+    state = {}       # file index -> [shards outstanding, merged result, first error]
+    done = {}        # file index -> (result, error), waiting to be yielded in order
+    next_idx = 0
+    files_done = 0
+    try:
+        # Largest files first, so their extra shards are not the last work queued
+        order = sorted(range(len(pdfs)), key=lambda i: pdfs[i].stat().st_size, reverse=True)
+        for i in order:
+            futures[pool.submit(_scan_shard, pdfs[i], 0, shard, parsers_for(pdfs[i]))] = (i, 0)
+            state[i] = [1, {}, None]
+        pending = set(futures)
 
-    return pages
+        with tqdm(desc=f"scanning {len(pdfs)} PDFs ({workers} workers)",
+                  unit="pg", ncols=100, leave=False) as pbar:
+            while pending:
+                finished, pending = wait(pending, timeout=0.5, return_when=FIRST_COMPLETED)
+                for fut in finished:
+                    i, start = futures.pop(fut)
+                    st = state[i]
+                    st[0] -= 1
+                    if start is None:
+                        # Slicing task of a sharded file
+                        try:
+                            st[1].update(fut.result())
+                        except Exception as e:
+                            st[1]["slice_error"] = f"{type(e).__name__}: {e}"
+                    else:
+                        try:
+                            res = fut.result()
+                            st[1] = _merge_results(st[1], res)
+                            if start == 0 and shard and res["n_pages"] > shard:
+                                # Later shards start with the parser that worked on the first one
+                                parsers = [res["parser"]] + [ps for ps in PARSERS if ps != res["parser"]]
+                                for s in range(shard, res["n_pages"], shard):
+                                    f = pool.submit(_scan_shard, pdfs[i], s, s + shard, parsers)
+                                    futures[f] = (i, s)
+                                    pending.add(f)
+                                    st[0] += 1
+                        except Exception as e:
+                            st[2] = st[2] or e
+                    if st[0] == 0 and st[2] is None:
+                        st[1]["hits"].sort()
+                        if args.slice and st[1]["hits"] and not {"slice", "slice_error"} & set(st[1]):
+                            # Sharded file: its hits are only complete now, so slice it in a
+                            # worker (which holds the document open if it scanned a shard)
+                            f = pool.submit(_slice_shards, pdfs[i], st[1]["hits"], st[1]["parser"])
+                            futures[f] = (i, None)
+                            pending.add(f)
+                            st[0] += 1
+                    if st[0] == 0:
+                        del state[i]
+                        done[i] = (None if st[2] else st[1], st[2])
+                        files_done += 1
+
+                pbar.update(counter.value - pbar.n)
+                pbar.set_postfix(files=f"{files_done}/{len(pdfs)}")
+                while next_idx in done:
+                    res, err = done.pop(next_idx)
+                    pbar.clear()
+                    yield pdfs[next_idx], res, err
+                    next_idx += 1
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+def _record_parsers(memo, pdf: Path, res: dict):
+    """Store which parsers failed / worked on `pdf`, with scan throughput."""
+    for parser, err in res["failed"].items():
+        memo.record(pdf, parser, "scan", ok=False, error=err)
+    if len(res["parsers"]) == 1 and res["pages_scanned"]:
+        memo.record(pdf, next(iter(res["parsers"])), "scan", ok=True,
+                    pages=res["pages_scanned"], seconds=res["seconds"])
 
-def find_longest_consecutive_sequence(pages):
-    """Find the longest consecutive sequence of page numbers."""
-    pages = sorted(set(int(p) for p in pages))
-    if not pages:
+def select_eb_runs(pages) -> list[tuple[list[int], float]]:
+    """
+    Split hit pages into consecutive runs, score each run, and keep the runs scoring
+    at least --min_run_confidence, as [(run_pages, confidence), ...] in page order.
+    confidence = 0.5 * min(1, len/3) + 0.5 * len/longest, so a run of 3+ pages as long
+    as the longest scores 1.0, and a stray single-page hit next to a long table
+    scores low. The longest run(s) are always kept, whatever the threshold.
+    """
+    runs = page_runs(int(p) for p in pages)
+    if not runs:
         return []
-    longest, current = [], [pages[0]]
-    for i in range(1, len(pages)):
-        if pages[i] == pages[i-1] + 1:
-            current.append(pages[i])
-        else:
-            if len(current) > len(longest):
-                longest = current
-            current = [pages[i]]
-    if len(current) > len(longest):
-        longest = current
-    return longest
+    longest = max(len(r) for r in runs)
+    scored = [(r, round(0.5 * min(1.0, len(r) / 3) + 0.5 * len(r) / longest, 2)) for r in runs]
+    return [(r, c) for r, c in scored if c >= args.min_run_confidence or len(r) == longest]
 
-def generate_page_range_summary():
+def generate_page_range_summary(manifest: ScanManifest):
     """
-    Read urban_eb_pages.csv and generate a summary CSV with page ranges.
-    Creates {series}_page_ranges_for_review.csv in ROOT_DIR.
+    Generate a summary CSV with page ranges from the hit pages recorded in the
+    scan manifest (the same rows as urban_eb_pages.csv, without re-reading it).
+    Creates {series}_page_ranges_for_review.csv in ROOT_DIR with columns
+      filename, start_page, end_page, page_set, run_confidence
+    page_set lists every run kept by select_eb_runs (e.g. "120-140,402-410") and
+    run_confidence their scores in the same order (e.g. "1.0,0.72"); start_page /
+    end_page span the whole set, for scripts that only read those.
     """
     import pandas as pd
     
-    if not OUT_CSV.exists():
-        print(f"\n[WARNING] Cannot generate summary: {OUT_CSV} does not exist")
-        return
-    
     print(f"\n[GENERATING PAGE RANGE SUMMARY]")
     
-    # Load the pages CSV
-    try:
-        df = pd.read_csv(OUT_CSV)
-        df.columns = [c.strip().lower() for c in df.columns]
-    except Exception as e:
-        print(f"Error reading {OUT_CSV}: {e}")
-        return
-    
     # Analyze page ranges per file
     results = []
+    multi_run = 0
     
-    for filename, group in df.groupby("filename", sort=False):
-        pages = (
-            pd.to_numeric(group["page_number"], errors="coerce")
-              .dropna()
-              .astype(int)
-              .tolist()
-        )
+    for filename in sorted(manifest.entries):
+        pages = manifest.pages(filename)
         
         if not pages:
             continue
         
-        best_seq = find_longest_consecutive_sequence(pages)
+        runs = select_eb_runs(pages)
         
-        if not best_seq:
+        if not runs:
             continue
         
-        start_page = best_seq[0]
-        end_page = best_seq[-1]
+        kept = [pg for run, _ in runs for pg in run]
+        multi_run += len(runs) > 1
         
         results.append({
             'filename': filename,
-            'start_page': start_page,
-            'end_page': end_page
+            'start_page': kept[0],
+            'end_page': kept[-1],
+            'page_set': format_page_set(kept),
+            'run_confidence': ",".join(f"{c:g}" for _, c in runs)
         })
     
     # Save results
@@ -293,7 +893,8 @@ def generate_page_range_summary():
         results_df.to_csv(summary_csv, index=False)
         
         print(f"  Page ranges saved to: {summary_csv}")
-        print(f"  Total files with ranges: {len(results)}")
+        print(f"  Total files with ranges: {len(results)} ({multi_run} with several runs, "
+              f"--min_run_confidence {args.min_run_confidence:g})")
         print(f"  Review and edit this file, then run the extraction script.")
     else:
         print(f"  No valid page ranges found to create summary.")
@@ -304,7 +905,7 @@ def generate_page_range_summary():
 def main():
     """
     Walk SCAN_DIR, scan each PDF, and stream results to OUT_CSV as (filename, page_number).
-    - If --reprocess 0 (default): append mode; skip files already present in CSV.
+    - If --reprocess 0 (default): append mode; skip files the scan manifest says are current.
     - If --reprocess 1: recreate CSV and re-scan everything.
     After scanning, generate a page range summary CSV.
     """
@@ -314,92 +915,205 @@ def main():
     # Known-bad PDFs to skip entirely (customize as needed)
     error_files = {"DH_19_2001_NTFP.pdf"}
 
-    # Choose mode based on reprocess
     recreate = (args.reprocess == 1)
+    src_display = str(SCAN_DIR.relative_to(ROOT_DIR)) if SCAN_DIR != ROOT_DIR else "."
+
+    # What earlier runs concluded per file (size, mtime, sha256, rules version, result, pages)
+    manifest = ScanManifest(SCAN_MANIFEST)
+    if recreate:
+        manifest.entries.clear()
+        with suppress(FileNotFoundError):
+            SCAN_JOURNAL.unlink()
+    else:
+        _recover_journal(ScanJournal(SCAN_JOURNAL), manifest)
+        if not manifest.exists() and OUT_CSV.exists():
+            # CSV written before the manifest existed: adopt its files as current
+            for name, pages in _load_pages_per_file(OUT_CSV).items():
+                if (SCAN_DIR / name).exists():
+                    manifest.record(SCAN_DIR / name, "", SCAN_VERSION, "hits", pages)
+            print(f"[MODE] no scan manifest yet → adopting {len(manifest.entries)} PDFs already in CSV as scanned")
+
+    # Gather PDFs in deterministic order
+    all_pdfs = sorted(SCAN_DIR.glob("*.pdf"))
+
+    # Counters
+    total = len(all_pdfs)
+    scanned_ok = 0
+    with_hits = 0
+    no_hits = 0
+    failed = 0
+    rows_written = 0
+    skipped = 0
+    sliced = 0
+    reasons = Counter()
+
+    # PDF opens per scanned file (pypdf and PyMuPDF attempts; 0 = served from text cache)
+    opens_per_file = {}
+    pages_visited = 0
+    pages_total = 0
+    clip_stats = _new_clip_stats()
+
+    # Track filenames for no-hits and failures
+    no_hit_files = []
+    failed_files = []
+
+    # Apply guards up front so only scannable files go to the workers
+    to_scan = []
+    current = []
+    for pdf in all_pdfs:
+        # Quick guards
+        if pdf.name in error_files:
+            print(f"{pdf.name}: Skipping (known error)")
+            continue
+        if not pdf.exists():
+            print(f"{pdf.name}: Skipping missing file")
+            continue
+        if not os.access(pdf, os.R_OK):
+            print(f"{pdf.name}: Skipping unreadable file")
+            continue
+        status = "new" if recreate else manifest.status(pdf, SCAN_VERSION, _file_sha)
+        if status == "current":
+            skipped += 1
+            current.append(pdf)
+            continue
+        reasons[status] += 1
+        to_scan.append(pdf)
+
+    # Mode banner
+    if recreate:
+        print(f"[MODE] reprocess=1 → recreating CSV and re-scanning PDFs in {src_display}")
+    else:
+        print(f"[MODE] reprocess=0 → skipping {skipped} PDFs unchanged since last scan; scanning {src_display} "
+              f"({reasons['new']} new, {reasons['changed']} changed, {reasons['rules']} rule- or settings-stale)")
+    print(f"[MODE] rules='{RULES.name}' (version {RULES.version}) from {args.rules}")
+
+    # Files being re-scanned lose their old rows before new ones are appended
+    stale = {pdf.name for pdf in to_scan if manifest.pages(pdf.name)}
+    if stale and OUT_CSV.exists():
+        _drop_rows_for(OUT_CSV, stale)
+        print(f"[MODE] dropped {sum(len(manifest.pages(n)) for n in stale)} old rows of {len(stale)} re-scanned PDFs")
+
+    # Choose mode based on reprocess
     mode = "w" if recreate else "a"
     first_run = True if recreate else (not OUT_CSV.exists())
 
-    # Open output and write header if needed
-    with OUT_CSV.open(mode, newline="", buffering=1) as fh:
+    # Results are made durable in the journal, in group commits of --commit_rows rows or
+    # --commit_secs seconds; each commit also extends OUT_CSV (the tail -f view).
+    with OUT_CSV.open(mode, newline="") as fh:
         writer = csv.writer(fh)
         if first_run:
             writer.writerow(["filename", "page_number"])
             fh.flush()
-            os.fsync(fh.fileno())
 
-        # Build skip set unless we are recreating from scratch
-        already_processed = set() if recreate else _load_already_processed_filenames(OUT_CSV)
+        def extend_csv(records):
+            writer.writerows([rec["filename"], pg] for rec in records
+                             for pg in field_to_pages(rec["pages"]))
+            fh.flush()          # visible to tail -f; durability comes from the journal
 
-        # Mode banner
-        src_display = str(SCAN_DIR.relative_to(ROOT_DIR)) if SCAN_DIR != ROOT_DIR else "."
-        if recreate:
-            print(f"[MODE] reprocess=1 → recreating CSV and re-scanning PDFs in {src_display}")
-        else:
-            print(f"[MODE] reprocess=0 → skipping {len(already_processed)} PDFs already present in CSV; scanning {src_display}")
-
-        # Gather PDFs in deterministic order
-        all_pdfs = sorted(SCAN_DIR.glob("*.pdf"))
-
-        # Counters
-        total = len(all_pdfs)
-        scanned_ok = 0
-        with_hits = 0
-        no_hits = 0
-        failed = 0
-        rows_written = 0
-        skipped = 0
-
-        # Track filenames for no-hits and failures
-        no_hit_files = []
-        failed_files = []
-
-        for pdf in all_pdfs:
-            # Quick guards
-            if pdf.name in error_files:
-                print(f"{pdf.name}: Skipping (known error)")
-                continue
-            if not pdf.exists():
-                print(f"{pdf.name}: Skipping missing file")
-                continue
-            if not os.access(pdf, os.R_OK):
-                print(f"{pdf.name}: Skipping unreadable file")
-                continue
-            if not recreate and pdf.name in already_processed:
-                skipped += 1
-                print(f"{pdf.name}: already in CSV → skip")
-                continue
+        journal = ScanJournal(SCAN_JOURNAL, args.commit_rows, args.commit_secs, on_commit=extend_csv)
 
-            # Scan and stream rows
-            try:
-                pages = _scan_pdf(pdf)
+        # Parser choice per file from earlier runs (skips parsers known to fail)
+        memo = ParserMemo(PARSER_MEMO_JSON, ROOT_DIR)
+
+        # Fused slicing: _EB.pdf outputs and their extraction summary rows, as files finish
+        if args.slice:
+            EXTRACT_DIR.mkdir(parents=True, exist_ok=True)
+            slice_rows = load_summary(EXTRACTION_SUMMARY)
+            print(f"[MODE] slice=1 → cutting EB runs to {EXTRACT_DIR} as each PDF is scanned")
+
+        if args.workers > 1:
+            print(f"[MODE] workers={args.workers} → scanning {len(to_scan)} PDFs in parallel")
+
+        # Scan and stream rows (results arrive in to_scan order)
+        try:
+            for pdf, res, err in _iter_scan_results(to_scan, args.workers, args.shard_pages, memo):
+                if err is not None:
+                    failed += 1
+                    failed_files.append(pdf.name)
+                    journal.append(manifest.record(pdf, _file_sha(pdf), SCAN_VERSION, "failed"))
+                    print(f"{pdf.name}: ERROR {type(err).__name__}: {err}")
+                    continue
+                _record_parsers(memo, pdf, res)
+                pages, opens = res["hits"], res["opens"]
+                opens_per_file[pdf.name] = opens
+                pages_visited += res["pages_visited"]
+                for k in clip_stats:
+                    clip_stats[k] += res["clip"][k]
+                pages_total += res["n_pages"]
+                visited = f"pages: {res['pages_visited']}/{res['n_pages']}"
                 scanned_ok += 1
+                entry = manifest.record(pdf, _file_sha(pdf), SCAN_VERSION,
+                                        "hits" if pages else "no_hits", pages)
+                journal.append(entry, rows=len(pages))
                 if pages:
-                    for p in pages:
-                        writer.writerow([pdf.name, p])
-                        fh.flush()          # show progress immediately
-                        rows_written += 1
-                    os.fsync(fh.fileno())   # ensure durability per file
+                    rows_written += len(pages)
                     with_hits += 1
-                    print(f"{pdf.name}: {_pages_to_ranges(pages)}")
+                    print(f"{pdf.name}: {_pages_to_ranges(pages)} (opens: {opens}, {visited})")
                 else:
                     no_hits += 1
                     no_hit_files.append(pdf.name)
-                    print(f"{pdf.name}: no hits")
-            except KeyboardInterrupt:
-                sys.exit("\nInterrupted by user")
-            except Exception as e:
-                failed += 1
-                failed_files.append(pdf.name)
-                print(f"{pdf.name}: ERROR {type(e).__name__}: {e}")
+                    print(f"{pdf.name}: no hits (opens: {opens}, {visited})")
+                if args.slice:
+                    row = res.get("slice")
+                    # A re-scanned file without a fresh slice loses its old summary row
+                    slice_rows.pop(pdf.name, None)
+                    if row:
+                        slice_rows[pdf.name] = row
+                        sliced += 1
+                        print(f"  → {row['output_file']} (pages {row['page_set']}, "
+                              f"{row['output_bytes'] / 1e6:.2f} MB)")
+                    elif "slice_error" in res:
+                        print(f"  ✗ slicing failed: {res['slice_error']}")
+            # Unchanged files: re-cut only where the run selection or the output changed
+            if args.slice:
+                for pdf in current:
+                    pages = manifest.pages(pdf.name)
+                    if not pages:
+                        continue
+                    try:
+                        row = _recut_slice(pdf, pages, slice_rows.get(pdf.name), memo)
+                    except Exception as e:
+                        print(f"{pdf.name}: ✗ re-slicing failed: {type(e).__name__}: {e}")
+                        continue
+                    if row:
+                        slice_rows[pdf.name] = row
+                        sliced += 1
+                        print(f"{pdf.name}: re-cut → {row['output_file']} (pages {row['page_set']}, "
+                              f"{row['output_bytes'] / 1e6:.2f} MB)")
+        except KeyboardInterrupt:
+            sys.exit("\nInterrupted by user")
+        finally:
+            # Compact: flush the last batch, make the CSV and manifest durable, drop the journal
+            journal.commit()
+            fh.flush()
+            os.fsync(fh.fileno())
+            manifest.save()
+            journal.clear()
+            memo.save()
+            if args.slice:
+                save_summary(EXTRACTION_SUMMARY, slice_rows)
 
     # Summary
     print("\n[SUMMARY]")
     print(f"  PDFs total (in {src_display}): {total}")
     print(f"  Parsed OK:          {scanned_ok}/{total}")
-    print(f"  Skipped (existing): {skipped}")
+    print(f"  Skipped (unchanged): {skipped}")
     print(f"  With hits:          {with_hits} (rows written this run: {rows_written})")
     print(f"  No hits:            {no_hits}")
     print(f"  Failed to parse:    {failed}")
+    if pages_total:
+        print(f"  Pages evaluated:    {pages_visited}/{pages_total} "
+              f"({100 * pages_visited / pages_total:.1f}%, search={args.search})")
+    if clip_stats["pages"]:
+        print(f"  Header-band pages:  {clip_stats['pages']} (top {args.header_clip:g} of page; "
+              f"{clip_stats['fallbacks']} ambiguous → full page)")
+    if args.slice:
+        print(f"  Sliced to _EB.pdf:  {sliced} (summary: {EXTRACTION_SUMMARY})")
+    if journal.commits:
+        print(f"  Journal commits:    {journal.commits} (every {args.commit_rows} rows or {args.commit_secs:g}s)")
+    if opens_per_file:
+        print(f"  PDF opens:          {sum(opens_per_file.values())} for {len(opens_per_file)} files "
+              f"(max {max(opens_per_file.values())} per file)")
     print(f"  Output CSV:         {OUT_CSV} ({'created' if (recreate or first_run) else 'appended'})")
 
     if no_hit_files:
@@ -410,9 +1124,26 @@ def main():
         print("\n[FAILED TO PARSE — filenames]")
         for name in failed_files:
             print(f"  - {name}")
+
+    if clip_stats["compared"]:
+        n = clip_stats["compared"]
+        full_rate = n / clip_stats["full_s"] if clip_stats["full_s"] else float("inf")
+        clip_rate = n / clip_stats["clip_s"] if clip_stats["clip_s"] else float("inf")
+        print("\n[HEADER CLIP vs FULL PAGE] (PyMuPDF, per-page time in this process)")
+        print(f"  Pages compared:     {n}")
+        print(f"  Full-page path:     {full_rate:.1f} pages/sec")
+        print(f"  Header-band path:   {clip_rate:.1f} pages/sec ({clip_rate / full_rate:.2f}x)")
+        print(f"  Ambiguous bands:    {clip_stats['fallbacks']}")
+        print(f"  Decisions differ:   {clip_stats['disagree']}")
+
+    # Keep the page text cache within its size cap
+    cache = _get_text_cache()
+    if cache:
+        dropped = cache.evict()
+        print(f"\n[TEXT CACHE] {TEXT_CACHE_DB} (cap {args.text_cache_mb} MB; evicted {dropped} documents)")
     
     # Generate page range summary
-    generate_page_range_summary()
+    generate_page_range_summary(manifest)
 
 # Entry point
 if __name__ == "__main__":
@@ -0,0 +1,866 @@
+"""
+hb_cache.py
+
+On-disk caches shared by the handbook scripts.
+
+PageTextCache
+  Extracted page text keyed by (PDF sha256, page number, parser), so re-running
+  EB page detection with new rules only re-evaluates the predicate over cached
+  text instead of re-parsing every PDF.
+  - Files are identified by content hash. The (path, size, mtime) -> sha256 memo
+    means an unchanged file is never re-hashed; a changed file gets a new hash,
+    so its old text is no longer found and is dropped.
+  - Text is stored zlib-compressed, one document (sha256, parser) at a time, and
+    evicted least-recently-used first once the store exceeds max_bytes.
+  - SQLite in WAL mode, so several scanner processes can read and write at once.
+
+ResponseCache
+  Raw Gemini responses for llm_csv_hb_extractor.py keyed by what determines them
+  (chunk PDF bytes, prompt, model, generation config), with their token usage,
+  so re-running after a crash or a recreate_flag flip only pays for new chunks.
+  SQLite in WAL mode, evicted least-recently-used first beyond max_bytes.
+
+ParserMemo
+  Which PDF parser worked for each file, and how fast (see class docstring).
+
+ScanManifest / ScanJournal
+  What find_eb_pages.py last concluded about each PDF, and from which file
+  contents and rule set; the journal makes those results durable as they arrive
+  (see class docstrings).
+
+ChunkSpool
+  Parsed CSV chunks of one EB extract, saved by llm_csv_hb_extractor.py as each
+  chunk completes, so an interrupted or partly failed file resumes from its
+  missing chunks (see class docstring).
+
+ExtractState
+  llm_csv_hb_extractor.py's per-file and per-chunk status (attempts, latency,
+  tokens, errors) in SQLite, replacing the read-modify-write of extract_log.csv,
+  which is now an export (see class docstring).
+"""
+
+from pathlib import Path
+from contextlib import suppress
+import shutil
+import csv
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+def file_sha256(path: Path, chunk_size: int = 1 << 20) -> str:
+    """Stream a file through sha256 and return the hex digest."""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(chunk_size), b""):
+            h.update(block)
+    return h.hexdigest()
+
+class PageTextCache:
+    def __init__(self, db_path: Path, max_bytes: int):
+        self.db_path = Path(db_path)
+        self.max_bytes = max_bytes
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.con = sqlite3.connect(self.db_path, timeout=120)
+        self.con.execute("PRAGMA auto_vacuum=INCREMENTAL")  # only takes effect on a new file
+        self.con.execute("PRAGMA journal_mode=WAL")
+        self.con.execute("PRAGMA synchronous=NORMAL")
+        self.con.executescript("""
+            CREATE TABLE IF NOT EXISTS files (
+                path     TEXT PRIMARY KEY,
+                size     INTEGER,
+                mtime_ns INTEGER,
+                sha256   TEXT
+            );
+            CREATE TABLE IF NOT EXISTS docs (
+                sha256    TEXT,
+                parser    TEXT,
+                n_pages   INTEGER,
+                nbytes    INTEGER DEFAULT 0,
+                last_used REAL,
+                PRIMARY KEY (sha256, parser)
+            );
+            CREATE TABLE IF NOT EXISTS pages (
+                sha256 TEXT,
+                parser TEXT,
+                page   INTEGER,
+                text   BLOB,
+                PRIMARY KEY (sha256, parser, page)
+            );
+        """)
+        self.con.commit()
+
+    # -- file identity -------------------------------------------------
+    def file_hash(self, path: Path) -> str:
+        """
+        Return the sha256 of `path`, re-hashing only when size or mtime changed.
+        When a path's hash changes, its old cached text is dropped unless another
+        path still points at the same content.
+        """
+        st = os.stat(path)
+        key = str(Path(path).resolve())
+        row = self.con.execute(
+            "SELECT size, mtime_ns, sha256 FROM files WHERE path = ?", (key,)
+        ).fetchone()
+        if row and row[0] == st.st_size and row[1] == st.st_mtime_ns:
+            return row[2]
+
+        sha = file_sha256(path)
+        with self.con:
+            self.con.execute(
+                "INSERT OR REPLACE INTO files (path, size, mtime_ns, sha256) VALUES (?, ?, ?, ?)",
+                (key, st.st_size, st.st_mtime_ns, sha),
+            )
+            if row and row[2] != sha:
+                still_used = self.con.execute(
+                    "SELECT 1 FROM files WHERE sha256 = ? LIMIT 1", (row[2],)
+                ).fetchone()
+                if not still_used:
+                    self._drop(row[2])
+        return sha
+
+    # -- reads ---------------------------------------------------------
+    def page_count(self, sha: str, parser: str):
+        """Page count recorded when `parser` opened this document, or None if never cached."""
+        row = self.con.execute(
+            "SELECT n_pages FROM docs WHERE sha256 = ? AND parser = ?", (sha, parser)
+        ).fetchone()
+        return row[0] if row else None
+
+    def get_texts(self, sha: str, parser: str, first: int, last: int) -> dict[int, str]:
+        """Return {page: text} for cached 1-based pages first..last and mark the document used."""
+        rows = self.con.execute(
+            "SELECT page, text FROM pages WHERE sha256 = ? AND parser = ? AND page BETWEEN ? AND ?",
+            (sha, parser, first, last),
+        ).fetchall()
+        if rows:
+            with self.con:
+                self.con.execute(
+                    "UPDATE docs SET last_used = ? WHERE sha256 = ? AND parser = ?",
+                    (time.time(), sha, parser),
+                )
+        return {page: zlib.decompress(blob).decode("utf-8") for page, blob in rows}
+
+    # -- writes --------------------------------------------------------
+    def put_texts(self, sha: str, parser: str, n_pages: int, texts: dict[int, str]):
+        """Store {page: text} (1-based pages) extracted by `parser` in one transaction."""
+        if not texts:
+            return
+        rows = [
+            (sha, parser, page, zlib.compress((text or "").encode("utf-8"), 1))
+            for page, text in texts.items()
+        ]
+        with self.con:
+            self.con.execute(
+                "INSERT OR IGNORE INTO docs (sha256, parser, n_pages, nbytes, last_used) VALUES (?, ?, ?, 0, ?)",
+                (sha, parser, n_pages, time.time()),
+            )
+            self.con.executemany(
+                "INSERT OR REPLACE INTO pages (sha256, parser, page, text) VALUES (?, ?, ?, ?)", rows
+            )
+            self.con.execute(
+                "UPDATE docs SET last_used = ?, nbytes = "
+                "(SELECT SUM(LENGTH(text)) FROM pages WHERE sha256 = ? AND parser = ?) "
+                "WHERE sha256 = ? AND parser = ?",
+                (time.time(), sha, parser, sha, parser),
+            )
+
+    def evict(self) -> int:
+        """Drop least-recently-used documents until the store fits in max_bytes. Returns docs dropped."""
+        total = self.con.execute("SELECT COALESCE(SUM(nbytes), 0) FROM docs").fetchone()[0]
+        dropped = 0
+        if total <= self.max_bytes:
+            return dropped
+        for sha, parser, nbytes in self.con.execute(
+            "SELECT sha256, parser, nbytes FROM docs ORDER BY last_used ASC"
+        ).fetchall():
+            if total <= self.max_bytes:
+                break
+            with self.con:
+                self.con.execute("DELETE FROM pages WHERE sha256 = ? AND parser = ?", (sha, parser))
+                self.con.execute("DELETE FROM docs WHERE sha256 = ? AND parser = ?", (sha, parser))
+            total -= nbytes
+            dropped += 1
+        self.con.execute("PRAGMA incremental_vacuum")
+        return dropped
+
+    def _drop(self, sha: str):
+        self.con.execute("DELETE FROM pages WHERE sha256 = ?", (sha,))
+        self.con.execute("DELETE FROM docs WHERE sha256 = ?", (sha,))
+
+    def close(self):
+        self.con.close()
+
+class ResponseCache:
+    """
+    LLM responses keyed by sha256 over (chunk bytes, prompt, model, generation
+    config); see key(). Changing any of them misses the cache. One connection
+    shared by the extractor's request threads, behind a lock.
+    """
+    def __init__(self, db_path: Path, max_bytes: int):
+        self.db_path = Path(db_path)
+        self.max_bytes = max_bytes
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.lock = threading.Lock()
+        self.con = sqlite3.connect(self.db_path, timeout=120, check_same_thread=False)
+        self.con.execute("PRAGMA auto_vacuum=INCREMENTAL")  # only takes effect on a new file
+        self.con.execute("PRAGMA journal_mode=WAL")
+        self.con.execute("PRAGMA synchronous=NORMAL")
+        self.con.executescript("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key           TEXT PRIMARY KEY,
+                model         TEXT,
+                text          BLOB,
+                prompt_tokens INTEGER,
+                output_tokens INTEGER,
+                total_tokens  INTEGER,
+                nbytes        INTEGER,
+                created       REAL,
+                last_used     REAL,
+                finish_reason TEXT
+            );
+            CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used);
+        """)
+        columns = {row[1] for row in self.con.execute("PRAGMA table_info(responses)")}
+        if "finish_reason" not in columns:       # cache written before finish reasons were kept
+            self.con.execute("ALTER TABLE responses ADD COLUMN finish_reason TEXT")
+        self.con.commit()
+        self.hits = self.misses = 0
+        self.tokens_saved = 0
+
+    @staticmethod
+    def key(chunk: bytes, prompt: str, model: str, config: dict) -> str:
+        h = hashlib.sha256()
+        h.update(hashlib.sha256(chunk).digest())
+        h.update(hashlib.sha256(prompt.encode("utf-8")).digest())
+        h.update(json.dumps([model, config], sort_keys=True).encode("utf-8"))
+        return h.hexdigest()
+
+    def get(self, key: str):
+        """
+        Return {"text", "prompt_tokens", "output_tokens", "total_tokens", "finish_reason"}
+        or None, counting the hit/miss.
+        """
+        with self.lock:
+            row = self.con.execute(
+                "SELECT text, prompt_tokens, output_tokens, total_tokens, finish_reason FROM responses WHERE key = ?",
+                (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            with self.con:
+                self.con.execute("UPDATE responses SET last_used = ? WHERE key = ?", (time.time(), key))
+            self.hits += 1
+            self.tokens_saved += row[3] or 0
+        return {"text": zlib.decompress(row[0]).decode("utf-8"), "prompt_tokens": row[1],
+                "output_tokens": row[2], "total_tokens": row[3], "finish_reason": row[4]}
+
+    def put(self, key: str, model: str, text: str, prompt_tokens=None, output_tokens=None, total_tokens=None,
+            finish_reason=None):
+        blob = zlib.compress(text.encode("utf-8"), 6)
+        now = time.time()
+        with self.lock, self.con:
+            self.con.execute(
+                "INSERT OR REPLACE INTO responses (key, model, text, prompt_tokens, output_tokens, total_tokens, "
+                "nbytes, created, last_used, finish_reason) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, model, blob, prompt_tokens, output_tokens, total_tokens, len(blob), now, now, finish_reason),
+            )
+
+    def forget(self, key: str):
+        """Drop one response (e.g. one that turned out unusable), so the next run requests it again."""
+        with self.lock, self.con:
+            self.con.execute("DELETE FROM responses WHERE key = ?", (key,))
+
+    def evict(self) -> int:
+        """Drop least-recently-used responses until the store fits in max_bytes. Returns responses dropped."""
+        with self.lock:
+            total = self.con.execute("SELECT COALESCE(SUM(nbytes), 0) FROM responses").fetchone()[0]
+            dropped = 0
+            if total <= self.max_bytes:
+                return dropped
+            doomed = []
+            for key, nbytes in self.con.execute("SELECT key, nbytes FROM responses ORDER BY last_used ASC"):
+                if total <= self.max_bytes:
+                    break
+                doomed.append((key,))
+                total -= nbytes
+            with self.con:
+                self.con.executemany("DELETE FROM responses WHERE key = ?", doomed)
+            self.con.execute("PRAGMA incremental_vacuum")
+            return len(doomed)
+
+    def close(self):
+        self.con.close()
+
+class ParserMemo:
+    """
+    Per-file record of which PDF parser worked, and how fast, shared by
+    find_eb_pages.py, extract_handbook_pages.py and llm_csv_hb_extractor.py.
+
+    Stored as JSON in the series' --pdf_root, keyed by the PDF's path relative
+    to that root. Each entry remembers the file's size and mtime; if the file
+    changes, the entry is ignored and rebuilt.
+
+      {"DH_09_2001_GAU.pdf": {"size": ..., "mtime_ns": ...,
+         "parsers": {"pypdf":   {"ok": false, "error": "PdfReadError: ..."},
+                     "pymupdf": {"ok": true, "pages_per_sec": {"scan": 41.7, "slice": 1200.0}}}}}
+
+    order() ranks candidate parsers for a task: parsers known to work (fastest
+    first for that task), then untried ones, and drops parsers known to fail,
+    unless every candidate has failed, in which case all are tried again.
+    """
+    def __init__(self, path: Path, root: Path):
+        self.path = Path(path)
+        self.root = Path(root)
+        self.entries = self._load()
+        self.dirty = set()
+
+    def _load(self) -> dict:
+        if not self.path.exists():
+            return {}
+        try:
+            return json.loads(self.path.read_text())
+        except (OSError, ValueError):
+            return {}
+
+    def _key(self, pdf: Path) -> str:
+        pdf = Path(pdf)
+        try:
+            return pdf.resolve().relative_to(self.root.resolve()).as_posix()
+        except ValueError:
+            return pdf.name
+
+    def _entry(self, pdf: Path, create: bool = False):
+        st = os.stat(pdf)
+        key = self._key(pdf)
+        e = self.entries.get(key)
+        if e and e.get("size") == st.st_size and e.get("mtime_ns") == st.st_mtime_ns:
+            return e
+        if not create:
+            return None
+        e = {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "parsers": {}}
+        self.entries[key] = e
+        return e
+
+    def order(self, pdf: Path, candidates, task: str) -> list[str]:
+        """Return `candidates` in the order they should be tried for this file and task."""
+        e = self._entry(pdf)
+        if not e:
+            return list(candidates)
+        known = e["parsers"]
+        ok = [c for c in candidates if known.get(c, {}).get("ok") is True]
+        untried = [c for c in candidates if c not in known]
+        ok.sort(key=lambda c: known[c].get("pages_per_sec", {}).get(task, 0.0), reverse=True)
+        return (ok + untried) or list(candidates)
+
+    def record(self, pdf: Path, parser: str, task: str, ok: bool,
+               pages: int = 0, seconds: float = 0.0, error: str = ""):
+        """Record one parser attempt on `pdf`."""
+        e = self._entry(pdf, create=True)
+        rec = e["parsers"].setdefault(parser, {})
+        rec["ok"] = ok
+        if ok:
+            rec.pop("error", None)
+            if pages and seconds > 0:
+                rec.setdefault("pages_per_sec", {})[task] = round(pages / seconds, 2)
+        else:
+            rec["error"] = error[:300]
+        self.dirty.add(self._key(pdf))
+
+    def save(self):
+        """
+        Merge this run's entries into the file on disk and replace it atomically,
+        so concurrent scripts sharing the memo don't drop each other's records.
+        """
+        if not self.dirty:
+            return
+        merged = self._load()
+        for key in self.dirty:
+            merged[key] = self.entries[key]
+        tmp = self.path.with_suffix(self.path.suffix + ".tmp")
+        tmp.write_text(json.dumps(merged, indent=1, sort_keys=True))
+        os.replace(tmp, self.path)
+        self.entries = merged
+        self.dirty.clear()
+
+def pages_to_field(pages) -> str:
+    """[3, 4, 5, 9] -> '3-5 9'"""
+    out, run = [], []
+    for pg in sorted(pages):
+        if run and pg != run[-1] + 1:
+            out.append(f"{run[0]}-{run[-1]}" if len(run) > 1 else f"{run[0]}")
+            run = []
+        run.append(pg)
+    if run:
+        out.append(f"{run[0]}-{run[-1]}" if len(run) > 1 else f"{run[0]}")
+    return " ".join(out)
+
+def field_to_pages(field: str) -> list[int]:
+    """'3-5 9' -> [3, 4, 5, 9]"""
+    pages = []
+    for part in (field or "").split():
+        a, _, b = part.partition("-")
+        pages.extend(range(int(a), int(b or a) + 1))
+    return pages
+
+class ScanManifest:
+    """
+    Per-file record of the last EB page scan, kept as a CSV in the series' --pdf_root
+    next to urban_eb_pages.csv:
+
+      filename,size,mtime_ns,sha256,rules_version,result,n_hits,pages,scanned_at
+      DH_09_2001_GAU.pdf,48213377,1726...,9f2c...,c1eb2869770f,hits,14,262-275,2025-11-19T10:02:11
+      DH_19_2001_NTFP.pdf,...,no_hits,0,,...
+
+    result is "hits", "no_hits" or "failed", so files without EB pages are
+    remembered too. pages holds the hit pages as space-separated ranges, so the
+    page range summary can be built without re-reading urban_eb_pages.csv. status() tells the scanner whether a file needs scanning:
+      "new"      no record
+      "changed"  contents differ (size/mtime moved and sha256 differs)
+      "rules"    scanned with a different rule-set (or scan settings) version
+      "current"  nothing to do
+    A file whose size/mtime moved but whose sha256 is unchanged (e.g. copied or
+    touched) is "current"; its record is updated with the new size/mtime.
+    """
+    FIELDS = ["filename", "size", "mtime_ns", "sha256", "rules_version", "result", "n_hits", "pages", "scanned_at"]
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.entries = {}
+        self.loaded = False
+        if self.path.exists():
+            with self.path.open(newline="") as f:
+                r = csv.DictReader(f)
+                # A manifest without every column (older layout) is rebuilt rather than trusted
+                if set(self.FIELDS) <= set(r.fieldnames or []):
+                    self.entries = {row["filename"]: row for row in r}
+                    self.loaded = True
+        self.dirty = False
+
+    def exists(self) -> bool:
+        return self.loaded
+
+    def status(self, pdf: Path, rules_version: str, hasher) -> str:
+        """Classify `pdf` as new/changed/rules/current; `hasher(pdf)` is only called if size/mtime moved."""
+        e = self.entries.get(pdf.name)
+        if e is None:
+            return "new"
+        st = os.stat(pdf)
+        if int(e["size"]) != st.st_size or int(e["mtime_ns"]) != st.st_mtime_ns:
+            if not e["sha256"] or hasher(pdf) != e["sha256"]:
+                return "changed"
+            e["size"], e["mtime_ns"] = str(st.st_size), str(st.st_mtime_ns)
+            self.dirty = True
+        return "current" if e["rules_version"] == rules_version else "rules"
+
+    def record(self, pdf: Path, sha256: str, rules_version: str, result: str, pages=()) -> dict:
+        """Record the outcome of scanning `pdf` ("hits", "no_hits" or "failed"). Returns the entry."""
+        st = os.stat(pdf)
+        e = {
+            "filename": pdf.name, "size": str(st.st_size), "mtime_ns": str(st.st_mtime_ns),
+            "sha256": sha256, "rules_version": rules_version, "result": result,
+            "n_hits": str(len(pages)), "pages": pages_to_field(pages),
+            "scanned_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        }
+        self.apply(e)
+        return e
+
+    def apply(self, entry: dict):
+        """Install an entry produced by record() (e.g. replayed from a ScanJournal)."""
+        self.entries[entry["filename"]] = entry
+        self.dirty = True
+
+    def pages(self, filename: str) -> list[int]:
+        """Hit pages recorded for `filename` ([] if none or unknown)."""
+        e = self.entries.get(filename)
+        return field_to_pages(e.get("pages", "")) if e else []
+
+    def save(self):
+        """Rewrite the manifest atomically (sorted by filename)."""
+        if not self.dirty:
+            return
+        tmp = self.path.with_suffix(self.path.suffix + ".tmp")
+        with tmp.open("w", newline="") as f:
+            w = csv.DictWriter(f, fieldnames=self.FIELDS)
+            w.writeheader()
+            for name in sorted(self.entries):
+                w.writerow({k: self.entries[name].get(k, "") for k in self.FIELDS})
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+        self.dirty = False
+
+class ScanJournal:
+    """
+    Append-only JSONL log of scan results with group commit.
+
+    Records are buffered and written in one batch, followed by a single fsync,
+    once `commit_rows` rows are pending (a record counts as its number of CSV rows,
+    at least 1) or `commit_secs` have passed since the last commit. The time limit
+    is also checked by a background timer started with the first append, so rows
+    do not sit uncommitted while no further results arrive (e.g. during one long
+    PDF). After each commit `on_commit(records)` is called (from whichever thread
+    committed, under the journal's lock), e.g. to extend a tail -f-able CSV view.
+
+    A crash loses at most the uncommitted batch. Whatever was committed is
+    returned by replay() on the next run, which applies it and then calls
+    clear() once the results are safely stored elsewhere (compaction). A torn
+    final line from a crash mid-write is ignored.
+    """
+    def __init__(self, path: Path, commit_rows: int = 500, commit_secs: float = 5.0, on_commit=None):
+        self.path = Path(path)
+        self.commit_rows = max(1, commit_rows)
+        self.commit_secs = commit_secs
+        self.on_commit = on_commit
+        self.pending = []
+        self.pending_rows = 0
+        self.last_commit = time.monotonic()
+        self.commits = 0
+        self.fh = None
+        self.lock = threading.RLock()
+        self.timer = None
+        self.stopped = threading.Event()
+
+    def replay(self) -> list[dict]:
+        """Return the intact records left by an earlier run (oldest first)."""
+        if not self.path.exists():
+            return []
+        records = []
+        with self.path.open() as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    break
+        return records
+
+    def append(self, record: dict, rows: int = 1):
+        with self.lock:
+            self.pending.append(record)
+            self.pending_rows += max(1, rows)
+            if (self.pending_rows >= self.commit_rows
+                    or time.monotonic() - self.last_commit >= self.commit_secs):
+                self.commit()
+        if self.timer is None and self.commit_secs > 0:
+            self.timer = threading.Thread(target=self._commit_on_time, name="journal-commit", daemon=True)
+            self.timer.start()
+
+    def _commit_on_time(self):
+        """Commit a pending batch once it is commit_secs old, until clear()."""
+        while not self.stopped.wait(min(1.0, self.commit_secs)):
+            with self.lock:
+                if self.pending and time.monotonic() - self.last_commit >= self.commit_secs:
+                    self.commit()
+
+    def commit(self):
+        """Write and fsync all pending records, then hand them to on_commit."""
+        with self.lock:
+            if self.pending:
+                if self.fh is None:
+                    self.fh = self.path.open("a")
+                self.fh.write("".join(json.dumps(r) + "\n" for r in self.pending))
+                self.fh.flush()
+                os.fsync(self.fh.fileno())
+                self.commits += 1
+                if self.on_commit:
+                    self.on_commit(self.pending)
+            self.pending = []
+            self.pending_rows = 0
+            self.last_commit = time.monotonic()
+
+    def clear(self):
+        """Stop the commit timer and drop the journal once its records are stored elsewhere."""
+        self.stopped.set()
+        if self.timer is not None:
+            self.timer.join()
+        if self.fh is not None:
+            self.fh.close()
+            self.fh = None
+        with suppress(FileNotFoundError):
+            self.path.unlink()
+
+class ChunkSpool:
+    """
+    Per-file directory of completed CSV chunks:
+
+      <spool_root>/<pdf stem>/plan.json          {"key": ..., "spans": [[0, 20], [20, 40], ...]}
+      <spool_root>/<pdf stem>/chunk_0000-0020.csv
+      <spool_root>/<pdf stem>/chunk_0000-0020.csv.part   (lines of a response still streaming)
+
+    Spans are 0-based [start, end) page ranges. `key` identifies everything that
+    determines a chunk's output (input sha256, chunk size, prompt, model); when it
+    differs from the plan on disk, the old chunks are discarded. Chunk files are
+    written atomically, so a chunk file that exists is complete; a .part file only
+    ever holds the rows received so far.
+    """
+    def __init__(self, spool_root: Path, pdf_name: str, key: str, spans):
+        self.dir = Path(spool_root) / Path(pdf_name).stem
+        self.spans = [(int(a), int(b)) for a, b in spans]
+        plan = {"key": key, "spans": [list(s) for s in self.spans]}
+        plan_path = self.dir / "plan.json"
+        try:
+            current = json.loads(plan_path.read_text())
+        except (FileNotFoundError, ValueError):
+            current = None
+        if current != plan:
+            shutil.rmtree(self.dir, ignore_errors=True)
+            self.dir.mkdir(parents=True, exist_ok=True)
+            plan_path.write_text(json.dumps(plan))
+
+    def _path(self, start: int, end: int) -> Path:
+        return self.dir / f"chunk_{start:04d}-{end:04d}.csv"
+
+    def has(self, start: int, end: int) -> bool:
+        return self._path(start, end).exists()
+
+    def missing(self) -> list[tuple[int, int]]:
+        return [s for s in self.spans if not self.has(*s)]
+
+    def open_part(self, start: int, end: int):
+        """Text file the lines of a streaming response are appended to as they arrive."""
+        return (self.dir / f"{self._path(start, end).name}.part").open("w")
+
+    def drop_part(self, start: int, end: int):
+        """Delete the .part file of a span whose response is complete (or was split)."""
+        (self.dir / f"{self._path(start, end).name}.part").unlink(missing_ok=True)
+
+    def save(self, start: int, end: int, csv_text: str):
+        path = self._path(start, end)
+        tmp = path.with_suffix(".csv.tmp")
+        tmp.write_text(csv_text)
+        os.replace(tmp, path)
+        self.drop_part(start, end)
+
+    def write_combined(self, out_path: Path):
+        """
+        Concatenate the chunk CSVs in page order into out_path, line by line (the
+        first chunk's header kept, the others' skipped), so memory stays flat
+        however long the file. Raises FileNotFoundError if any chunk is missing.
+        """
+        out_path = Path(out_path)
+        tmp = out_path.with_suffix(out_path.suffix + ".tmp")
+        with tmp.open("w") as out:
+            for i, span in enumerate(self.spans):
+                with self._path(*span).open() as f:
+                    header = f.readline()
+                    if i == 0:
+                        out.write(header if header.endswith("\n") else header + "\n")
+                    for line in f:
+                        if line.strip():
+                            out.write(line if line.endswith("\n") else line + "\n")
+        os.replace(tmp, out_path)
+
+    def clear(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+class ExtractState:
+    """
+    Extraction status for llm_csv_hb_extractor.py, in SQLite (WAL) so request
+    threads and several extractor processes can update it at once.
+
+      files   one row per input PDF: the extract_log.csv columns (output_csv_name,
+              error_flag, recreate_flag) plus status, n_chunks, attempts, seconds,
+              tokens and the last error
+      chunks  one row per (PDF, chunk): status ("done", "cached", "local", "failed"),
+              attempts, seconds, tokens, error, rows repaired (salvaged) and
+              quarantined (dropped) by csv_salvage.py, and for streamed
+              responses the seconds until the first CSV row arrived
+      rejects the quarantined lines of each chunk, with the reason
+
+    A file is claimed before it is extracted, so two extractors never work on
+    the same file; a claim older than `stale_secs` (a crashed run) can be taken over.
+
+    extract_log.csv stays the user-facing view: export_log() writes it at the end
+    of a run, and import_log() picks up hand edits to it (e.g. recreate_flag
+    flipped to 1) when its mtime differs from the last export.
+    """
+    LOG_COLUMNS = ["input_pdf_name", "output_csv_name", "error_flag", "recreate_flag"]
+    STATUS_COLUMNS = LOG_COLUMNS + ["status", "n_chunks", "attempts", "seconds",
+                                    "prompt_tokens", "output_tokens", "salvaged", "dropped",
+                                    "error", "updated_at"]
+    # Columns added after the first release, created in older state files on open
+    ADDED_COLUMNS = {"files": {"salvaged": "INTEGER", "dropped": "INTEGER"},
+                     "chunks": {"first_row_seconds": "REAL", "salvaged": "INTEGER", "dropped": "INTEGER"}}
+
+    def __init__(self, db_path: Path, stale_secs: float = 2 * 3600):
+        self.db_path = Path(db_path)
+        self.stale_secs = stale_secs
+        self.owner = f"{os.uname().nodename}:{os.getpid()}"
+        self.lock = threading.Lock()
+        self.con = sqlite3.connect(self.db_path, timeout=120, check_same_thread=False)
+        self.con.execute("PRAGMA journal_mode=WAL")
+        self.con.execute("PRAGMA synchronous=NORMAL")
+        self.con.executescript("""
+            CREATE TABLE IF NOT EXISTS files (
+                input_pdf_name  TEXT PRIMARY KEY,
+                output_csv_name TEXT,
+                error_flag      INTEGER DEFAULT 0,
+                recreate_flag   INTEGER DEFAULT 1,
+                status          TEXT DEFAULT 'pending',
+                owner           TEXT,
+                claimed_at      REAL,
+                n_chunks        INTEGER,
+                attempts        INTEGER DEFAULT 0,
+                seconds         REAL,
+                prompt_tokens   INTEGER,
+                output_tokens   INTEGER,
+                error           TEXT,
+                updated_at      TEXT,
+                salvaged        INTEGER,
+                dropped         INTEGER
+            );
+            CREATE TABLE IF NOT EXISTS chunks (
+                input_pdf_name TEXT,
+                start_page     INTEGER,
+                end_page       INTEGER,
+                status         TEXT,
+                attempts       INTEGER,
+                seconds        REAL,
+                prompt_tokens  INTEGER,
+                output_tokens  INTEGER,
+                error          TEXT,
+                updated_at     TEXT,
+                first_row_seconds REAL,
+                salvaged       INTEGER,
+                dropped        INTEGER,
+                PRIMARY KEY (input_pdf_name, start_page)
+            );
+            CREATE TABLE IF NOT EXISTS rejects (
+                input_pdf_name TEXT,
+                start_page     INTEGER,
+                end_page       INTEGER,
+                line           TEXT,
+                reason         TEXT
+            );
+            CREATE INDEX IF NOT EXISTS rejects_chunk ON rejects (input_pdf_name, start_page);
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+        """)
+        for table, added in self.ADDED_COLUMNS.items():
+            columns = {row[1] for row in self.con.execute(f"PRAGMA table_info({table})")}
+            for name, sql_type in added.items():
+                if name not in columns:
+                    self.con.execute(f"ALTER TABLE {table} ADD COLUMN {name} {sql_type}")
+        self.con.commit()
+
+    def _now(self) -> str:
+        return time.strftime("%Y-%m-%dT%H:%M:%S")
+
+    # -- extract_log.csv ---------------------------------------------------
+    def import_log(self, log_path: Path) -> int:
+        """Load extract_log.csv if it changed since the last export; returns rows imported."""
+        log_path = Path(log_path)
+        if not log_path.exists():
+            return 0
+        mtime = str(os.stat(log_path).st_mtime_ns)
+        with self.lock:
+            row = self.con.execute("SELECT value FROM meta WHERE key = 'log_mtime_ns'").fetchone()
+        if row and row[0] == mtime:
+            return 0
+        with log_path.open(newline="") as f:
+            rows = [(r["input_pdf_name"], r["output_csv_name"], int(float(r["error_flag"] or 0)),
+                     int(float(r["recreate_flag"] or 0))) for r in csv.DictReader(f)]
+        with self.lock, self.con:
+            self.con.executemany(
+                "INSERT INTO files (input_pdf_name, output_csv_name, error_flag, recreate_flag) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (input_pdf_name) DO UPDATE SET output_csv_name = excluded.output_csv_name, "
+                "error_flag = excluded.error_flag, recreate_flag = excluded.recreate_flag", rows)
+            self.con.execute("INSERT OR REPLACE INTO meta VALUES ('log_mtime_ns', ?)", (mtime,))
+        return len(rows)
+
+    def export_log(self, log_path: Path, status_path: Path = None):
+        """Write extract_log.csv (its original four columns) and, optionally, the full status table."""
+        log_path = Path(log_path)
+        with self.lock:
+            cur = self.con.execute(f"SELECT {', '.join(self.STATUS_COLUMNS)} FROM files ORDER BY rowid")
+            rows = cur.fetchall()
+        for path, columns in ((log_path, self.LOG_COLUMNS), (status_path, self.STATUS_COLUMNS)):
+            if path is None:
+                continue
+            path = Path(path)
+            tmp = path.with_suffix(path.suffix + ".tmp")
+            with tmp.open("w", newline="") as f:
+                w = csv.writer(f)
+                w.writerow(columns)
+                w.writerows(r[:len(columns)] for r in rows)
+            os.replace(tmp, path)
+        with self.lock, self.con:
+            self.con.execute("INSERT OR REPLACE INTO meta VALUES ('log_mtime_ns', ?)",
+                             (str(os.stat(log_path).st_mtime_ns),))
+
+    # -- files -------------------------------------------------------------
+    def needs_extract(self, pdf_name: str, output_csv_name: str) -> bool:
+        """True unless the file is logged with recreate_flag 0; unseen files are added with recreate_flag 1."""
+        with self.lock, self.con:
+            row = self.con.execute(
+                "SELECT recreate_flag FROM files WHERE input_pdf_name = ?", (pdf_name,)
+            ).fetchone()
+            if row is None:
+                self.con.execute(
+                    "INSERT INTO files (input_pdf_name, output_csv_name, error_flag, recreate_flag, updated_at) "
+                    "VALUES (?, ?, 0, 1, ?)", (pdf_name, output_csv_name, self._now()))
+                return True
+        return row[0] != 0
+
+    def claim(self, pdf_name: str) -> bool:
+        """
+        Mark a file as being extracted by this process; False if another live run holds
+        it or a run has finished it since this one listed it (recreate_flag back at 0).
+        """
+        now = time.time()
+        with self.lock, self.con:
+            cur = self.con.execute(
+                "UPDATE files SET status = 'running', owner = ?, claimed_at = ?, updated_at = ? "
+                "WHERE input_pdf_name = ? AND recreate_flag != 0 "
+                "AND (status != 'running' OR owner = ? OR claimed_at < ?)",
+                (self.owner, now, self._now(), pdf_name, self.owner, now - self.stale_secs))
+        return cur.rowcount == 1
+
+    def finish_file(self, pdf_name: str, ok: bool, n_chunks: int, seconds: float, error: str = None):
+        """Record a file's outcome (flags as extract_log.csv had them) and roll up its chunk stats."""
+        with self.lock, self.con:
+            self.con.execute(
+                "UPDATE files SET status = ?, error_flag = ?, recreate_flag = ?, owner = NULL, n_chunks = ?, "
+                "seconds = ?, error = ?, updated_at = ?, "
+                "attempts = (SELECT COALESCE(SUM(attempts), 0) FROM chunks WHERE input_pdf_name = ?), "
+                "prompt_tokens = (SELECT SUM(prompt_tokens) FROM chunks WHERE input_pdf_name = ?), "
+                "output_tokens = (SELECT SUM(output_tokens) FROM chunks WHERE input_pdf_name = ?), "
+                "salvaged = (SELECT SUM(salvaged) FROM chunks WHERE input_pdf_name = ?), "
+                "dropped = (SELECT SUM(dropped) FROM chunks WHERE input_pdf_name = ?) "
+                "WHERE input_pdf_name = ?",
+                ("done" if ok else "failed", int(not ok), int(not ok), n_chunks, round(seconds, 2),
+                 error, self._now(), pdf_name, pdf_name, pdf_name, pdf_name, pdf_name, pdf_name))
+
+    def release(self):
+        """Return files this process claimed but did not finish (interrupted run) to pending."""
+        with self.lock, self.con:
+            self.con.execute("UPDATE files SET status = 'pending', owner = NULL "
+                             "WHERE status = 'running' AND owner = ?", (self.owner,))
+
+    # -- chunks ------------------------------------------------------------
+    def record_chunk(self, pdf_name: str, start: int, end: int, status: str, attempts: int = 0,
+                     seconds: float = None, prompt_tokens=None, output_tokens=None, error: str = None,
+                     first_row_seconds: float = None, salvaged: int = None, dropped: int = None,
+                     rejects=()):
+        """
+        Record one chunk outcome (start/end 0-based, end exclusive) and replace its
+        quarantined lines with `rejects` [(start, end, line, reason)]; called from
+        request threads.
+        """
+        with self.lock, self.con:
+            self.con.execute(
+                "INSERT OR REPLACE INTO chunks (input_pdf_name, start_page, end_page, status, attempts, "
+                "seconds, prompt_tokens, output_tokens, error, updated_at, first_row_seconds, salvaged, dropped) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (pdf_name, start, end, status, attempts, None if seconds is None else round(seconds, 2),
+                 prompt_tokens, output_tokens, error, self._now(),
+                 None if first_row_seconds is None else round(first_row_seconds, 2), salvaged, dropped))
+            self.con.execute("DELETE FROM rejects WHERE input_pdf_name = ? AND start_page >= ? AND start_page < ?",
+                             (pdf_name, start, end))
+            self.con.executemany("INSERT INTO rejects VALUES (?, ?, ?, ?, ?)",
+                                 [(pdf_name, a, b, line, reason) for a, b, line, reason in rejects])
+
+    def close(self):
+        self.con.close()
@@ -3,147 +3,569 @@
 INPUTS:
   - ~/iec/pcXX/district_handbooks/eb_table_extracts/*.pdf
   - ~/iec/pcXX/district_handbooks_xii_b/eb_table_extracts/*.pdf
+  - ~/iec/pcXX/district_handbooks*/pdf_parser_memo.json
+  - ~/iec/pcXX/district_handbooks*/.gemini_response_cache.sqlite
+  - ./extract_log.csv, ./extract_state.sqlite
 OUTPUTS:
   - ~/iec/pcXX/district_handbooks/eb_table_extracts/*.csv
   - ~/iec/pcXX/district_handbooks_xii_b/eb_table_extracts/*.csv
+  - ~/iec/pcXX/district_handbooks*/pdf_parser_memo.json
+  - ~/iec/pcXX/district_handbooks*/.gemini_response_cache.sqlite
+  - ~/iec/pcXX/district_handbooks*/eb_table_extracts/.chunks/ (chunks of unfinished files)
+  - ./extract_state.sqlite, ./extract_log.csv
 
 Script to extract tables from PDF files using Gemini LLM API.
 - Loads prompt template from file
 - Processes all PDFs in a directory
 - Maintains a log of processed files
-- Handles errors and retries
+- Handles errors and retries: errors are classified as quota, retryable or
+  permanent (retry_policy.py); retries back off exponentially with jitter,
+  honour the server's retry hint, and stop after --max_attempts per chunk.
+  Sustained quota errors pause all workers (--breaker_errors, --breaker_pause).
+- Sizes chunks from the text layer (eb_chunking.py): pages are packed into a
+  chunk until its expected CSV reaches --chunk_output_tokens (at most
+  --max_chunk_pages pages), so dense pages get small chunks and sparse pages
+  share one request. A response cut off at the output limit, or with far fewer
+  rows than the text layer shows (--min_row_ratio), is split in half and each
+  half requested again. --chunk_pages N uses fixed N-page chunks instead.
+- Sends up to --workers chunk requests at once, across files and within a file,
+  under --rpm / --tpm limits (see rate_limiter.py). Each file's CSV is assembled
+  in chunk order once all of its chunks are back, so the output is the same as a
+  serial run. --workers 1 (default) is the serial behaviour.
+- Caches raw responses by (chunk bytes, prompt, model, generation config) in
+  --pdf_root/.gemini_response_cache.sqlite, so a re-run after a crash or a
+  recreate_flag flip only pays for chunks whose response was never received.
+  --cache_mode refresh re-requests every chunk and overwrites the cache; off
+  bypasses it. Size-capped by --cache_mb (least-recently-used evicted).
+- Reads a page locally when its EB table can be rebuilt from the text layer and
+  passes the process_xls_hb.py window checks (local_eb_table.py); only the
+  remaining pages are sent to Gemini. --local_tables 0 sends every page.
+- Saves each chunk's CSV under eb_table_extracts/.chunks/<name>/ as soon as it
+  parses, so a file interrupted or failed partway resumes with only its missing
+  chunks; the final CSV is assembled once every chunk is present.
+- --stream 1 streams each response and appends its complete CSV lines to the
+  chunk's .part file in the spool as they arrive: the time to the first row is
+  recorded per chunk, a stream still running after --stream_timeout seconds is
+  retried, and if a chunk's last attempt fails partway the rows received are
+  kept (treated like a truncated response). Files are then assembled line by
+  line from the spool instead of in memory.
+- Reads each response line by line against the 7-column schema (csv_salvage.py):
+  stray commas and markdown leftovers are repaired, unreadable lines are
+  quarantined in extract_state.sqlite, and a chunk is only requested again if
+  fewer than --min_salvage_rate of its lines could be read.
+- Uploads the prompt once per run as Gemini cached content and references it
+  from each request (prompt_cache.py; --prompt_cache off sends it inline).
+  Gemini only caches a prompt of 1,024+ tokens on 2.5 Flash, so a shorter prompt
+  is still sent inline; the summary reports the cache hit rate and input tokens
+  served from cache either way.
+- Keeps per-file and per-chunk status (attempts, latency, tokens, errors) in
+  extract_state.sqlite (see hb_cache.ExtractState), which several extractors
+  can share; a file is claimed before it is extracted. extract_log.csv is
+  exported from it at the end of each run (--export_status writes the full
+  table), and hand edits to extract_log.csv are imported at the next start.
+
+Examples:
+  python llm_csv_hb_extractor.py --series pc01 --pdf_root ~/iec/pc01/district_handbooks
+  python llm_csv_hb_extractor.py --series pc01 --pdf_root ~/iec/pc01/district_handbooks --workers 8 --rpm 150 --tpm 1000000
 """
 import sys
 import os
 import shutil
 import re
 import json
+import hashlib
 import numpy as np
-import pandas as pd
 import time
+import threading
 from pathlib import Path
-from io import StringIO
+from io import BytesIO
+from contextlib import nullcontext
 from datetime import datetime
 from ddlpy.utils import IEC, TMP
 from dotenv import load_dotenv
 from pathlib import Path
 from google import genai
 from google.genai import types
-import PyPDF2
+import pypdf
 import sys, shlex
 import argparse
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 
 # Add project directory to sys.path for imports
 sys.path.append(os.path.expanduser("~/ddl/pc01_llm_extract"))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from hb_cache import ParserMemo, ResponseCache, ChunkSpool, ExtractState
+from rate_limiter import RateLimiter
+from retry_policy import RetryPolicy, RetryBudgetExceeded
+from prompt_cache import PromptCache, GeminiPromptCache, cache_missing
+from eb_chunking import (estimate_page_rows, plan_spans, fixed_spans, page_runs, needs_split,
+                         split_pdf_bytes)
+from csv_salvage import salvage_csv
+import local_eb_table
+
+# PDF libraries that can split an EB extract into chunks, tried in parser-memo order
+CHUNK_PARSERS = ("pypdf", "pymupdf")
+
+GEMINI_MODEL = "gemini-2.5-flash"
+GENERATION_CONFIG = {"temperature": 0, "thinking_budget": -1}
+CHUNK_SIZE = 20
+
+# Gemini bills each PDF page as 258 input tokens; the prompt is estimated at ~4 chars/token.
+# Used to reserve tokens-per-minute before a request; corrected from the response's usage.
+PDF_TOKENS_PER_PAGE = 258
 
 # Load environment variables from .env file
 load_dotenv()  # Loads variables from .env file
 GEMINI_API_KEY = os.getenv('GEMINI_API_KEY')
 
-# Initialize Gemini client
-client = genai.Client()
+# Gemini client, created on first request so the module imports without an API key
+_client = None
+_client_lock = threading.Lock()
+
+def get_client():
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = genai.Client()
+    return _client
 
-def extract_pdf_tables(pdf_path, output_dir):
+def _prepare_chunks(pdf_filepath, chunk_size, parser, spans=None, data=None, doc=None):
     """
-    Extract tables from a PDF file using Gemini LLM API.
-    For long PDFs, split into 20-page chunks and process each chunk separately.
-    Args:
-        pdf_path (str): Path to the PDF file.
-        output_dir (str): Directory to save output (not used directly here).
-    Returns:
-        str: Extracted CSV text.
+    Split a PDF into in-memory chunk PDFs of up to chunk_size pages (or the given
+    0-based [start, end) spans) with the given parser ("pypdf" or "pymupdf").
+    Returns (num_pages, [(start_page, end_page, bytes)]) with 0-based start and
+    exclusive end. The file is opened and parsed once; given its bytes (`data`)
+    and/or an open PyMuPDF document of them (`doc`, see open_extract), it is not
+    read again.
     """
-    print(f"\n[INFO] Extracting tables from: {pdf_path}")
-    
-    # Load prompt template from file
-    prompt_template_path = "./prompt_template.txt"
-    with open(prompt_template_path, 'r') as f:
-        prompt_template = f.read()
-    print(f"[DEBUG] Loaded prompt template from {prompt_template_path}")
-
-    pdf_filepath = Path(pdf_path)
+    if parser == "pymupdf":
+        import fitz
+        chunks = []
+        if doc is not None:
+            src = nullcontext(doc)
+        else:
+            src = fitz.open(stream=data, filetype="pdf") if data is not None else fitz.open(pdf_filepath)
+        with src as src:
+            num_pages = src.page_count
+            for start_page, end_page in fixed_spans(num_pages, chunk_size) if spans is None else spans:
+                with fitz.open() as out:
+                    out.insert_pdf(src, from_page=start_page, to_page=end_page - 1)
+                    chunks.append((start_page, end_page, out.tobytes(no_new_id=True)))
+        return num_pages, chunks
 
-    # Read PDF and determine number of pages
-    with open(pdf_filepath, 'rb') as pdf_file:
-        reader = PyPDF2.PdfReader(pdf_file)
+    # One reader for the whole file; each chunk is copied from it into its own writer
+    with BytesIO(data) if data is not None else open(pdf_filepath, 'rb') as pdf_file:
+        reader = pypdf.PdfReader(pdf_file)
         num_pages = len(reader.pages)
-    print(f"[INFO] PDF has {num_pages} pages.")
-
-    chunk_size = 20
-    csv_chunks = []
-
-    # loop over the PDF, 20 pages at a time
-    for start_page in range(0, num_pages, chunk_size):
-        end_page = min(start_page + chunk_size, num_pages)
-        print(f"[INFO] Processing pages {start_page+1} to {end_page}...")
-        
-        # Extract chunk pages and write to in-memory PDF
-        writer = PyPDF2.PdfWriter()
-        with open(pdf_filepath, 'rb') as pdf_file:
-            reader = PyPDF2.PdfReader(pdf_file)
+        chunks = []
+        for start_page, end_page in fixed_spans(num_pages, chunk_size) if spans is None else spans:
+            writer = pypdf.PdfWriter()
             for i in range(start_page, end_page):
                 writer.add_page(reader.pages[i])
-            from io import BytesIO
             chunk_pdf_bytes = BytesIO()
             writer.write(chunk_pdf_bytes)
-            chunk_pdf_bytes.seek(0)
-            chunk_pdf_data = chunk_pdf_bytes.read()
-
-        # LLM extraction for this chunk
-        success = False
-        attempt = 0
-        while not success:
-            attempt += 1
+            chunks.append((start_page, end_page, chunk_pdf_bytes.getvalue()))
+    return num_pages, chunks
+
+
+def open_extract(pdf_filepath):
+    """
+    Read an EB extract from disk once. Returns (data, sha256, doc): the file's
+    bytes, their sha256 (for the spool key) and a PyMuPDF document over them
+    (None if PyMuPDF cannot open it), which the text layer reading, chunk planning
+    and chunk preparation all share. The caller closes doc.
+    """
+    import fitz
+    data = Path(pdf_filepath).read_bytes()
+    try:
+        doc = fitz.open(stream=data, filetype="pdf")
+    except Exception as e:
+        print(f"[WARN] PyMuPDF cannot open {Path(pdf_filepath).name} ({e}).")
+        doc = None
+    return data, hashlib.sha256(data).hexdigest(), doc
+
+
+_prompt_templates = {}
+
+def load_prompt_template(path="./prompt_template.txt"):
+    """Read the prompt template once per run."""
+    if path not in _prompt_templates:
+        with open(path, 'r') as f:
+            _prompt_templates[path] = f.read()
+        print(f"[DEBUG] Loaded prompt template from {path}")
+    return _prompt_templates[path]
+
+
+def prepare_pdf_chunks(pdf_filepath, chunk_size=CHUNK_SIZE, memo=None, spans=None, data=None, doc=None):
+    """
+    Split a PDF into chunk PDFs (chunk_size pages each, or the given spans) with
+    the fastest PDF library known to work on it, from `data` / `doc` if given
+    (see open_extract). Returns (num_pages, [(start_page, end_page, bytes)], parser);
+    the same parser should split a chunk further (split_pdf_bytes).
+    """
+    parsers = memo.order(pdf_filepath, CHUNK_PARSERS, "chunk") if memo else CHUNK_PARSERS
+    for i, parser in enumerate(parsers):
+        t0 = time.perf_counter()
+        try:
+            num_pages, chunks = _prepare_chunks(pdf_filepath, chunk_size, parser, spans, data, doc)
+        except Exception as e:
+            if memo:
+                memo.record(pdf_filepath, parser, "chunk", ok=False, error=f"{type(e).__name__}: {e}")
+            if i == len(parsers) - 1:
+                raise
+            print(f"[WARN] {parser} failed to split {pdf_filepath.name}: {e}; trying next parser.")
+            continue
+        if memo:
+            memo.record(pdf_filepath, parser, "chunk", ok=True,
+                        pages=num_pages, seconds=time.perf_counter() - t0)
+        break
+    print(f"[INFO] {pdf_filepath.name}: PDF has {num_pages} pages, {len(chunks)} chunks (split with {parser}).")
+    return num_pages, chunks, parser
+
+
+def plan_chunks(pdf_filepath, chunk_pages=0, max_chunk_pages=40, output_tokens=20000, local_pages=(),
+                doc=None):
+    """
+    Estimate rows per page from the text layer (of `doc`, an open PyMuPDF document
+    of the file, if given) and choose chunk spans: fixed
+    chunk_pages-page chunks if chunk_pages > 0, else adaptive (see eb_chunking.py).
+    Pages in local_pages (already read by read_local_chunks) are left out, and no
+    chunk spans across them.
+    Returns (page_rows, spans); spans is None for fixed chunks of the whole file.
+    page_rows is None if the text layer cannot be read.
+    """
+    try:
+        page_rows = estimate_page_rows(pdf_filepath if doc is None else doc)
+    except Exception as e:
+        print(f"[WARN] Cannot read the text layer of {Path(pdf_filepath).name} ({e}); "
+              f"using {chunk_pages or CHUNK_SIZE}-page chunks.")
+        return None, None
+    if chunk_pages > 0 and not local_pages:
+        return page_rows, None
+    spans = []
+    for start, end in page_runs(set(range(len(page_rows))) - set(local_pages)):
+        if chunk_pages > 0:
+            run = fixed_spans(end - start, chunk_pages)
+        else:
+            run = plan_spans(page_rows[start:end], max_chunk_pages, output_tokens)
+        spans += [(start + a, start + b) for a, b in run]
+    return page_rows, spans
+
+
+def read_local_chunks(pdf_filepath, doc=None):
+    """
+    Read the EB table from the PDF's text layer (see local_eb_table.py; from `doc`,
+    an open PyMuPDF document of the file, if given) and return
+    [(start_page, end_page, csv_text)] for each run of pages read completely; the
+    remaining pages are left for Gemini.
+    """
+    name = Path(pdf_filepath).name
+    try:
+        ok, failed = local_eb_table.extract_pages(pdf_filepath if doc is None else doc)
+    except Exception as e:
+        print(f"[WARN] Cannot read {name} locally ({e}); sending every page to Gemini.")
+        return []
+    print(f"[INFO] {name}: {len(ok)} of {len(ok) + len(failed)} pages read from the text layer, "
+          f"{len(failed)} left for Gemini.")
+    return [(start, end, local_eb_table.rows_to_csv([row for p in range(start, end) for row in ok[p]]))
+            for start, end in page_runs(ok)]
+
+
+def _finish_reason(response):
+    """Name of the first candidate's finish reason ("STOP", "MAX_TOKENS", ...), or None."""
+    candidates = getattr(response, "candidates", None) or []
+    reason = getattr(candidates[0], "finish_reason", None) if candidates else None
+    return getattr(reason, "name", reason)
+
+
+def _clean_csv(csv_text):
+    """Strip the markdown code fence around a CSV response."""
+    csv_text = re.sub(r'```csv\n', '', csv_text)
+    csv_text = re.sub(r'```', '', csv_text)
+    return csv_text
+
+
+def _stream_response(contents, config, sink, received, stats, t0, timeout=None):
+    """
+    Stream a response, appending each complete CSV line (code fences dropped) to
+    `sink` as it arrives and the raw text to `received`. Sets
+    stats["first_row_seconds"] when the first row after the header arrives.
+    Raises TimeoutError once the stream has run `timeout` seconds since t0 (the
+    HTTP timeout only bounds each read, not a response that keeps trickling in).
+    Returns the last streamed piece, which carries the usage and finish reason.
+    """
+    tail, n_lines, last = "", 0, None
+    for piece in get_client().models.generate_content_stream(model=GEMINI_MODEL, contents=contents,
+                                                              config=config):
+        if timeout and time.perf_counter() - t0 > timeout:
+            raise TimeoutError(f"stream still running after {timeout:g} seconds")
+        last = piece
+        text = piece.text or ""
+        received.append(text)
+        *lines, tail = (tail + text).split("\n")
+        for line in lines:
+            if line.lstrip().startswith("```"):
+                continue
+            n_lines += 1
+            if n_lines == 2:
+                stats["first_row_seconds"] = time.perf_counter() - t0
+            if sink:
+                sink.write(line + "\n")
+        if sink and lines:
+            sink.flush()
+    return last
+
+
+def request_chunk(chunk_pdf_data, prompt_template, label, limiter=None, n_pages=CHUNK_SIZE,
+                  cache=None, refresh=False, stats=None, policy=None, stream=None, sink=None,
+                  prompt_cache=None):
+    """
+    Send one chunk PDF to Gemini and return its cleaned CSV text. Failed attempts
+    are retried as the RetryPolicy decides (a default one if none is given), which
+    raises once the error is permanent or the chunk's attempts are used up; each
+    attempt first waits for room under the rate limiter. With a
+    ResponseCache, a cached response is returned without a request (unless
+    refresh) and every received response is stored. If a `stats` dict is given,
+    it is filled with cached, attempts, seconds, prompt_tokens, output_tokens,
+    truncated (the response stopped at the output token limit), cache_key and
+    first_row_seconds.
+    If `stream` is set, the response is streamed (each attempt abandoned once it
+    has run `stream` seconds) and its complete lines are written to `sink` as they
+    arrive; if the last allowed attempt fails after rows were received, those
+    rows are returned as a truncated response instead of raising.
+    With a PromptCache whose handle() names a cached copy of the prompt, only the
+    PDF is sent and the request references the cache; every response is
+    recorded with it (hit rate, input tokens served from cache).
+    Safe to call from several threads at once.
+    """
+    stats = {} if stats is None else stats
+    stats.update(cached=False, attempts=0, seconds=0.0, prompt_tokens=None, output_tokens=None,
+                 truncated=False, cache_key=None, first_row_seconds=None)
+    if cache:
+        key = stats["cache_key"] = cache.key(chunk_pdf_data, prompt_template, GEMINI_MODEL, GENERATION_CONFIG)
+        hit = None if refresh else cache.get(key)
+        if hit is not None:
+            print(f"[INFO] Cached response for {label}.")
+            stats.update(cached=True, prompt_tokens=hit["prompt_tokens"], output_tokens=hit["output_tokens"],
+                         truncated=hit["finish_reason"] == "MAX_TOKENS")
+            return _clean_csv(hit["text"])
+
+    pdf_part = types.Part.from_bytes(
+        data=chunk_pdf_data,
+        mime_type='application/pdf',
+    )
+    est_tokens = n_pages * PDF_TOKENS_PER_PAGE + len(prompt_template) // 4
+    policy = policy or RetryPolicy()
+    t0 = time.perf_counter()
+    success = partial = False
+    attempt = 0
+    stale_handle = None
+    while not success:
+        attempt += 1
+        stats["attempts"] = attempt
+        policy.before_attempt()
+        if limiter:
+            limiter.acquire(est_tokens)
+        received = []
+        # With a cached prompt only the PDF is sent; the cached prompt precedes it
+        handle = prompt_cache.handle() if prompt_cache else None
+        contents = [pdf_part] if handle else [pdf_part, prompt_template]
+        config = types.GenerateContentConfig(
+            temperature=GENERATION_CONFIG["temperature"],
+            thinking_config=types.ThinkingConfig(
+                thinking_budget=GENERATION_CONFIG["thinking_budget"]),
+            cached_content=handle,
+            http_options=types.HttpOptions(timeout=int(stream * 1000)) if stream else None)
+        try:
+            print(f"[INFO] Sending request to Gemini LLM (attempt {attempt}) for {label}...")
+            if stream:
+                if sink:
+                    sink.seek(0)
+                    sink.truncate()
+                response = _stream_response(contents, config, sink, received, stats, time.perf_counter(),
+                                            stream)
+                text = "".join(received)
+            else:
+                response = get_client().models.generate_content(
+                    model=GEMINI_MODEL, contents=contents, config=config)
+                text = response.text
+            print(f"[INFO] Received response from Gemini LLM for {label}.")
+            policy.on_success()
+            if prompt_cache:
+                prompt_cache.record(getattr(response, "usage_metadata", None), handle)
+            success = True
+        except Exception as e:
+            print(f"[ERROR] Error generating content from Gemini LLM for {label}: {e}")
+            stats["seconds"] = time.perf_counter() - t0
+            if handle and handle != stale_handle and cache_missing(e, handle):
+                # The cached prompt expired or was deleted: upload it again and retry once
+                print(f"[WARN] {label}: cached prompt {handle} rejected; uploading it again.")
+                prompt_cache.invalidate(handle)
+                stale_handle = handle
+                continue
             try:
-                print(f"[INFO] Sending request to Gemini LLM (attempt {attempt}) for chunk {start_page+1}-{end_page}...")
-                response = client.models.generate_content(
-                    model="gemini-2.5-flash",
-                    contents=[
-                        types.Part.from_bytes(
-                            data=chunk_pdf_data,
-                            mime_type='application/pdf',
-                        ),
-                        prompt_template,
-                    ],
-                    config=types.GenerateContentConfig(
-                        temperature=0,
-                        thinking_config=types.ThinkingConfig(thinking_budget=-1))
-                )
-                print("[INFO] Received response from Gemini LLM.")
-                success = True
-            except Exception as e:
-                print(f"[ERROR] Error generating content from Gemini LLM: {e}")
-                print("[INFO] Retrying in 30 seconds...")
-                time.sleep(30)
-
-        # Extract CSV from markdown block in response
-        csv_text = response.text
-        print("[DEBUG] Raw response text received for chunk.")
-        
-        # Clean up the CSV text to remove any markdown formatting
-        csv_text = re.sub(r'```csv\n', '', csv_text)
-        csv_text = re.sub(r'```', '', csv_text)
-        print("[DEBUG] Cleaned CSV text for chunk.")
-        csv_chunks.append(csv_text)
-
-    # Combine all CSV chunks
-    print("[INFO] Combining CSV chunks...")
-    
-    # Use pandas to concatenate, handling headers only once
-    dfs = []
+                delay = policy.on_error(e, attempt, label)
+            except RetryBudgetExceeded:
+                # Keep the complete lines a stream delivered before it failed
+                kept = _clean_csv("".join(received))
+                kept = kept[:kept.rfind("\n") + 1]
+                n_kept = sum(1 for line in kept.splitlines() if line.strip()) - 1
+                if n_kept < 1:
+                    raise
+                print(f"[WARN] {label}: keeping the {n_kept} rows received before the stream failed.")
+                text, response, partial = kept, None, True
+                break
+            print(f"[INFO] Retrying {label} in {delay:.0f} seconds...")
+            time.sleep(delay)
+    usage = getattr(response, "usage_metadata", None)
+    finish_reason = _finish_reason(response)
+    stats.update(seconds=time.perf_counter() - t0,
+                 prompt_tokens=getattr(usage, "prompt_token_count", None),
+                 output_tokens=getattr(usage, "candidates_token_count", None),
+                 truncated=partial or finish_reason == "MAX_TOKENS")
+    if limiter:
+        limiter.settle(est_tokens, getattr(usage, "prompt_token_count", None))
+    if cache and not partial:
+        cache.put(key, GEMINI_MODEL, text,
+                  prompt_tokens=getattr(usage, "prompt_token_count", None),
+                  output_tokens=getattr(usage, "candidates_token_count", None),
+                  total_tokens=getattr(usage, "total_token_count", None), finish_reason=finish_reason)
+
+    # Extract CSV from markdown block in response
+    return _clean_csv(text)
+
+
+def combine_csv_chunks(csv_chunks):
+    """
+    Concatenate the chunk CSVs (in chunk order) into one CSV string, line by line
+    like ChunkSpool.write_combined: every chunk carries the same schema header, so the
+    first is kept and the others skipped, and cell text is left exactly as parsed.
+    """
+    lines = []
     for i, chunk in enumerate(csv_chunks):
-        buff = StringIO(chunk)
+        header, *rows = chunk.splitlines()
         if i == 0:
-            df = pd.read_csv(buff)
-        else:
-            df = pd.read_csv(buff, header=0)
-        dfs.append(df)
-    combined_df = pd.concat(dfs, ignore_index=True)
-    
-    # Convert back to CSV string
-    final_csv = combined_df.to_csv(index=False)
-    print("[INFO] Combined CSV ready.")
-    return final_csv
+            lines.append(header)
+        lines.extend(line for line in rows if line.strip())
+    return "\n".join(lines) + "\n"
+
+
+def request_span(chunk_pdf_data, start, end, page_rows, prompt_template, name, limiter=None,
+                 cache=None, refresh=False, policy=None, totals=None, min_row_ratio=0.5,
+                 stream=None, spool=None, min_salvage_rate=0.9, prompt_cache=None, parser="pypdf"):
+    """
+    Request the chunk of pages [start, end) and return its CSV text, read with
+    csv_salvage.salvage_csv: malformed lines are repaired or quarantined, and only
+    a response with fewer than min_salvage_rate of its rows readable is requested
+    again (once; if it is still below, the chunk fails). If the response
+    was cut off at the output limit, or has far fewer rows than page_rows (rows per
+    page from the text layer, or None) suggests, the chunk is split in half and
+    both halves requested (recursively, down to single pages). Attempts, seconds,
+    tokens, splits and the first time to first row are added to `totals`, and so
+    are the salvaged/dropped rows (and the dropped lines, as rejects) of the
+    responses kept, not of those split. With `stream` and a ChunkSpool, the
+    response's lines are appended to the span's .part file as they arrive.
+    prompt_cache is passed on to request_chunk; parser is the PDF library that
+    prepared the chunk, used to split it.
+    """
+    totals = {} if totals is None else totals
+    label = f"{name} pages {start+1}-{end}"
+
+    def send(refresh):
+        stats = {}
+        sink = spool.open_part(start, end) if stream and spool else None
+        try:
+            csv_text = request_chunk(chunk_pdf_data, prompt_template, label, limiter, end - start,
+                                     cache, refresh, stats, policy, stream, sink, prompt_cache)
+        finally:
+            if sink:
+                sink.close()
+            for k in ("attempts", "seconds", "prompt_tokens", "output_tokens"):
+                totals[k] = (totals.get(k) or 0) + (stats.get(k) or 0)
+            totals["cached"] = totals.get("cached", True) and stats.get("cached", False)
+            if totals.get("first_row_seconds") is None:
+                totals["first_row_seconds"] = stats.get("first_row_seconds")
+        csv_text, report = salvage_csv(csv_text)
+        if not stats["truncated"] and report["rate"] < min_salvage_rate and cache and stats.get("cache_key"):
+            # A mostly unreadable response is not kept in the cache, so it is asked for again
+            cache.forget(stats["cache_key"])
+        return csv_text, report, stats
+
+    csv_text, report, stats = send(refresh)
+    if not stats["truncated"] and report["rate"] < min_salvage_rate:
+        print(f"[WARN] {label}: only {report['rows']} of {report['rows'] + report['dropped']} rows "
+              f"readable; requesting it again.")
+        csv_text, report, stats = send(True)
+        if not stats["truncated"] and report["rate"] < min_salvage_rate:
+            raise ValueError(f"{label}: only {report['rows']} of {report['rows'] + report['dropped']} "
+                             f"rows readable, twice")
+    if stream and spool:
+        # This span's response is final (kept or about to be split): its .part is no longer needed
+        spool.drop_part(start, end)
+
+    def keep():
+        # Salvage counts and rejects are those of the rows kept, not of a response split away
+        if report["salvaged"] or report["dropped"]:
+            print(f"[INFO] {label}: {report['salvaged']} rows repaired, {report['dropped']} quarantined.")
+        totals["salvaged"] = totals.get("salvaged", 0) + report["salvaged"]
+        totals["dropped"] = totals.get("dropped", 0) + report["dropped"]
+        totals.setdefault("rejects", []).extend((start, end, line, why) for line, why in report["rejects"])
+        return csv_text
+
+    n_rows = None if stats["truncated"] else report["rows"]
+    rows = page_rows[start:end] if page_rows else [None] * (end - start)
+    reason = needs_split(stats["truncated"], n_rows, rows, min_row_ratio)
+    if reason is None:
+        return keep()
+    if end - start == 1:
+        print(f"[WARN] {label}: {reason}, and a single page cannot be split further; keeping it.")
+        return keep()
+
+    mid = start + (end - start) // 2
+    print(f"[WARN] {label}: {reason}; splitting into pages {start+1}-{mid} and {mid+1}-{end}.")
+    totals["splits"] = totals.get("splits", 0) + 1
+    first, second = split_pdf_bytes(chunk_pdf_data, mid - start, parser)
+    return combine_csv_chunks([
+        request_span(first, start, mid, page_rows, prompt_template, name, limiter, cache, refresh,
+                     policy, totals, min_row_ratio, stream, spool, min_salvage_rate, prompt_cache, parser),
+        request_span(second, mid, end, page_rows, prompt_template, name, limiter, cache, refresh,
+                     policy, totals, min_row_ratio, stream, spool, min_salvage_rate, prompt_cache, parser)])
+
+
+def spool_key(pdf_sha256, prompt_template, local_tables=False):
+    """Everything that determines a file's chunk CSVs; spooled chunks from another key are discarded."""
+    parts = [pdf_sha256, GEMINI_MODEL, GENERATION_CONFIG,
+             hashlib.sha256(prompt_template.encode("utf-8")).hexdigest()]
+    if local_tables:
+        parts.append(f"local_eb_table {local_eb_table.VERSION}")
+    return hashlib.sha256(json.dumps(parts, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def fetch_chunk(state, pdf_file, spool, start, end, chunk_pdf_data, page_rows, prompt_template,
+                limiter, cache, refresh, policy, min_row_ratio, stream=None, min_salvage_rate=0.9,
+                prompt_cache=None, parser="pypdf"):
+    """
+    Request one chunk (split further if needed), spool its CSV once it parses and
+    record the outcome, with its salvaged and quarantined rows (worker thread).
+    Returns the request totals (splits, first_row_seconds, salvaged, dropped, ...).
+    """
+    totals = {}
+    try:
+        csv_text = request_span(chunk_pdf_data, start, end, page_rows, prompt_template, pdf_file,
+                                limiter, cache, refresh, policy, totals, min_row_ratio, stream, spool,
+                                min_salvage_rate, prompt_cache, parser)
+        spool.save(start, end, csv_text)
+    except Exception as e:
+        state.record_chunk(pdf_file, start, end, "failed", totals.get("attempts", 0), totals.get("seconds"),
+                           totals.get("prompt_tokens"), totals.get("output_tokens"),
+                           error=f"{type(e).__name__}: {str(e).strip()}",
+                           first_row_seconds=totals.get("first_row_seconds"))
+        raise
+    state.record_chunk(pdf_file, start, end, "cached" if totals["cached"] else "done",
+                       totals["attempts"], totals["seconds"], totals["prompt_tokens"] or None,
+                       totals["output_tokens"] or None, first_row_seconds=totals["first_row_seconds"],
+                       salvaged=totals["salvaged"], dropped=totals["dropped"], rejects=totals["rejects"])
+    return totals
 
 
 def main():
@@ -159,12 +581,70 @@ def main():
     # folder containing csv to scan
     p.add_argument("--pdf_root", required=True)
 
+    # concurrency and API quota
+    p.add_argument("--workers", type=int, default=1,
+                   help="Chunk requests in flight at once, across files (1 = serial).")
+    p.add_argument("--rpm", type=float, default=0,
+                   help="Requests-per-minute limit shared by all workers (0 = unlimited).")
+    p.add_argument("--tpm", type=float, default=0,
+                   help="Input tokens-per-minute limit shared by all workers (0 = unlimited).")
+
+    # chunking
+    p.add_argument("--chunk_pages", type=int, default=0,
+                   help="Fixed pages per chunk; 0 (default) sizes chunks from the text layer.")
+    p.add_argument("--max_chunk_pages", type=int, default=40, help="Most pages in an adaptive chunk.")
+    p.add_argument("--chunk_output_tokens", type=int, default=20000,
+                   help="Expected CSV output per adaptive chunk, in tokens (kept well under the model's limit).")
+    p.add_argument("--min_row_ratio", type=float, default=0.5,
+                   help="Split and re-request a chunk returning fewer rows than this share of the text layer's estimate.")
+    p.add_argument("--min_salvage_rate", type=float, default=0.9,
+                   help="Re-request a chunk once if fewer than this share of its CSV lines can be read or repaired.")
+    p.add_argument("--local_tables", type=int, default=1, choices=[0, 1],
+                   help="1: read pages whose EB table validates from the text layer and send only the rest to Gemini.")
+
+    # retries
+    p.add_argument("--max_attempts", type=int, default=6,
+                   help="Attempts per chunk before it is given up (its file is retried on the next run).")
+    p.add_argument("--backoff_base", type=float, default=2.0,
+                   help="Seconds of the first retry backoff; doubles per attempt, with full jitter.")
+    p.add_argument("--backoff_cap", type=float, default=300.0,
+                   help="Longest backoff between attempts, unless the server asks for longer.")
+    p.add_argument("--breaker_errors", type=int, default=5,
+                   help="Quota errors in a row (across workers) that pause all requests (0 = never).")
+    p.add_argument("--breaker_pause", type=float, default=60.0,
+                   help="Seconds all requests pause once the breaker opens (or the server's hint, if longer).")
+
+    # response cache
+    p.add_argument("--cache_mode", choices=["use", "refresh", "off"], default="use",
+                   help="use: reuse cached responses; refresh: re-request and overwrite; off: bypass the cache.")
+    p.add_argument("--cache_mb", type=int, default=1024,
+                   help="Size cap of the response cache (least-recently-used responses are evicted).")
+
+    # prompt caching
+    p.add_argument("--prompt_cache", choices=["gemini", "off"], default="gemini",
+                   help="gemini: upload the prompt once as cached content (if it is long enough to cache); "
+                        "off: send it with every request.")
+
+    # streaming
+    p.add_argument("--stream", type=int, default=0, choices=[0, 1],
+                   help="1: stream responses, appending CSV lines to the chunk spool as they arrive.")
+    p.add_argument("--stream_timeout", type=float, default=600.0,
+                   help="With --stream 1, seconds a streamed request may take before it counts as hung and is retried.")
+
+    # extraction state
+    p.add_argument("--state_db", default="extract_state.sqlite",
+                   help="SQLite file with per-file and per-chunk extraction status.")
+    p.add_argument("--export_status", default="",
+                   help="Also write the full per-file status table (attempts, seconds, tokens, error) to this CSV.")
+
     # --- handle Stata passing a single-argument blob ---
     argv = sys.argv[1:]
     if len(argv) == 1 and ("--" in argv[0] or " " in argv[0]):
         argv = shlex.split(argv[0])
 
     args = p.parse_args(argv)
+    args.workers = max(1, args.workers)
+    stream = args.stream_timeout if args.stream else None
 
 
     pdf_dir = Path(args.pdf_root)
@@ -181,69 +661,189 @@ def main():
     if not pdf_files:
         print("[WARN] No PDF files found in the input directory.")
         return
-    
-    # Iterate through each PDF file and extract tables
+
+    # Parser choice per file, shared with find_eb_pages.py / extract_handbook_pages.py
+    memo = ParserMemo(pdf_dir / "pdf_parser_memo.json", pdf_dir)
+
+    # Extraction state; extract_log.csv is imported if it was edited since the last export
+    log_file_path = "extract_log.csv"
+    state = ExtractState(args.state_db)
+    n_imported = state.import_log(log_file_path)
+    if n_imported:
+        print(f"[INFO] Imported {n_imported} rows from {log_file_path} into {args.state_db}")
+
+    # Files to (re)extract, in directory order; unseen files are added with recreate_flag 1
+    todo = []
     for pdf_file in pdf_files:
+        if not state.needs_extract(pdf_file, f"{os.path.splitext(pdf_file)[0]}.csv"):
+            print(f"[INFO] Skipping {pdf_file} (already processed, recreate_flag=0).")
+            continue
+        todo.append(pdf_file)
+    print(f"[INFO] {len(todo)} of {len(pdf_files)} files to extract.")
+    print(f"[MODE] workers={args.workers} rpm={args.rpm or 'unlimited'} tpm={args.tpm or 'unlimited'} "
+          f"cache={args.cache_mode} chunks={args.chunk_pages or 'adaptive'} local_tables={args.local_tables} "
+          f"stream={args.stream} prompt_cache={args.prompt_cache}")
 
-        # Open extract_log.csv file 
-        log_file_path = "extract_log.csv"
-        log_file = pd.read_csv(log_file_path)
-        print(f"[INFO] Loaded log file: {log_file_path}")
-
-        print(f"\n[INFO] Processing file: {pdf_file}, number {pdf_files.index(pdf_file) + 1} of {len(pdf_files)}")
-        
-        # Skip file if already processed and recreate_flag is 0
-        if pdf_file in log_file['input_pdf_name'].values:
-            recreate_flag = log_file.loc[log_file['input_pdf_name'] == pdf_file, 'recreate_flag'].values[0]
-            if recreate_flag == 0:
-                print(f"[INFO] Skipping {pdf_file} (already processed, recreate_flag=0).")
-                continue
-        else:
-            
-            # Add new entry to log file with recreate_flag set to 1
-            new_log_entry = pd.DataFrame({
-                'input_pdf_name': [pdf_file],
-                'output_csv_name': [f"{os.path.splitext(pdf_file)[0]}.csv"],
-                'error_flag': [0],
-                'recreate_flag': [1]
-            })
-            log_file = pd.concat([log_file, new_log_entry], ignore_index=True)
-            print(f"[INFO] Added {pdf_file} to log file.")
-        
-        # Load the PDF file
-        pdf_path = os.path.join(input_dir, pdf_file)
+    limiter = RateLimiter(args.rpm, args.tpm)
+    policy = RetryPolicy(args.max_attempts, args.backoff_base, args.backoff_cap,
+                         args.breaker_errors, args.breaker_pause)
+    cache = None
+    if args.cache_mode != "off":
+        cache = ResponseCache(pdf_dir / ".gemini_response_cache.sqlite", args.cache_mb * 1024 * 1024)
+    refresh = args.cache_mode == "refresh"
+    prompt_template = load_prompt_template()
+    if args.prompt_cache == "gemini":
+        prompt_cache = GeminiPromptCache(get_client, GEMINI_MODEL, prompt_template)
+    else:
+        prompt_cache = PromptCache()
+
+    spool_root = Path(output_dir) / ".chunks"
+
+    def finish(pdf_file, spool, futures, t_file):
+        """Assemble a file's spooled chunks in order, save its CSV and record the outcome (main thread)."""
         output_csv_name = f"{os.path.splitext(pdf_file)[0]}.csv"
         output_csv_path = os.path.join(output_dir, output_csv_name)
-
+        error = None
         try:
-            # Extract tables from the PDF file
-            csv_text = extract_pdf_tables(pdf_path, output_dir)
-            print(f"[INFO] Extracted CSV text for {pdf_file}.")
-
-            # Convert string to file-like object
-            buff = StringIO(csv_text)
-            
-            # Read as DataFrame
-            df = pd.read_csv(buff)
-            print(f"[INFO] Parsed CSV text into DataFrame for {pdf_file}.")
-
-            # Save DataFrame to CSV
-            df.to_csv(output_csv_path, index=False)
+            for f in futures:
+                f.result()
+            # Chunks were each parsed when they arrived (streamed or not); append them
+            # line by line, so the CSV does not depend on --stream
+            spool.write_combined(output_csv_path)
             print(f"[SUCCESS] Saved extracted tables to {output_csv_name}.")
-            
-            # Update the log file with success
-            log_file.loc[log_file['input_pdf_name'] == pdf_file, 'error_flag'] = 0
-            log_file.loc[log_file['input_pdf_name'] == pdf_file, 'recreate_flag'] = 0
-            
+            spool.clear()
+            ok = True
         except Exception as e:
-            print(f"[ERROR] Error extracting tables from {pdf_file}: {e}")
-            # Update the log file with error
-            log_file.loc[log_file['input_pdf_name'] == pdf_file, 'error_flag'] = 1
-            log_file.loc[log_file['input_pdf_name'] == pdf_file, 'recreate_flag'] = 1
+            error = f"{type(e).__name__}: {str(e).strip()}"
+            n_spooled = len(spool.spans) - len(spool.missing())
+            print(f"[ERROR] Error extracting tables from {pdf_file}: {str(e).strip()} "
+                  f"({n_spooled} of {len(spool.spans)} chunks kept for the next run)")
+            ok = False
+
+        state.finish_file(pdf_file, ok, len(spool.spans), time.perf_counter() - t_file, error)
+        memo.save()
+        return ok
 
-        # Save the updated log file
-        log_file.to_csv(log_file_path, index=False)
+    # Chunks of all pending files share one pool. Files are split and queued in
+    # order, keeping about two chunks per worker queued so chunk PDFs of the
+    # whole series are never held in memory at once.
+    t_start = time.perf_counter()
+    n_ok = n_failed = n_requests = n_resumed = n_splits = n_salvaged = n_dropped = 0
+    n_local_pages = n_llm_pages = 0
+    first_rows = []                                 # seconds to the first row of each streamed chunk
+    queue_depth = 2 * args.workers
+    remaining = iter(enumerate(todo, 1))
+    active = {}                                     # pdf_file -> (spool, futures of its missing chunks, t0)
+    try:
+        with ThreadPoolExecutor(max_workers=args.workers) as pool:
+            while True:
+                in_flight = sum(not f.done() for _, fs, _ in active.values() for f in fs)
+                while in_flight < queue_depth:
+                    nxt = next(remaining, None)
+                    if nxt is None:
+                        break
+                    n, pdf_file = nxt
+                    print(f"\n[INFO] Processing file: {pdf_file}, number {n} of {len(todo)}")
+                    pdf_path = Path(input_dir) / pdf_file
+                    if not state.claim(pdf_file):
+                        print(f"[INFO] Skipping {pdf_file} (being extracted or already finished by another run).")
+                        continue
+                    t_file = time.perf_counter()
+                    doc = None
+                    try:
+                        # One read and one open of the extract for the text layer, planning and chunks
+                        data, sha, doc = open_extract(pdf_path)
+                        local = read_local_chunks(pdf_path, doc) if args.local_tables and doc else []
+                        page_rows, spans = plan_chunks(pdf_path, args.chunk_pages, args.max_chunk_pages,
+                                                       args.chunk_output_tokens,
+                                                       {p for s, e, _ in local for p in range(s, e)}, doc)
+                        num_pages, chunks, parser = prepare_pdf_chunks(pdf_path, args.chunk_pages or CHUNK_SIZE,
+                                                                       memo, spans, data, doc)
+                        spool = ChunkSpool(spool_root, pdf_file,
+                                           spool_key(sha, prompt_template, args.local_tables),
+                                           sorted((start, end) for start, end, _ in chunks + local))
+                        for start, end, csv_text in local:
+                            if not spool.has(start, end):
+                                spool.save(start, end, csv_text)
+                                state.record_chunk(pdf_file, start, end, "local")
+                    except Exception as e:
+                        print(f"[ERROR] Error extracting tables from {pdf_file}: {e}")
+                        state.finish_file(pdf_file, False, 0, time.perf_counter() - t_file,
+                                          f"{type(e).__name__}: {e}")
+                        n_failed += 1
+                        continue
+                    finally:
+                        if doc is not None:
+                            doc.close()
+                    missing = [(start, end, data) for start, end, data in chunks if not spool.has(start, end)]
+                    if len(missing) < len(chunks):
+                        print(f"[INFO] Resuming {pdf_file}: {len(chunks) - len(missing)} of {len(chunks)} "
+                              f"chunks already spooled.")
+                    active[pdf_file] = (spool, [
+                        pool.submit(fetch_chunk, state, pdf_file, spool, start, end, data, page_rows,
+                                    prompt_template, limiter, cache, refresh, policy, args.min_row_ratio,
+                                    stream, args.min_salvage_rate, prompt_cache, parser)
+                        for start, end, data in missing], t_file)
+                    n_requests += len(missing)
+                    n_resumed += len(chunks) - len(missing)
+                    n_local_pages += sum(end - start for start, end, _ in local)
+                    n_llm_pages += sum(end - start for start, end, _ in chunks)
+                    in_flight += len(missing)
+
+                if not active:
+                    break
+                pending = [f for _, fs, _ in active.values() for f in fs if not f.done()]
+                if pending:
+                    wait(pending, return_when=FIRST_COMPLETED)
+                for pdf_file in [k for k, (_, fs, _) in active.items() if all(f.done() for f in fs)]:
+                    for f in active[pdf_file][1]:
+                        if f.exception() is None:
+                            n_splits += f.result().get("splits", 0)
+                            n_salvaged += f.result()["salvaged"]
+                            n_dropped += f.result()["dropped"]
+                            if f.result()["first_row_seconds"] is not None:
+                                first_rows.append(f.result()["first_row_seconds"])
+                    if finish(pdf_file, *active.pop(pdf_file)):
+                        n_ok += 1
+                    else:
+                        n_failed += 1
+    finally:
+        # extract_log.csv is written once, from the state store, even if the run is interrupted
+        state.release()
+        state.export_log(log_file_path, args.export_status or None)
         print(f"[INFO] Updated log file saved: {log_file_path}")
+        state.close()
+        prompt_cache.close()
+
+    wall = time.perf_counter() - t_start
+    print(f"\n[INFO] Extraction summary:")
+    print(f"  Files extracted:      {n_ok}")
+    print(f"  Files failed:         {n_failed}")
+    print(f"  Pages:                {n_local_pages} read from the text layer, {n_llm_pages} sent to Gemini")
+    print(f"  Chunks:               {n_requests} (+{n_resumed} resumed from spool), "
+          f"{n_splits} split after a truncated or short response")
+    print(f"  Salvaged rows:        {n_salvaged} repaired, {n_dropped} quarantined "
+          f"(in the rejects table of {args.state_db})")
+    print(f"  Wall time:            {wall:.1f}s")
+    if first_rows:
+        print(f"  Time to first row:    median {np.median(first_rows):.1f}s, max {max(first_rows):.1f}s "
+              f"over {len(first_rows)} streamed chunks")
+    print(f"  Rate-limit wait:      {limiter.waited:.1f}s (summed over workers)")
+    print(f"  Retries:              {policy.retries['retryable']} transient, {policy.retries['quota']} quota; "
+          f"breaker opened {policy.breaker_trips}x")
+    print(f"  Chunks given up:      {policy.failures['permanent']} permanent errors, "
+          f"{policy.failures['budget']} out of attempts")
+    if prompt_cache.requests:
+        print(f"  Prompt cache:         {prompt_cache.hits} of {prompt_cache.requests} requests "
+              f"({prompt_cache.hits / prompt_cache.requests:.0%}), "
+              f"{prompt_cache.tokens_saved:,} input tokens served from cache")
+    if cache:
+        dropped = cache.evict()
+        print(f"  Cached responses:     {cache.hits} of {n_requests} chunks, "
+              f"{cache.tokens_saved:,} tokens not re-billed")
+        if dropped:
+            print(f"  Cache evicted:        {dropped} least-recently-used responses (--cache_mb {args.cache_mb})")
+        cache.close()
 
 if __name__ == "__main__":
     main()
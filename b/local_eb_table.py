@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+INPUTS:
+  - ~/iec/pcXX/district_handbooks*/eb_table_extracts/*_EB.pdf
+OUTPUTS:
+  - none when imported; with --pdf, prints per-page results (and --csv writes the rows)
+
+local_eb_table.py
+
+Reads the 7-column EB table (location_code, town, ward, eb_no, total_pop, sc_pop,
+st_pop) straight from a PDF's text layer, so llm_csv_hb_extractor.py only sends
+pages it cannot read this way to Gemini.
+
+  - Words (PyMuPDF) are grouped into lines by baseline, and a line into cells
+    wherever the gap between words is wider than about one character height.
+  - Each line's cells go through process_xls_hb.extract_window, i.e. the same
+    window_matches rules used for the XLS handbooks (6+ digit location code,
+    ward starting with "Ward", eb_no containing "EB", counts that are numbers or
+    "-"). Lines that leave the location code, town and/or ward blank because they
+    repeat the row above are filled from that row before matching.
+  - A page is accepted only if it has at least one EB row, every table-like line
+    on it matched, sc_pop and st_pop never exceed total_pop, and it gave at least
+    as many rows as the text layer shows table rows (lines with
+    eb_chunking.MIN_NUMBERS_PER_ROW numbers, the estimate used to size LLM
+    chunks). A line is table-like if it has a location code or three or more
+    cells of digits, commas or dashes (the 1 2 3 4 5 6 7 column-number row is
+    skipped). Anything else (no text layer, a line that did not match, rows lost
+    to merged cells or wrapped names) returns the page to the LLM.
+
+Rows come out in the column names and format prompt_template.txt asks Gemini for
+(commas removed from numbers, "-" left empty, commas in names replaced by a
+space by clean_text, as csv_salvage.py does for the LLM's rows), so local and
+LLM chunks combine into one CSV.
+
+Example:
+  python local_eb_table.py --pdf ~/iec/pc11/district_handbooks/eb_table_extracts/DH_01_2011_JAM_EB.pdf
+"""
+
+from pathlib import Path
+from contextlib import nullcontext
+from itertools import combinations
+from io import StringIO
+import csv
+import re
+import sys
+import shlex
+import argparse
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from process_xls_hb import norm_cell, is_1234567_row, extract_window, window_matches, LOC_RE
+from eb_chunking import MIN_NUMBERS_PER_ROW, _NUMBER
+
+# Column names of the CSV Gemini returns (prompt_template.txt)
+COLUMNS = ["location_code", "town_name", "ward_name", "eb_no", "total_pop", "sc_pop", "st_pop"]
+
+# Bump when the extraction rules change, so spooled local chunks are redone
+VERSION = "2"
+
+MIN_NUMERIC_CELLS = 3
+_NUMERIC = re.compile(r"^[\d,-]+$")
+
+def _lines(page) -> list[list[tuple]]:
+    """Words of a page grouped into lines by baseline, each sorted left to right."""
+    words = sorted(page.get_text("words"), key=lambda w: (w[3], w[0]))
+    lines, current, base = [], [], None
+    for w in words:
+        height = w[3] - w[1]
+        if current and abs(w[3] - base) > 0.5 * height:
+            lines.append(sorted(current))
+            current = []
+        if not current:
+            base = w[3]
+        current.append(w)
+    if current:
+        lines.append(sorted(current))
+    return lines
+
+def _cells(line) -> list[str]:
+    """Join a line's words into cells, breaking wherever the gap exceeds ~one character height."""
+    heights = sorted(w[3] - w[1] for w in line)
+    gap = 0.9 * heights[len(heights) // 2]
+    cells, prev_x1 = [], None
+    for x0, y0, x1, y1, word, *_ in line:
+        if prev_x1 is not None and x0 - prev_x1 <= gap:
+            cells[-1] += " " + word
+        else:
+            cells.append(word)
+        prev_x1 = x1
+    return [norm_cell(c) for c in cells]
+
+def _fill_down(cells, prev):
+    """Try the row with its blank leading fields (location code, town, ward) taken from `prev`."""
+    for k in (1, 2, 3):
+        if len(cells) + k != 7:
+            continue
+        for missing in combinations((0, 1, 2), k):
+            row, it = [], iter(cells)
+            for i in range(7):
+                row.append(prev[i] if i in missing else next(it))
+            if window_matches(row):
+                return row
+    return None
+
+def _count(s: str):
+    s = s.replace(",", "").strip()
+    return int(s) if s.isdigit() else None
+
+def _consistent(row) -> bool:
+    tot, sc, st = (_count(v) for v in row[4:])
+    return tot is None or ((sc is None or sc <= tot) and (st is None or st <= tot))
+
+def _estimated_rows(lines) -> int:
+    """Table rows the text layer shows: lines with MIN_NUMBERS_PER_ROW numbers, column numbers aside."""
+    n = 0
+    for line in lines:
+        words = [w[4] for w in line]
+        if sum(1 for w in words if _NUMBER.match(w)) >= MIN_NUMBERS_PER_ROW and not is_1234567_row(words):
+            n += 1
+    return n
+
+def _table_like(cells) -> bool:
+    return (any(LOC_RE.match(c) for c in cells)
+            or sum(1 for c in cells if _NUMERIC.match(c)) >= MIN_NUMERIC_CELLS)
+
+def extract_page(page):
+    """
+    Return (rows, None) for a page whose EB table was read completely, or
+    (None, reason) if the page has to go to the LLM.
+    """
+    lines = _lines(page)
+    if not lines:
+        return None, "no text layer"
+    rows, bad = [], 0
+    for line in lines:
+        cells = _cells(line)
+        if is_1234567_row(cells):
+            continue
+        row = extract_window(cells)
+        if row is None and rows:
+            row = _fill_down(cells, rows[-1])
+        if row is None or not _consistent(row):
+            if _table_like(cells):
+                bad += 1
+            continue
+        rows.append(row)
+    if bad:
+        return None, f"{bad} table line(s) not read"
+    if not rows:
+        return None, "no EB rows"
+    expected = _estimated_rows(lines)
+    if len(rows) < expected:
+        return None, f"{len(rows)} rows read, {expected} in the text layer"
+    return rows, None
+
+def extract_pages(pdf):
+    """
+    Return ({page: rows} for pages read locally, {page: reason} for the rest), 0-based
+    pages. `pdf` is a path or an open PyMuPDF document.
+    """
+    import fitz
+    ok, failed = {}, {}
+    with nullcontext(pdf) if isinstance(pdf, fitz.Document) else fitz.open(pdf) as doc:
+        for i, page in enumerate(doc):
+            rows, reason = extract_page(page)
+            if rows is None:
+                failed[i] = reason
+            else:
+                ok[i] = rows
+    return ok, failed
+
+def clean_text(v: str) -> str:
+    """A name cell as both paths write it: commas (which the prompt asks Gemini to drop) become a space."""
+    return norm_cell(v.replace(",", " "))
+
+def _csv_value(i: int, v: str) -> str:
+    if i >= 4:
+        return "" if v.strip() == "-" else v.replace(",", "")
+    return clean_text(v)
+
+def rows_to_csv(rows) -> str:
+    """CSV text (with header) in the format Gemini returns."""
+    buf = StringIO()
+    w = csv.writer(buf, lineterminator="\n")
+    w.writerow(COLUMNS)
+    w.writerows([_csv_value(i, v) for i, v in enumerate(row)] for row in rows)
+    return buf.getvalue()
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser(description="Read EB tables from a PDF's text layer and report each page.")
+    p.add_argument("--pdf", required=True, help="An _EB.pdf extract.")
+    p.add_argument("--csv", default="", help="Write the rows of the pages read locally to this CSV.")
+
+    argv = sys.argv[1:]
+    if len(argv) == 1 and ("--" in argv[0] or " " in argv[0]):
+        argv = shlex.split(argv[0])
+    args = p.parse_args(argv)
+
+    ok, failed = extract_pages(args.pdf)
+    for page in sorted(set(ok) | set(failed)):
+        status = f"{len(ok[page])} rows" if page in ok else f"LLM ({failed[page]})"
+        print(f"  page {page + 1:4d}: {status}")
+    n = len(ok) + len(failed)
+    print(f"[INFO] {len(ok)} of {n} pages read locally, {sum(map(len, ok.values()))} rows; "
+          f"{len(failed)} pages left for the LLM")
+    if args.csv:
+        Path(args.csv).write_text(rows_to_csv([r for page in sorted(ok) for r in ok[page]]))
+        print(f"[INFO] Wrote {args.csv}")
@@ -0,0 +1,167 @@
+"""
+prompt_cache.py
+
+Sends the shared extraction prompt once per run instead of with every chunk, for
+llm_csv_hb_extractor.py.
+
+  - PromptCache is the interface: handle() returns the name of a cached copy of
+    the prompt to reference in a request (or None: send the prompt inline),
+    record(usage) counts a request and the input tokens the provider served
+    from its cache, invalidate(name) drops a handle the provider rejected, and
+    close() releases it at the end of the run. cache_missing(error) tells a
+    request that failed because its cached content is gone (expired or deleted,
+    so the handle should be invalidated) from any other error, which goes
+    through the retry policy as usual.
+  - GeminiPromptCache uploads the prompt as Gemini cached content (caches.create)
+    on first use and references it through GenerateContentConfig.cached_content;
+    the PDF is then the only content sent per request. The cache is recreated
+    shortly before its TTL runs out and deleted by close().
+  - LocalPromptCache is an in-process stand-in with the same interface for tests
+    (test_prompt_cache.py) with a fake client: it hands out "local/<sha>" names
+    (the prompt text is kept in LocalPromptCache.store, for the fake client to
+    resolve) and counts the prompt's estimated tokens as saved on every request
+    that used one. The real API does not know these names, so it is not offered
+    by --prompt_cache.
+
+Gemini only caches content of at least MIN_CACHE_TOKENS tokens (1,024 for 2.5
+Flash, 4,096 for 2.5 Pro). A shorter prompt is sent inline as before, with a
+warning; the summary then still reports the tokens Gemini served from its
+implicit cache (usage_metadata.cached_content_token_count), if any.
+
+  cache = GeminiPromptCache(get_client, GEMINI_MODEL, prompt)
+  name = cache.handle()
+  contents = [pdf_part] if name else [pdf_part, prompt]
+  response = client.models.generate_content(..., config={..., "cached_content": name})
+  cache.record(response.usage_metadata, name)
+
+Clients are used by duck typing, so this module does not import the SDK.
+"""
+
+import hashlib
+import threading
+import time
+
+# Smallest prompt (in tokens) Gemini accepts as cached content, per model
+MIN_CACHE_TOKENS = {"gemini-2.5-flash": 1024, "gemini-2.5-flash-lite": 1024, "gemini-2.5-pro": 4096}
+DEFAULT_MIN_CACHE_TOKENS = 4096
+
+def cache_missing(error: Exception, name: str = None) -> bool:
+    """True if a request failed because the cached content it referenced (`name`) no longer exists."""
+    code = getattr(error, "code", None)
+    status = str(getattr(error, "status", "") or "").upper()
+    message = str(error).lower()
+    return ((code == 404 or status == "NOT_FOUND")
+            and ("cachedcontent" in message or "cached content" in message
+                 or bool(name) and name.lower() in message))
+
+class PromptCache:
+    """Base class: never caches, but counts requests and provider-reported cached tokens."""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.hits = 0
+        self.tokens_saved = 0
+
+    def handle(self):
+        return None
+
+    def record(self, usage, name=None):
+        """Count one request; `usage` is the response's usage_metadata, `name` the handle it used."""
+        cached = getattr(usage, "cached_content_token_count", None) or 0
+        with self.lock:
+            self.requests += 1
+            if cached:
+                self.hits += 1
+                self.tokens_saved += cached
+
+    def invalidate(self, name):
+        pass
+
+    def close(self):
+        pass
+
+class GeminiPromptCache(PromptCache):
+    def __init__(self, get_client, model: str, prompt: str, ttl_secs: int = 3600,
+                 display_name: str = "eb-extract-prompt"):
+        super().__init__()
+        self.get_client = get_client
+        self.model = model
+        self.prompt = prompt
+        self.ttl_secs = ttl_secs
+        self.display_name = display_name
+        self.name = None
+        self.expires = 0.0
+        self.disabled = False
+
+    def _create(self):
+        client = self.get_client()
+        min_tokens = MIN_CACHE_TOKENS.get(self.model, DEFAULT_MIN_CACHE_TOKENS)
+        n_tokens = client.models.count_tokens(model=self.model, contents=self.prompt).total_tokens
+        if n_tokens < min_tokens:
+            print(f"[WARN] The prompt is {n_tokens} tokens, below the {min_tokens}-token minimum "
+                  f"for cached content on {self.model}; sending it with every request.")
+            self.disabled = True
+            return
+        cached = client.caches.create(model=self.model, config={
+            "contents": [self.prompt], "ttl": f"{self.ttl_secs}s", "display_name": self.display_name})
+        self.name = cached.name
+        self.expires = time.monotonic() + self.ttl_secs
+        print(f"[INFO] Uploaded the prompt ({n_tokens} tokens) as cached content {self.name}.")
+
+    def handle(self):
+        """The cached prompt's name, (re)created when missing or within 5 minutes of expiry."""
+        with self.lock:
+            if self.disabled:
+                return None
+            if self.name is None or time.monotonic() > self.expires - 300:
+                old, self.name = self.name, None
+                try:
+                    self._create()
+                except Exception as e:
+                    print(f"[WARN] Cannot cache the prompt ({type(e).__name__}: {str(e).strip()}); "
+                          f"sending it with every request.")
+                    self.disabled = True
+                if old:
+                    self._delete(old)
+            return self.name
+
+    def invalidate(self, name):
+        with self.lock:
+            if name and name == self.name:
+                self.name = None
+
+    def _delete(self, name):
+        try:
+            self.get_client().caches.delete(name=name)
+        except Exception as e:
+            print(f"[WARN] Cannot delete cached content {name}: {e}")
+
+    def close(self):
+        with self.lock:
+            if self.name:
+                self._delete(self.name)
+                self.name = None
+
+class LocalPromptCache(PromptCache):
+    store = {}
+
+    def __init__(self, prompt: str):
+        super().__init__()
+        self.prompt = prompt
+        self.name = f"local/{hashlib.sha256(prompt.encode('utf-8')).hexdigest()[:16]}"
+        self.prompt_tokens = len(prompt) // 4
+        LocalPromptCache.store[self.name] = prompt
+
+    def handle(self):
+        return self.name
+
+    def record(self, usage, name=None):
+        cached = getattr(usage, "cached_content_token_count", None) or (self.prompt_tokens if name else 0)
+        with self.lock:
+            self.requests += 1
+            if cached:
+                self.hits += 1
+                self.tokens_saved += cached
+
+    def close(self):
+        LocalPromptCache.store.pop(self.name, None)
@@ -0,0 +1,75 @@
+"""
+rate_limiter.py
+
+Thread-safe token buckets that keep concurrent Gemini requests in
+llm_csv_hb_extractor.py under the API's requests-per-minute and
+tokens-per-minute quotas.
+
+  limiter = RateLimiter(rpm=150, tpm=1_000_000)
+  limiter.acquire(tokens=5_400)    # blocks until one request and 5,400 tokens are free
+  ...
+  limiter.settle(estimated=5_400, actual=response.usage_metadata.prompt_token_count)
+
+A rate of 0 disables that bucket.
+"""
+
+import threading
+import time
+
+class TokenBucket:
+    """`rate_per_min` units per minute, refilled continuously, holding at most one minute's worth."""
+    def __init__(self, rate_per_min: float):
+        self.capacity = float(rate_per_min)
+        self.level = self.capacity
+        self.per_sec = self.capacity / 60.0
+        self.stamp = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self.stamp) * self.per_sec)
+        self.stamp = now
+
+    def try_take(self, n: float) -> float:
+        """Take n units if available and return 0; otherwise return the seconds to wait."""
+        n = min(n, self.capacity)   # a request larger than the bucket waits for a full bucket
+        with self.lock:
+            self._refill()
+            if self.level >= n:
+                self.level -= n
+                return 0.0
+            return (n - self.level) / self.per_sec
+
+    def give_back(self, n: float):
+        """Return (n > 0) or charge (n < 0) units after the fact; the level may go negative."""
+        with self.lock:
+            self._refill()
+            self.level = min(self.capacity, self.level + n)
+
+class RateLimiter:
+    """Requests-per-minute and tokens-per-minute buckets shared by all request threads."""
+    def __init__(self, rpm: float = 0, tpm: float = 0):
+        self.requests = TokenBucket(rpm) if rpm > 0 else None
+        self.tokens = TokenBucket(tpm) if tpm > 0 else None
+        self.waited = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens: int = 0):
+        """Block until one request and `tokens` input tokens fit under both limits."""
+        t0 = time.monotonic()
+        while True:
+            wait = self.requests.try_take(1) if self.requests else 0.0
+            if wait == 0.0 and self.tokens:
+                wait = self.tokens.try_take(tokens)
+                if wait and self.requests:
+                    self.requests.give_back(1)
+            if wait == 0.0:
+                break
+            time.sleep(min(wait, 5.0))
+        with self._lock:
+            self.waited += time.monotonic() - t0
+
+    def settle(self, estimated: int, actual):
+        """Correct the token bucket once the response reports the real token count."""
+        if self.tokens and actual:
+            self.tokens.give_back(estimated - actual)
@@ -0,0 +1,162 @@
+"""
+retry_policy.py
+
+When and how long llm_csv_hb_extractor.py waits before re-sending a failed
+Gemini request.
+
+  - classify(error) sorts an exception into
+      "quota"      429 / RESOURCE_EXHAUSTED: retry after the server's hint
+      "retryable"  5xx, 408, timeouts, dropped connections
+      "permanent"  other 4xx (bad request, auth, not found), and any exception
+                   that is not a recognised API or network error (e.g. a
+                   TypeError in the request code): retrying cannot help
+  - retry_hint(error) reads the server's suggested delay (google.rpc.RetryInfo
+    retryDelay, a Retry-After header, or "retry in 37s" in the message).
+  - RetryPolicy gives each chunk a budget of max_attempts, waits with full-jitter
+    exponential backoff (or the server hint, if longer), and fails permanent
+    errors at once.
+  - The policy's circuit breaker is shared by all request threads: after
+    `breaker_errors` quota errors in a row (across workers) it opens and every
+    worker pauses before its next attempt, instead of each one hammering the
+    quota on its own schedule. One successful request closes it again.
+
+  policy = RetryPolicy(max_attempts=6)
+  while True:
+      policy.before_attempt()                  # blocks while the breaker is open
+      try:
+          response = send()
+          policy.on_success()
+          break
+      except Exception as e:
+          time.sleep(policy.on_error(e, attempt))   # raises RetryBudgetExceeded / PermanentRequestError
+
+Errors are inspected by duck typing (.code, .status, .details, .response), which
+covers google.genai.errors.APIError without importing the SDK here.
+"""
+
+import random
+import re
+import threading
+import time
+
+class PermanentRequestError(RuntimeError):
+    """A request failed in a way retrying cannot fix."""
+
+class RetryBudgetExceeded(RuntimeError):
+    """A request still failed after its last allowed attempt."""
+
+QUOTA_STATUSES = {"RESOURCE_EXHAUSTED"}
+RETRYABLE_CODES = {408, 500, 502, 503, 504}
+RETRYABLE_STATUSES = {"UNAVAILABLE", "INTERNAL", "DEADLINE_EXCEEDED", "ABORTED"}
+RETRYABLE_NAMES = ("Timeout", "Connect", "Network", "RemoteProtocol", "ReadError", "WriteError", "SSL")
+
+def classify(error: Exception) -> str:
+    """Return "quota", "retryable" or "permanent" for an exception from a request."""
+    code = getattr(error, "code", None)
+    status = str(getattr(error, "status", "") or "").upper()
+    if code == 429 or status in QUOTA_STATUSES:
+        return "quota"
+    if code in RETRYABLE_CODES or status in RETRYABLE_STATUSES:
+        return "retryable"
+    if isinstance(code, int) and 400 <= code < 500:
+        return "permanent"
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return "retryable"
+    if any(n in type(error).__name__ for n in RETRYABLE_NAMES):
+        return "retryable"
+    return "permanent"
+
+def _find_retry_delay(obj):
+    if isinstance(obj, dict):
+        if "retryDelay" in obj:
+            return obj["retryDelay"]
+        for v in obj.values():
+            found = _find_retry_delay(v)
+            if found is not None:
+                return found
+    elif isinstance(obj, list):
+        for v in obj:
+            found = _find_retry_delay(v)
+            if found is not None:
+                return found
+    return None
+
+def retry_hint(error: Exception):
+    """Seconds the server asked us to wait before retrying, or None."""
+    delay = _find_retry_delay(getattr(error, "details", None))
+    if isinstance(delay, str):
+        m = re.fullmatch(r"\s*([\d.]+)\s*s?\s*", delay)
+        if m:
+            return float(m.group(1))
+    elif isinstance(delay, (int, float)):
+        return float(delay)
+    headers = getattr(getattr(error, "response", None), "headers", None)
+    if headers is not None:
+        value = headers.get("retry-after") or headers.get("Retry-After")
+        if value and str(value).strip().replace(".", "", 1).isdigit():
+            return float(value)
+    m = re.search(r"retry in ([\d.]+)\s*s", str(error), re.IGNORECASE)
+    return float(m.group(1)) if m else None
+
+class RetryPolicy:
+    def __init__(self, max_attempts: int = 6, base: float = 2.0, cap: float = 300.0,
+                 breaker_errors: int = 5, breaker_pause: float = 60.0):
+        self.max_attempts = max(1, max_attempts)
+        self.base = base
+        self.cap = cap
+        self.breaker_errors = breaker_errors
+        self.breaker_pause = breaker_pause
+        self.lock = threading.Lock()
+        self.quota_streak = 0
+        self.open_until = 0.0
+        self.retries = {"quota": 0, "retryable": 0}
+        self.failures = {"permanent": 0, "budget": 0}
+        self.breaker_trips = 0
+
+    def backoff(self, attempt: int) -> float:
+        """Full-jitter exponential backoff after the given (1-based) failed attempt."""
+        return random.uniform(0, min(self.cap, self.base * 2 ** (attempt - 1)))
+
+    def before_attempt(self):
+        """Block while the circuit breaker is open."""
+        while True:
+            with self.lock:
+                wait = self.open_until - time.monotonic()
+            if wait <= 0:
+                return
+            time.sleep(wait)
+
+    def on_success(self):
+        with self.lock:
+            self.quota_streak = 0
+
+    def on_error(self, error: Exception, attempt: int, label: str = "request") -> float:
+        """
+        Decide what to do after failed attempt number `attempt`. Returns the seconds
+        to sleep before the next attempt, or raises PermanentRequestError /
+        RetryBudgetExceeded (chained to `error`).
+        """
+        kind = classify(error)
+        hint = retry_hint(error)
+        with self.lock:
+            if kind == "quota":
+                self.quota_streak += 1
+                if self.breaker_errors and self.quota_streak >= self.breaker_errors:
+                    pause = max(self.breaker_pause, hint or 0)
+                    if time.monotonic() + pause > self.open_until:
+                        if self.open_until <= time.monotonic():
+                            self.breaker_trips += 1
+                            print(f"[WARN] {self.quota_streak} quota errors in a row; "
+                                  f"pausing all requests for {pause:.0f}s.")
+                        self.open_until = time.monotonic() + pause
+            if kind == "permanent":
+                self.failures["permanent"] += 1
+                raise PermanentRequestError(f"{label}: {error}") from error
+            if attempt >= self.max_attempts:
+                self.failures["budget"] += 1
+                raise RetryBudgetExceeded(f"{label}: gave up after {attempt} attempts: {error}") from error
+            self.retries[kind] += 1
+        delay = self.backoff(attempt)
+        if hint is not None:
+            delay = max(delay, hint + random.uniform(0, 1))
+        return min(delay, max(self.cap, hint or 0))
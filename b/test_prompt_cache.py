@@ -0,0 +1,71 @@
+"""
+test_prompt_cache.py
+
+Checks that llm_csv_hb_extractor.request_chunk sends the prompt by reference when
+a PromptCache hands out a name, and inline otherwise, against a fake Gemini
+client that resolves LocalPromptCache names. Run with `python -m pytest b`.
+"""
+
+import types as T
+
+import pytest
+from google.genai import errors
+
+import llm_csv_hb_extractor as m
+from prompt_cache import PromptCache, LocalPromptCache
+
+PROMPT = "Extract the EB table as CSV. " * 50
+CSV = "location_code,town_name,ward_name,eb_no,total_pop,sc_pop,st_pop\n0801,Town A,Ward 1,EB 1,1087,5,\n"
+
+class FakeModels:
+    """generate_content that reads the prompt from LocalPromptCache.store when referenced by name."""
+    def __init__(self, fail_first=None):
+        self.sent = []
+        self.fail_first = fail_first
+
+    def generate_content(self, model, contents, config):
+        name = config.cached_content
+        prompt = LocalPromptCache.store[name] if name else contents[1]
+        self.sent.append((name, len(contents), prompt))
+        if self.fail_first is not None:
+            e, self.fail_first = self.fail_first, None
+            raise e
+        usage = T.SimpleNamespace(prompt_token_count=300, candidates_token_count=40,
+                                  total_token_count=340, cached_content_token_count=0)
+        return T.SimpleNamespace(text=f"```csv\n{CSV}```", usage_metadata=usage, candidates=None)
+
+@pytest.fixture
+def models(monkeypatch):
+    fake = FakeModels()
+    monkeypatch.setattr(m, "_client", T.SimpleNamespace(models=fake))
+    return fake
+
+def test_local_cache_sends_pdf_only(models):
+    cache = LocalPromptCache(PROMPT)
+    try:
+        text = m.request_chunk(b"%PDF-1.4", PROMPT, "t", n_pages=1, prompt_cache=cache)
+    finally:
+        cache.close()
+    assert text.strip() == CSV.strip()
+    assert models.sent == [(cache.name, 1, PROMPT)]
+    assert (cache.requests, cache.hits, cache.tokens_saved) == (1, 1, len(PROMPT) // 4)
+    assert cache.name not in LocalPromptCache.store
+
+def test_no_cache_sends_prompt_inline(models):
+    cache = PromptCache()
+    m.request_chunk(b"%PDF-1.4", PROMPT, "t", n_pages=1, prompt_cache=cache)
+    assert models.sent == [(None, 2, PROMPT)]
+    assert (cache.requests, cache.hits) == (1, 0)
+
+def test_rejected_handle_is_retried(models):
+    models.fail_first = errors.ClientError(404, {"error": {
+        "code": 404, "status": "NOT_FOUND", "message": "CachedContent not found"}})
+    cache = LocalPromptCache(PROMPT)
+    try:
+        stats = {}
+        m.request_chunk(b"%PDF-1.4", PROMPT, "t", n_pages=1, stats=stats, prompt_cache=cache)
+    finally:
+        cache.close()
+    assert [name for name, _, _ in models.sent] == [cache.name, cache.name]
+    assert stats["attempts"] == 2
+    assert cache.requests == 1